@@ -0,0 +1,280 @@
+// Modo cliente: os callbacks de filtro recortam os cubos do dcc.Store 'store-agregados'
+// e reaplicam os valores nas figuras já renderizadas, sem ida ao servidor.
+(function () {
+    var TIPOS = {int8: Int8Array, int16: Int16Array, int32: Int32Array};
+
+    function decodificar(vetor) {
+        var binario = atob(vetor.dados);
+        var bytes = new Uint8Array(binario.length);
+        for (var i = 0; i < binario.length; i++) {
+            bytes[i] = binario.charCodeAt(i);
+        }
+        return new TIPOS[vetor.dtype](bytes.buffer);
+    }
+
+    // Os vetores do store chegam em base64; são decodificados uma vez por versão dos dados.
+    var decodificados = {};
+
+    function cuboDecodificado(store, nome) {
+        var chave = store.versao + '/' + nome;
+        if (!(chave in decodificados)) {
+            var cubo = store[nome];
+            var codigos = {};
+            Object.keys(cubo.codigos).forEach(function (coluna) { codigos[coluna] = decodificar(cubo.codigos[coluna]); });
+            decodificados[chave] = Object.assign({}, cubo, {codigos: codigos, contagem: decodificar(cubo.contagem)});
+        }
+        return decodificados[chave];
+    }
+
+    // Códigos do dicionário aceitos pelo filtro, ou null quando ele não filtra. `intervalo`:
+    // o valor é o [início, fim] do RangeSlider, e cobrir todos os anos equivale a não filtrar.
+    function codigosAceitos(dicionario, valor, intervalo) {
+        if (valor === null || valor === undefined || valor === '' || (Array.isArray(valor) && !valor.length)) {
+            return null;
+        }
+        var aceito;
+        if (intervalo && Array.isArray(valor)) {
+            var inicio = Math.min.apply(null, valor), fim = Math.max.apply(null, valor);
+            aceito = function (v) { return Number(v) >= inicio && Number(v) <= fim; };
+        } else {
+            var valores = (Array.isArray(valor) ? valor : [valor]).map(String);
+            aceito = function (v) { return valores.indexOf(String(v)) >= 0; };
+        }
+        var codigos = {}, total = 0;
+        dicionario.forEach(function (v, codigo) {
+            if (aceito(v)) {
+                codigos[codigo] = true;
+                total++;
+            }
+        });
+        return intervalo && total === dicionario.length ? null : codigos;
+    }
+
+    function linhasFiltradas(cubo, ano, raca, sexo) {
+        var filtros = [['ano', ano, true], ['racaCor', raca, false], ['sexo', sexo, false]];
+        var condicoes = [];
+        filtros.forEach(function (filtro) {
+            var codigos = codigosAceitos(cubo.dicionarios[filtro[0]], filtro[1], filtro[2]);
+            if (codigos !== null) {
+                condicoes.push([cubo.codigos[filtro[0]], codigos]);
+            }
+        });
+
+        var linhas = [];
+        for (var i = 0; i < cubo.contagem.length; i++) {
+            if (condicoes.every(function (c) { return c[1][c[0][i]] === true; })) {
+                linhas.push(i);
+            }
+        }
+        return linhas;
+    }
+
+    // Soma as contagens das linhas por combinação de colunas, ignorando valores ausentes;
+    // devolve os grupos na ordem dos códigos (a mesma ordem do groupby no servidor).
+    function somarPor(cubo, linhas, colunas) {
+        var grupos = {};
+        linhas.forEach(function (i) {
+            var codigos = colunas.map(function (c) { return cubo.codigos[c][i]; });
+            if (codigos.some(function (codigo) { return codigo < 0; })) {
+                return;
+            }
+            var chave = codigos.join('|');
+            if (!(chave in grupos)) {
+                grupos[chave] = {codigos: codigos, contagem: 0};
+            }
+            grupos[chave].contagem += cubo.contagem[i];
+        });
+        return Object.values(grupos)
+            .sort(function (a, b) {
+                for (var k = 0; k < a.codigos.length; k++) {
+                    if (a.codigos[k] !== b.codigos[k]) {
+                        return a.codigos[k] - b.codigos[k];
+                    }
+                }
+                return 0;
+            })
+            .map(function (g) {
+                return {
+                    valores: g.codigos.map(function (codigo, k) { return cubo.dicionarios[colunas[k]][codigo]; }),
+                    contagem: g.contagem
+                };
+            });
+    }
+
+    // Sintomas e condições chegam como listas ("Febre, Tosse"); cada termo conta separadamente,
+    // como na incidência esparsa do servidor (termos.py).
+    function separarTermos(texto) {
+        var termos = [];
+        String(texto).split(',').forEach(function (termo) {
+            termo = termo.trim();
+            if (termo && termos.indexOf(termo) < 0) {
+                termos.push(termo);
+            }
+        });
+        return termos;
+    }
+
+    // Redistribui os grupos de somarPor pelos termos da coluna na `posicao`, ordenando pelos
+    // valores das colunas (com o termo na primeira, é a mesma ordem do servidor).
+    function somarPorTermo(grupos, posicao) {
+        var porChave = {};
+        grupos.forEach(function (g) {
+            separarTermos(g.valores[posicao]).forEach(function (termo) {
+                var valores = g.valores.slice();
+                valores[posicao] = termo;
+                var chave = JSON.stringify(valores);
+                if (!(chave in porChave)) {
+                    porChave[chave] = {valores: valores, contagem: 0};
+                }
+                porChave[chave].contagem += g.contagem;
+            });
+        });
+        return Object.values(porChave).sort(function (a, b) {
+            for (var k = 0; k < a.valores.length; k++) {
+                var x = String(a.valores[k]), y = String(b.valores[k]);
+                if (x !== y) {
+                    return x < y ? -1 : 1;
+                }
+            }
+            return 0;
+        });
+    }
+
+    // Traços criados pelo px (um por categoria) recebem os novos dados pelo nome;
+    // categorias ausentes no recorte ficam ocultas.
+    function atualizarTracos(figura, porNome) {
+        var data = figura.data.map(function (traco) {
+            var novo = porNome[traco.name];
+            return novo ? Object.assign({}, traco, novo, {visible: true}) : Object.assign({}, traco, {visible: false});
+        });
+        return Object.assign({}, figura, {data: data});
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        pibic: {
+            piramide: function (store, ano, raca, sexo, figura) {
+                if (!store || !figura) { return window.dash_clientside.no_update; }
+                var cubo = cuboDecodificado(store, 'piramide');
+                var grupos = somarPor(cubo, linhasFiltradas(cubo, ano, raca, sexo), ['faixa_etaria', 'sexo']);
+                var total = grupos.reduce(function (s, g) { return s + g.contagem; }, 0);
+                var faixas = cubo.dicionarios.faixa_etaria;
+                var sinais = {Feminino: -1, Masculino: 1};
+
+                var porNome = {};
+                grupos.forEach(function (g) {
+                    var sexoGrupo = g.valores[1];
+                    if (!(sexoGrupo in porNome)) {
+                        porNome[sexoGrupo] = {y: faixas.slice(), x: faixas.map(function () { return 0; }), text: []};
+                    }
+                    porNome[sexoGrupo].x[faixas.indexOf(g.valores[0])] = g.contagem;
+                });
+                Object.keys(porNome).forEach(function (nome) {
+                    var traco = porNome[nome];
+                    traco.text = traco.x.map(function (n) { return n + ' (' + (total ? n / total * 100 : 0).toFixed(1) + '%)'; });
+                    traco.x = traco.x.map(function (n) { return nome in sinais ? n * sinais[nome] : null; });
+                });
+                return atualizarTracos(figura, porNome);
+            },
+
+            sankey: function (store, ano, raca, sexo, figura) {
+                if (!store || !figura) { return window.dash_clientside.no_update; }
+                // Mesma montagem de graficos.grafico_sankey: um nó por (etapa, rótulo) com fluxo,
+                // na ordem das etapas e dos rótulos, e as ligações na ordem dos códigos.
+                var sankey = store.sankey, estagios = sankey.estagios;
+                var pares = [], ativos = estagios.map(function (estagio) {
+                    return sankey.rotulos[estagio].map(function () { return false; });
+                });
+                for (var i = 0; i + 1 < estagios.length; i++) {
+                    var cubo = cuboDecodificado(store, 'sankey:' + estagios[i] + ':' + estagios[i + 1]);
+                    var grupos = somarPor(cubo, linhasFiltradas(cubo, ano, raca, sexo), [estagios[i], estagios[i + 1]]).map(function (g) {
+                        return [sankey.rotulos[estagios[i]].indexOf(g.valores[0]), sankey.rotulos[estagios[i + 1]].indexOf(g.valores[1]), g.contagem];
+                    });
+                    grupos.forEach(function (g) { ativos[i][g[0]] = true; ativos[i + 1][g[1]] = true; });
+                    pares.push(grupos);
+                }
+
+                var ids = [], rotulos = [], cores = [], etapas = [];
+                estagios.forEach(function (estagio, e) {
+                    ids.push(ativos[e].map(function (ativo, k) {
+                        if (!ativo) { return -1; }
+                        rotulos.push(sankey.rotulos[estagio][k]);
+                        cores.push(sankey.cores[estagio][k]);
+                        etapas.push(sankey.titulos[estagio]);
+                        return rotulos.length - 1;
+                    }));
+                });
+
+                var fontes = [], alvos = [], valores = [];
+                pares.forEach(function (grupos, p) {
+                    grupos.forEach(function (g) {
+                        fontes.push(ids[p][g[0]]);
+                        alvos.push(ids[p + 1][g[1]]);
+                        valores.push(g[2]);
+                    });
+                });
+
+                var traco = figura.data[0];
+                var novo = Object.assign({}, traco, {
+                    node: Object.assign({}, traco.node, {label: rotulos, color: cores, customdata: etapas}),
+                    link: Object.assign({}, traco.link, {source: fontes, target: alvos, value: valores})
+                });
+                return Object.assign({}, figura, {data: [novo]});
+            },
+
+            mapa: function (store, ano, raca, sexo, figura) {
+                if (!store || !figura) { return window.dash_clientside.no_update; }
+                var cubo = cuboDecodificado(store, 'mapa');
+                var z = new Array(cubo.n_municipios).fill(0);
+                somarPor(cubo, linhasFiltradas(cubo, ano, raca, sexo), ['municipioIBGE']).forEach(function (g) {
+                    if (g.valores[0] >= 0) {
+                        z[g.valores[0]] += g.contagem;
+                    }
+                });
+                var traco = Object.assign({}, figura.data[0], {z: z, zauto: false, zmin: 0, zmax: Math.max(1, Math.max.apply(null, z))});
+                return Object.assign({}, figura, {data: [traco]});
+            },
+
+            classificacao: function (store, ano, raca, sexo, figura) {
+                if (!store || !figura) { return window.dash_clientside.no_update; }
+                var cubo = cuboDecodificado(store, 'classificacao');
+                var porNome = {};
+                somarPorTermo(somarPor(cubo, linhasFiltradas(cubo, ano, raca, sexo), ['sintomas', 'classificacaoFinal']), 0).forEach(function (g) {
+                    var classificacao = g.valores[1];
+                    if (!(classificacao in porNome)) {
+                        porNome[classificacao] = {x: [], y: []};
+                    }
+                    porNome[classificacao].y.push(g.valores[0]);
+                    porNome[classificacao].x.push(g.contagem);
+                });
+                return atualizarTracos(figura, porNome);
+            },
+
+            evolucao: function (store, ano, raca, sexo, figura) {
+                if (!store || !figura) { return window.dash_clientside.no_update; }
+                var cubo = cuboDecodificado(store, 'evolucao');
+                var porNome = {};
+                somarPor(cubo, linhasFiltradas(cubo, ano, raca, sexo), ['evolucaoCaso']).forEach(function (g) {
+                    porNome[g.valores[0]] = {x: [g.contagem], y: [g.valores[0]]};
+                });
+                return atualizarTracos(figura, porNome);
+            },
+
+            condicoes: function (store, ano, raca, sexo, figura) {
+                if (!store || !figura) { return window.dash_clientside.no_update; }
+                var cubo = cuboDecodificado(store, 'condicoes');
+                var top = somarPorTermo(somarPor(cubo, linhasFiltradas(cubo, ano, raca, sexo), ['condicoes']), 0)
+                    .map(function (g, i) { return {valor: g.valores[0], contagem: g.contagem, ordem: i}; })
+                    .sort(function (a, b) { return b.contagem - a.contagem || a.ordem - b.ordem; })
+                    .slice(0, 10);
+                var contagens = top.map(function (g) { return g.contagem; });
+                var traco = Object.assign({}, figura.data[0], {
+                    y: top.map(function (g) { return g.valor; }),
+                    x: contagens,
+                    text: contagens,
+                    marker: Object.assign({}, figura.data[0].marker, {color: contagens})
+                });
+                return Object.assign({}, figura, {data: [traco]});
+            }
+        }
+    });
+})();
@@ -0,0 +1,145 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from metricas import etapa, registrar_linhas
+from utils import concatenar_tabelas
+
+
+logger = logging.getLogger(__name__)
+
+
+DIMENSOES_FILTRO = ['ano', 'racaCor', 'sexo']
+
+
+def construir_cubo(df, dimensoes):
+    # Contagens por (ano, racaCor, sexo, *dimensoes). dropna=False mantém as linhas
+    # com filtro ausente, que entram nos totais quando o filtro não está aplicado.
+    colunas = list(dict.fromkeys(DIMENSOES_FILTRO + dimensoes))
+    return df.groupby(colunas, dropna=False, observed=True).size().reset_index(name='contagem')
+
+
+def consultar_cubo(cubo, por, filtros=None, completo=()):
+    with etapa('consulta'):
+        return _consultar_cubo(cubo, por, filtros or {}, completo)
+
+
+def _consultar_cubo(cubo, por, filtros, completo):
+    # filtros: {coluna: valores aceitos}; as condições viram uma única máscara sobre o cubo.
+    if filtros:
+        cubo = cubo[np.logical_and.reduce([cubo[coluna].isin(valores).to_numpy() for coluna, valores in filtros.items()])]
+
+    registrar_linhas(cubo['contagem'])
+    resultado = cubo.groupby(por, observed=True)['contagem'].sum()
+    return completar(resultado, por, completo, cubo)
+
+
+def completar(resultado, por, completo, df):
+    # As colunas em `completo` recebem todas as suas categorias, com contagem zero
+    # onde não há casos; as demais ficam só com os valores observados.
+    if not completo:
+        return resultado
+    niveis = [
+        df[coluna].cat.categories if coluna in completo else resultado.index.unique(coluna)
+        for coluna in por
+    ]
+    return resultado.reindex(pd.MultiIndex.from_product(niveis, names=por), fill_value=0)
+
+
+def contar_linhas(df, linhas, por, completo=()):
+    # Mesmo resultado de consultar_cubo, mas sobre as linhas selecionadas (None = todas) de uma
+    # projeção df_*: os códigos das categorias viram uma chave única contada com bincount,
+    # sem copiar o recorte nem passar por groupby.
+    colunas = [por] if isinstance(por, str) else list(por)
+    codigos, categorias = [], []
+    for coluna in colunas:
+        serie = df[coluna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos_coluna, categorias_coluna = serie.cat.codes.to_numpy(), serie.cat.categories
+        else:
+            codigos_coluna, categorias_coluna = pd.factorize(serie, sort=True)
+        codigos.append(codigos_coluna if linhas is None else codigos_coluna[linhas])
+        categorias.append(categorias_coluna)
+
+    forma = [len(categorias_coluna) for categorias_coluna in categorias]
+    validas = np.logical_and.reduce([codigos_coluna >= 0 for codigos_coluna in codigos])
+    chave = np.ravel_multi_index([codigos_coluna[validas] for codigos_coluna in codigos], forma)
+    contagens = np.bincount(chave, minlength=int(np.prod(forma)))
+    observadas = np.flatnonzero(contagens)
+
+    niveis = [
+        pd.Categorical.from_codes(posicoes, dtype=df[coluna].dtype) if isinstance(df[coluna].dtype, pd.CategoricalDtype) else categorias_coluna[posicoes]
+        for coluna, categorias_coluna, posicoes in zip(colunas, categorias, np.unravel_index(observadas, forma))
+    ]
+    indice = pd.Index(niveis[0], name=colunas[0]) if isinstance(por, str) else pd.MultiIndex.from_arrays(niveis, names=colunas)
+    resultado = pd.Series(contagens[observadas], index=indice, name='contagem')
+    registrar_linhas(resultado)
+    return completar(resultado, colunas, completo, df)
+
+
+def eixos_celulas(tabela):
+    # Valores das dimensões de filtro para as estruturas densas por célula (ano × raça × sexo):
+    # os anos inteiros em ordem e as categorias de raça e sexo.
+    anos = np.array(sorted(int(ano) for ano in tabela['ano'].dropna().unique()), dtype=np.int64)
+    return anos, {dimensao: tabela[dimensao].cat.categories for dimensao in DIMENSOES_FILTRO[1:]}
+
+
+def codigos_celulas(tabela, anos, categorias):
+    # Posição de cada notificação em cada dimensão de filtro; o último slot recebe os ausentes,
+    # que contam quando a dimensão não é filtrada.
+    # Os códigos saem no menor inteiro que os comporta: são vetores do tamanho da tabela.
+    anos_linha = tabela['ano'].to_numpy(dtype=np.int16, na_value=-1)
+    codigos = [np.where(anos_linha < 0, len(anos), np.searchsorted(anos, anos_linha).astype(np.int16))]
+    for dimensao in DIMENSOES_FILTRO[1:]:
+        codigos_dimensao = tabela[dimensao].cat.codes.to_numpy()
+        codigos.append(np.where(codigos_dimensao < 0, len(categorias[dimensao]), codigos_dimensao))
+    return codigos
+
+
+def mascaras_celulas(filtros, anos, categorias):
+    # Slots aceitos pelos filtros em cada dimensão (o dos ausentes só sem filtro na dimensão).
+    mascaras = [np.append(np.isin(anos, filtros['ano']), False) if 'ano' in filtros else np.ones(len(anos) + 1, dtype=bool)]
+    for dimensao in DIMENSOES_FILTRO[1:]:
+        if dimensao in filtros:
+            mascaras.append(np.append(categorias[dimensao].isin(filtros[dimensao]), False))
+        else:
+            mascaras.append(np.ones(len(categorias[dimensao]) + 1, dtype=bool))
+    return mascaras
+
+
+def posicoes_celulas(anos_antigos, categorias_antigas, anos, categorias):
+    # Slot de cada célula antiga nos eixos ampliados por um delta (anos ou categorias novas);
+    # o slot dos ausentes continua o último de cada dimensão.
+    posicoes = [np.append(np.searchsorted(anos, anos_antigos), len(anos))]
+    for dimensao in DIMENSOES_FILTRO[1:]:
+        posicoes.append(np.append(categorias[dimensao].get_indexer(categorias_antigas[dimensao]), len(categorias[dimensao])))
+    return posicoes
+
+
+def realocar(contagens, posicoes, forma):
+    # Cópia das contagens num vetor de `forma`, cada índice antigo de cada eixo na posição indicada;
+    # os slots novos começam zerados.
+    novo = np.zeros(forma, dtype=contagens.dtype)
+    novo[np.ix_(*posicoes)] = contagens
+    return novo
+
+
+def somar_cubos(cubo, delta):
+    # Atualização incremental: as contagens do delta são somadas às do cubo existente,
+    # sem voltar às notificações dos anos que o delta não toca.
+    colunas = list(cubo.columns.drop('contagem'))
+    return concatenar_tabelas(cubo, delta).groupby(colunas, dropna=False, observed=True)['contagem'].sum().reset_index()
+
+
+def construir_cubos(dados):
+    cubos = {
+        'piramide': construir_cubo(dados['df_piramide'], ['faixa_etaria']),
+        'sankey': construir_cubo(dados['df_sankey'], ['sintomas', 'classificacaoFinal', 'evolucaoCaso']),
+        'mapa': construir_cubo(dados['df_mapa'], ['municipioIBGE']),
+        'classificacao': construir_cubo(dados['df_classificacao'], ['sintomas', 'classificacaoFinal']),
+        'evolucao': construir_cubo(dados['df_evolucao'], ['evolucaoCaso']),
+        'condicoes': construir_cubo(dados['df_condicoes'], ['condicoes']),
+    }
+    logger.info("Cubos de agregação: %s", ', '.join(f"{nome}={len(cubo)}" for nome, cubo in cubos.items()))
+    return cubos
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from config import CAMINHO_CSV, DIRETORIO_CACHE, LIMITE_CATEGORIAS_SANKEY, LIMITES_FAIXAS_PIRAMIDE, TAMANHO_BLOCO
+from ingestao import (
+    caminhos_cache, gravar_metadados, gravar_particoes, impressao_digital, ler_csv, ler_metadados,
+    ler_particoes, limpar_notificacoes, pasta_ano, remover_duplicadas
+)
+from utils import concatenar_tabelas
+
+
+logger = logging.getLogger(__name__)
+
+
+def versao_base(impressao):
+    return f"{impressao['hash']}-{impressao['versao_esquema']}"
+
+
+def versao_dados(impressao):
+    # A versão base mais os parâmetros de config que mudam as estruturas montadas: trocá-los
+    # gera outra versão, sem reaproveitar as já publicadas em memória compartilhada.
+    parametros = json.dumps({'faixas': LIMITES_FAIXAS_PIRAMIDE, 'sankey': LIMITE_CATEGORIAS_SANKEY}, sort_keys=True).encode('utf-8')
+    return f"{versao_base(impressao)}-{hashlib.blake2b(parametros, digest_size=4).hexdigest()}"
+
+
+def versao_com_deltas(base, deltas):
+    return f"{base}+{deltas[-1]['id'][:16]}" if deltas else base
+
+
+def nome_parte_delta(delta):
+    return f"delta-{delta['id'][:16]}"
+
+
+def caminhos_deltas(caminho, diretorio_cache):
+    # Os deltas ficam numa árvore própria de partições por ano, ao lado do cache base,
+    # com um registro JSON listando os deltas aplicados na ordem.
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    destino = os.path.join(diretorio_cache, f'{nome}_deltas')
+    return destino, destino + '.json'
+
+
+def ler_registro(caminho_registro, base):
+    # Um registro feito sobre outra versão do CSV base é descartado: a nova exportação
+    # completa já contém as atualizações anteriores.
+    registro = ler_metadados(caminho_registro)
+    if registro is None or registro.get('base') != base:
+        return {'base': base, 'deltas': []}
+    return registro
+
+
+def ler_existentes(caminho, diretorio_cache, tamanho_bloco, anos):
+    # Só as notificações dos anos tocados pelo delta (base + deltas anteriores) são lidas.
+    destino, _ = caminhos_cache(caminho, diretorio_cache, particionado=bool(tamanho_bloco))
+    if tamanho_bloco:
+        existentes = [ler_particoes(destino, anos)]
+    else:
+        anos_validos = [int(ano) for ano in anos if not pd.isna(ano)]
+        filtro = pc.field('ano').isin(anos_validos)
+        if len(anos_validos) < len(anos):
+            filtro = filtro | pc.field('ano').is_null()
+        existentes = [pq.read_table(destino, filters=filtro).to_pandas()]
+
+    diretorio_deltas, _ = caminhos_deltas(caminho, diretorio_cache)
+    if os.path.isdir(diretorio_deltas):
+        existentes.append(ler_particoes(diretorio_deltas, anos))
+    return concatenar_tabelas(*existentes)
+
+
+def aplicar_delta(caminho_delta, caminho=CAMINHO_CSV, diretorio_cache=DIRETORIO_CACHE, tamanho_bloco=TAMANHO_BLOCO):
+    inicio = time.perf_counter()
+    _, caminho_metadados = caminhos_cache(caminho, diretorio_cache, particionado=bool(tamanho_bloco))
+    impressao = ler_metadados(caminho_metadados)
+    if impressao is None:
+        raise FileNotFoundError(f"Cache base de {caminho} não encontrado em {diretorio_cache}; inicie o painel uma vez antes de aplicar deltas")
+
+    diretorio_deltas, caminho_registro = caminhos_deltas(caminho, diretorio_cache)
+    registro = ler_registro(caminho_registro, versao_base(impressao))
+    delta = {'id': impressao_digital(caminho_delta)['hash'], 'arquivo': os.path.basename(caminho_delta)}
+    if any(anterior['id'] == delta['id'] for anterior in registro['deltas']):
+        logger.info("Delta %s já aplicado, ignorado", caminho_delta)
+        return registro
+
+    novas = limpar_notificacoes(ler_csv(caminho_delta))
+    anos = list(novas['ano'].unique())
+    novas_unicas = remover_duplicadas(novas, ler_existentes(caminho, diretorio_cache, tamanho_bloco, anos))
+    logger.info(
+        "Delta %s: %d linhas lidas, %d novas (anos %s)",
+        caminho_delta, len(novas), len(novas_unicas), ', '.join(sorted(pasta_ano(ano) for ano in anos))
+    )
+    if novas_unicas.empty:
+        return registro
+
+    # As partições são gravadas antes do registro: quem lê o registro só enxerga deltas completos.
+    gravar_particoes(novas_unicas, diretorio_deltas, nome_parte_delta(delta))
+    delta.update({
+        'linhas': len(novas_unicas),
+        'anos': sorted(pasta_ano(ano) for ano in novas_unicas['ano'].unique()),
+        'aplicado_em': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    })
+    registro['deltas'].append(delta)
+    gravar_metadados(caminho_registro, registro)
+
+    logger.info("Delta registrado em %.2fs; versão dos dados %s", time.perf_counter() - inicio, versao_com_deltas(versao_dados(impressao), registro['deltas']))
+    return registro
+
+
+class MonitorAtualizacoes:
+    # Acompanha o registro de deltas e entrega a `aplicar` só as notificações ainda não
+    # vistas por este processo; cada worker tem o seu monitor e troca de versão sozinho.
+
+    def __init__(self, impressao, aplicar, caminho=CAMINHO_CSV, diretorio_cache=DIRETORIO_CACHE):
+        # O registro de deltas é da versão base do CSV; os dados entregues levam também os parâmetros.
+        self.base = versao_base(impressao)
+        self.versao = versao_dados(impressao)
+        self.aplicar = aplicar
+        self.diretorio_deltas, self.caminho_registro = caminhos_deltas(caminho, diretorio_cache)
+        self.aplicados = set()
+        self._mtime = None
+
+    def verificar(self):
+        try:
+            mtime = os.stat(self.caminho_registro).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        registro = ler_registro(self.caminho_registro, self.base)
+        pendentes = [delta for delta in registro['deltas'] if delta['id'] not in self.aplicados]
+        if not pendentes:
+            return False
+
+        df_novo = ler_particoes(self.diretorio_deltas, partes={nome_parte_delta(delta) for delta in pendentes})
+        versao = versao_com_deltas(self.versao, registro['deltas'])
+        self.aplicar(df_novo, versao)
+        self.aplicados.update(delta['id'] for delta in pendentes)
+        logger.info("%d delta(s) aplicados em memória (%d notificações); versão dos dados %s", len(pendentes), len(df_novo), versao)
+        return True
+
+    def iniciar(self, intervalo):
+        def executar():
+            while True:
+                time.sleep(intervalo)
+                try:
+                    self.verificar()
+                except Exception:
+                    logger.exception("Falha ao aplicar deltas de %s", self.caminho_registro)
+
+        thread = threading.Thread(target=executar, name='monitor-atualizacoes', daemon=True)
+        thread.start()
+        return thread
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    for caminho_delta in sys.argv[1:]:
+        aplicar_delta(caminho_delta)
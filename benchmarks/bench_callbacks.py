@@ -0,0 +1,247 @@
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from dados_sinteticos import carregar_municipios, gravar_csv
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+COMBINACOES = [
+    (None, None, None),
+    (2022, None, None),
+    (None, 'Parda', None),
+    (None, None, 'Feminino'),
+    (2021, 'Parda', 'Feminino'),
+    (2024, 'Indígena', 'Masculino'),
+    # Intervalo de anos e seleção múltipla (ainda no cubo) e filtros fora do cubo (bitmaps da tabela).
+    ((2021, 2023), ('Parda', 'Branca'), None),
+    (None, None, ('Feminino',), ('0 a 9', '55+'), None, None),
+    ((2020, 2022), 'Parda', None, None, None, ('Descartado',)),
+]
+
+
+def ambiente_benchmark(caminho_csv, diretorio_cache):
+    # Desliga tudo que roda em segundo plano ou muda o caminho medido.
+    return {
+        **os.environ,
+        'PIBIC_CSV': caminho_csv,
+        'PIBIC_CACHE': diretorio_cache,
+        'PIBIC_TAMANHO_BLOCO': '0',
+        'PIBIC_INTERVALO_ATUALIZACAO': '0',
+        'PIBIC_AQUECER_CACHE': '0',
+        'PIBIC_MODO_CLIENTE': '0',
+        'PIBIC_COMPARTILHAR': '0',
+    }
+
+
+def medir_startup(ambiente):
+    # Importar dbcPibic num processo novo e esperar a carga dos dados é o startup de um worker;
+    # ru_maxrss dá o pico de memória.
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        [sys.executable, '-c', 'import dbcPibic; dbcPibic.carregamento.esperar()'], cwd=RAIZ, env=ambiente,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    _, status, uso = os.wait4(processo.pid, 0)
+    segundos = time.perf_counter() - inicio
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError("Falha ao importar dbcPibic no processo de startup")
+    return segundos, uso.ru_maxrss / 1024
+
+
+def pico_memoria(funcao):
+    tracemalloc.start()
+    try:
+        funcao()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def medir_callback(funcao, repeticoes):
+    tempos = {}
+    for filtros in COMBINACOES:
+        funcao(*filtros)
+        tempos[filtros] = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao(*filtros)
+            tempos[filtros].append(time.perf_counter() - inicio)
+    return tempos
+
+
+def resumir(nome, tempos, pico_mb):
+    todos = np.concatenate([np.asarray(t) for t in tempos.values()]) * 1000
+    return {
+        f'{nome}_p50_ms': float(np.percentile(todos, 50)),
+        f'{nome}_p95_ms': float(np.percentile(todos, 95)),
+        f'{nome}_p99_ms': float(np.percentile(todos, 99)),
+        f'{nome}_pico_mb': pico_mb,
+    }
+
+
+def medir_serializacao(figuras, repeticoes):
+    # Por tipo de figura: tempo do json.dumps padrão do plotly contra serializar_figura
+    # (orjson + vetores binários), e o tamanho da resposta crua e comprimida.
+    from serializacao import serializar_figura, tamanhos_payload
+
+    resultado = {}
+    for nome, figura in figuras.items():
+        tempos = {'json': [], 'rapida': []}
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            padrao = json.dumps(figura, cls=PlotlyJSONEncoder, separators=(',', ':')).encode('utf-8')
+            tempos['json'].append(time.perf_counter() - inicio)
+            inicio = time.perf_counter()
+            rapida = serializar_figura(figura)
+            tempos['rapida'].append(time.perf_counter() - inicio)
+        resultado[nome] = {
+            'json_ms': float(np.median(tempos['json'])) * 1000,
+            'rapida_ms': float(np.median(tempos['rapida'])) * 1000,
+            'json_kb': len(padrao) / 1024,
+            **{f'{formato}_kb': tamanho / 1024 for formato, tamanho in tamanhos_payload(rapida).items()},
+        }
+    return resultado
+
+
+def executar(caminho_csv, diretorio_cache, repeticoes):
+    ambiente = ambiente_benchmark(caminho_csv, diretorio_cache)
+    metricas = {}
+
+    t_frio, pico_frio = medir_startup(ambiente)
+    t_quente, pico_quente = medir_startup(ambiente)
+    metricas.update({
+        'startup_frio_s': t_frio,
+        'startup_quente_s': t_quente,
+        'startup_pico_mb': max(pico_frio, pico_quente),
+    })
+    print(f"startup: {t_frio:.2f}s sem cache, {t_quente:.2f}s com cache, pico {metricas['startup_pico_mb']:.0f} MB")
+
+    # Daqui em diante tudo roda neste processo, sobre o cache já gravado.
+    # config lê as variáveis de ambiente na importação (já feita por dados_sinteticos).
+    os.environ.update(ambiente)
+    os.chdir(RAIZ)
+    import config
+    importlib.reload(config)
+    import dbcPibic
+    dbcPibic.carregamento.esperar()
+    from preprocessamento import preprocessar_dados
+    logging.disable(logging.INFO)
+
+    tempos_preproc = []
+    for _ in range(max(1, repeticoes // 5)):
+        inicio = time.perf_counter()
+        preprocessar_dados(dbcPibic.df, dbcPibic.impressao_dados)
+        tempos_preproc.append(time.perf_counter() - inicio)
+    metricas['preprocessar_s'] = float(np.median(tempos_preproc))
+    metricas['preprocessar_pico_mb'] = pico_memoria(lambda: preprocessar_dados(dbcPibic.df, dbcPibic.impressao_dados))
+    print(f"preprocessar_dados: {metricas['preprocessar_s']:.2f}s, pico {metricas['preprocessar_pico_mb']:.0f} MB")
+
+    # criar_graficos e atualizar_graficos chamam os construtores direto, sem o cache de figuras.
+    for nome, funcao in [('criar_graficos', dbcPibic.criar_graficos), ('atualizar_graficos', dbcPibic.atualizar_graficos)]:
+        tempos = medir_callback(funcao, repeticoes)
+        pico = pico_memoria(lambda: [funcao(*filtros) for filtros in COMBINACOES])
+        metricas.update(resumir(nome, tempos, pico))
+        print(f"{nome}: p50 {metricas[f'{nome}_p50_ms']:.1f} ms, p95 {metricas[f'{nome}_p95_ms']:.1f} ms, "
+              f"p99 {metricas[f'{nome}_p99_ms']:.1f} ms, pico {pico:.1f} MB")
+        for filtros, valores in tempos.items():
+            print(f"    {str(filtros):>40} p50 {np.median(valores) * 1000:8.1f} ms")
+
+    # Figuras sem filtro (as maiores) mais a geometria do mapa, enviada uma vez por página.
+    nomes = ['piramide', 'sankey', 'mapa', 'classificacao', 'evolucao', 'condicoes']
+    figuras = dict(zip(nomes, [*dbcPibic.criar_graficos(None, None, None), *dbcPibic.atualizar_graficos(None, None, None)]))
+    figuras['mapa_base'] = dbcPibic.figura_mapa(dbcPibic.malha_municipios)
+    serializacao = medir_serializacao(figuras, repeticoes)
+    print(f"\n{'figura':>14} {'json ms':>8} {'rápida ms':>10} {'json KB':>8} {'bruto KB':>9} {'gzip KB':>8} {'br KB':>7}")
+    for nome, valores in serializacao.items():
+        print(f"{nome:>14} {valores['json_ms']:>8.2f} {valores['rapida_ms']:>10.2f} {valores['json_kb']:>8.1f} "
+              f"{valores['bruto_kb']:>9.1f} {valores['gzip_kb']:>8.1f} {valores.get('br_kb', float('nan')):>7.1f}")
+    metricas['serializacao_ms'] = sum(valores['rapida_ms'] for valores in serializacao.values())
+    metricas['payload_kb'] = sum(valores['bruto_kb'] for valores in serializacao.values())
+    metricas['payload_gzip_kb'] = sum(valores['gzip_kb'] for valores in serializacao.values())
+
+    return metricas
+
+
+def comparar(resultado, baseline, tolerancia):
+    # Todas as métricas são "menor é melhor"; regressão é passar da baseline por mais que a tolerância.
+    if baseline['linhas'] != resultado['linhas']:
+        print(f"baseline medida com {baseline['linhas']} linhas, execução atual com {resultado['linhas']}: comparação ignorada")
+        return []
+
+    regressoes = []
+    print(f"\n{'métrica':>28} {'baseline':>10} {'atual':>10} {'variação':>9}")
+    for nome, atual in resultado['metricas'].items():
+        if nome not in baseline['metricas']:
+            continue
+        referencia = baseline['metricas'][nome]
+        variacao = atual / referencia - 1 if referencia else 0
+        marcador = ''
+        if variacao > tolerancia:
+            regressoes.append(nome)
+            marcador = '  <- regressão'
+        print(f"{nome:>28} {referencia:>10.2f} {atual:>10.2f} {variacao:>+8.0%}{marcador}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup, preprocessar_dados e callbacks dos gráficos sobre dados sintéticos.')
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--csv', help='usa este CSV em vez de gerar um sintético')
+    parser.add_argument('--repeticoes', type=int, default=20)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerancia', type=float, default=0.3, help='aumento relativo aceito antes de acusar regressão (as latências variam até ~20%% entre execuções; a memória não varia)')
+    parser.add_argument('--gravar-baseline', action='store_true', help='grava o resultado como nova baseline')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='pibic-bench-') as temporario:
+        caminho_csv = args.csv and os.path.abspath(args.csv)
+        if caminho_csv is None:
+            caminho_csv = os.path.join(temporario, 'notificacoes.csv')
+            inicio = time.perf_counter()
+            gravar_csv(caminho_csv, args.linhas, municipios=carregar_municipios(os.path.join(RAIZ, 'df', 'PE_Municipios_2023.shp')))
+            print(f"{args.linhas} linhas sintéticas geradas em {time.perf_counter() - inicio:.1f}s")
+
+        resultado = {
+            'linhas': args.linhas if args.csv is None else None,
+            'csv': caminho_csv if args.csv else None,
+            'repeticoes': args.repeticoes,
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'metricas': executar(caminho_csv, os.path.join(temporario, 'cache'), args.repeticoes),
+        }
+
+    if args.gravar_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultado, arquivo, indent=2)
+            arquivo.write('\n')
+        print(f"baseline gravada em {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"sem baseline em {args.baseline}; rode com --gravar-baseline para criar uma")
+        return
+    with open(args.baseline, encoding='utf-8') as arquivo:
+        regressoes = comparar(resultado, json.load(arquivo), args.tolerancia)
+    if regressoes:
+        print(f"\nregressões acima de {args.tolerancia:.0%}: {', '.join(regressoes)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indice import IndiceBitmap
+
+
+def gerar_tabela(n_linhas, semente=0):
+    rng = np.random.default_rng(semente)
+    return pd.DataFrame({
+        'ano': pd.array(rng.choice([2020, 2021, 2022, 2023, 2024], n_linhas), dtype='Int16'),
+        'racaCor': pd.Categorical(rng.choice(['Parda', 'Branca', 'Preta', 'Amarela', 'Indigena', 'Ignorado'], n_linhas)),
+        'sexo': pd.Categorical(rng.choice(['Feminino', 'Masculino', 'Indefinido'], n_linhas, p=[0.5, 0.48, 0.02])),
+        'municipioNotificacao': pd.Categorical(rng.integers(0, 185, n_linhas).astype(str)),
+        'evolucaoCaso': pd.Categorical(rng.choice(['Cura', 'Óbito', 'Ignorado'], n_linhas)),
+    })
+
+
+def selecionar_por_mascaras(frames, filtros):
+    # Forma atual dos callbacks: três máscaras encadeadas, repetidas para cada frame.
+    resultado = []
+    for frame in frames:
+        for coluna, valor in filtros.items():
+            if valor:
+                frame = frame[frame[coluna] == valor]
+        resultado.append(frame)
+    return resultado
+
+
+def selecionar_por_indice(indice, frames, filtros):
+    linhas = indice.selecionar(filtros)
+    return [frame if linhas is None else frame.take(linhas) for frame in frames]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara máscaras encadeadas com o índice de bitmaps.')
+    parser.add_argument('--linhas', type=int, nargs='+', default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    combinacoes = [
+        {'ano': 2022, 'racaCor': None, 'sexo': None},
+        {'ano': 2021, 'racaCor': 'Parda', 'sexo': 'Feminino'},
+        {'ano': None, 'racaCor': 'Branca', 'sexo': 'Masculino', 'municipioNotificacao': '42'},
+    ]
+
+    print(f"{'linhas':>10} {'filtros':>60} {'máscaras (ms)':>14} {'índice (ms)':>12} {'ganho':>7}")
+    for n_linhas in args.linhas:
+        tabela = gerar_tabela(n_linhas)
+        frames = [tabela[['ano', 'racaCor', 'sexo', 'municipioNotificacao', 'evolucaoCaso']] for _ in range(6)]
+        indice = IndiceBitmap(tabela, ['ano', 'racaCor', 'sexo', 'municipioNotificacao'])
+
+        for filtros in combinacoes:
+            esperado = selecionar_por_mascaras(frames[:1], filtros)[0]
+            obtido = selecionar_por_indice(indice, frames[:1], filtros)[0]
+            assert esperado.index.equals(obtido.index)
+
+            t_mascaras = min(timeit.repeat(lambda: selecionar_por_mascaras(frames, filtros), number=1, repeat=args.repeticoes))
+            t_indice = min(timeit.repeat(lambda: selecionar_por_indice(indice, frames, filtros), number=1, repeat=args.repeticoes))
+            descricao = ', '.join(f'{c}={v}' for c, v in filtros.items() if v)
+            print(f"{n_linhas:>10} {descricao:>60} {t_mascaras * 1000:>14.1f} {t_indice * 1000:>12.1f} {t_mascaras / t_indice:>6.1f}x")
+
+        print(f"{'':>10} memória do índice: {indice.memoria() / 2**20:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
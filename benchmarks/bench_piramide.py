@@ -0,0 +1,60 @@
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados_sinteticos import gerar_notificacoes
+from consulta import compilar_consulta
+from ingestao import limpar_notificacoes
+from piramide import PiramideEtaria
+from preprocessamento import preprocessar_dados
+
+
+def agrupar_piramide(dados, consulta):
+    # Alternativa sem as contagens por célula: filtrar as notificações e agrupar por sexo e faixa a cada requisição.
+    linhas = consulta.linhas(dados)
+    tabela = dados['tabela'] if linhas is None else dados['tabela'].take(linhas)
+    return tabela.groupby(['sexo', 'faixaPiramide'], observed=False).size().unstack(fill_value=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara o groupby por requisição com as contagens faixa × sexo por célula da pirâmide.')
+    parser.add_argument('--linhas', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    combinacoes = [
+        {},
+        {'ano': 2022},
+        {'raca': ['Parda', 'Branca'], 'sexo': 'Feminino'},
+        {'classificacao': 'Descartado'},
+    ]
+
+    print(f"{'linhas':>10} {'filtros':>32} {'groupby (ms)':>13} {'contagens (ms)':>15} {'ganho':>7}")
+    for n_linhas in args.linhas:
+        dados = preprocessar_dados(limpar_notificacoes(gerar_notificacoes(n_linhas)), {'hash': 'benchmark', 'versao_esquema': 0})
+        t_construcao = min(timeit.repeat(lambda: PiramideEtaria(dados['tabela']), number=1, repeat=3))
+        piramide = dados['piramide']
+
+        for filtros in combinacoes:
+            consulta = compilar_consulta(**filtros)
+            assert np.array_equal(piramide.contar(dados, consulta), agrupar_piramide(dados, consulta).to_numpy())
+
+            t_groupby = min(timeit.repeat(lambda: agrupar_piramide(dados, consulta), number=1, repeat=args.repeticoes))
+            t_contagens = min(timeit.repeat(lambda: piramide.contar(dados, consulta), number=1, repeat=args.repeticoes))
+            descricao = consulta.descricao() or 'sem filtros'
+            print(f"{n_linhas:>10} {descricao:>32} {t_groupby * 1000:>13.1f} {t_contagens * 1000:>15.3f} {t_groupby / t_contagens:>6.0f}x")
+
+        # Comparação de dois anos: as duas pirâmides saem das mesmas células, sem nova passada pelas notificações.
+        consulta = compilar_consulta()
+        t_comparacao = min(timeit.repeat(lambda: piramide.comparar(dados, consulta, 'ano', [2021, 2022]), number=1, repeat=args.repeticoes))
+        print(f"{'':>10} construção {t_construcao * 1000:.0f} ms, comparação de dois anos {t_comparacao * 1000:.3f} ms, "
+              f"memória das contagens: {piramide.memoria() / 2**10:.1f} KB")
+
+
+if __name__ == '__main__':
+    main()
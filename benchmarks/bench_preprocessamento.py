@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados_sinteticos import gerar_notificacoes
+from ingestao import limpar_notificacoes, valid_years
+from preprocessamento import mapeamento_classificacao, preprocessar_dados, rotulos_piramide
+from utils import normalizar_nome
+
+
+def agrupar_idades(faixa):
+    # Agrupamento das faixas como era feito antes, por linha e sobre o texto.
+    if ' a ' in faixa:
+        inicio_faixa = int(faixa.split(' a ')[0])
+    elif '+' in faixa:
+        inicio_faixa = int(faixa.split('+')[0])
+    else:
+        return faixa
+    return '55+' if inicio_faixa >= 55 else faixa
+
+
+def limpar_linha_a_linha(df):
+    # Limpeza como era feita antes: apply por linha sobre colunas object.
+    df['municipio'] = df['municipio'].apply(normalizar_nome)
+    df['municipioIBGE'] = df['municipioIBGE'].astype(str).str.zfill(7).fillna('Desconhecido')
+    df['dataNotificacao'] = pd.to_datetime(df['dataNotificacao'], errors='coerce')
+    df['ano'] = df['dataNotificacao'].dt.year.astype('Int64')
+    return df[df['ano'].isin(valid_years) | df['ano'].isna()]
+
+
+def preprocessar_linha_a_linha(df):
+    df_piramide = df[['racaCor', 'sexo', 'faixa_etaria', 'ano']].dropna(subset=['faixa_etaria'])
+    df_piramide['faixa_etaria'] = df_piramide['faixa_etaria'].astype(str).apply(agrupar_idades)
+
+    df_sankey = df[['sintomas', 'classificacaoFinal', 'evolucaoCaso', 'racaCor', 'sexo', 'ano']].copy()
+    df_sankey.fillna({'sintomas': 'Não Informado', 'evolucaoCaso': 'Desconhecido', 'classificacaoFinal': 'Não Classificado'}, inplace=True)
+    df_sankey['classificacaoFinal'] = (
+        df_sankey['classificacaoFinal'].str.strip().str.lower().replace(mapeamento_classificacao).str.capitalize()
+    )
+
+    df_mapa = df[['municipioNotificacao', 'racaCor', 'sexo', 'ano']].copy()
+    df_mapa['municipioNotificacao'] = df_mapa['municipioNotificacao'].apply(normalizar_nome)
+    return df_piramide, df_sankey, df_mapa
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tempo de limpeza e pré-processamento por número de linhas.')
+    parser.add_argument('--linhas', type=int, nargs='+', default=[100_000, 500_000, 1_000_000, 2_000_000])
+    args = parser.parse_args()
+
+    rotulos = pd.DataFrame({'contagem': range(2000), 'percentual': [i / 20 for i in range(2000)]})
+
+    print(f"{'linhas':>10} {'limpeza antes':>14} {'limpeza depois':>15} {'preproc. antes':>15} {'preproc. depois':>16} {'rótulos antes':>14} {'rótulos depois':>15}")
+    for n_linhas in args.linhas:
+        bruto = gerar_notificacoes(n_linhas)
+
+        limpo_antes, t_limpeza_antes = cronometrar(limpar_linha_a_linha, bruto.copy())
+        limpo_depois, t_limpeza_depois = cronometrar(limpar_notificacoes, bruto.copy())
+        _, t_preproc_antes = cronometrar(preprocessar_linha_a_linha, limpo_antes)
+        _, t_preproc_depois = cronometrar(preprocessar_dados, limpo_depois, {'hash': 'benchmark', 'versao_esquema': 0})
+        _, t_rotulos_antes = cronometrar(lambda d: d.apply(lambda row: f"{row['contagem']} ({row['percentual']:.1f}%)", axis=1), rotulos)
+        _, t_rotulos_depois = cronometrar(rotulos_piramide, rotulos['contagem'], rotulos['percentual'])
+
+        print(
+            f"{n_linhas:>10} {t_limpeza_antes:>13.2f}s {t_limpeza_depois:>14.2f}s {t_preproc_antes:>14.2f}s "
+            f"{t_preproc_depois:>15.2f}s {t_rotulos_antes * 1000:>12.1f}ms {t_rotulos_depois * 1000:>13.1f}ms"
+        )
+    print("preproc. depois inclui a construção dos cubos e do índice de bitmaps.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dados_sinteticos import gerar_notificacoes
+from consulta import compilar_consulta
+from ingestao import limpar_notificacoes
+from preprocessamento import preprocessar_dados
+from sankey import ESTAGIOS_SANKEY, TensorSankey
+
+
+def agrupar_pares(dados, consulta, estagios):
+    # Alternativa sem o tensor: filtrar as notificações e agrupar cada par de etapas a cada requisição.
+    linhas = consulta.linhas(dados)
+    tabela = dados['tabela'] if linhas is None else dados['tabela'].take(linhas)
+    return [
+        tabela.groupby([ESTAGIOS_SANKEY[origem][0], ESTAGIOS_SANKEY[destino][0]], observed=True, dropna=False).size()
+        for origem, destino in zip(estagios, estagios[1:])
+    ]
+
+
+def conferir(dados, matriz, esperado, origem, destino):
+    # O groupby volta aos nós do tensor (ausentes e categorias raras em "Outros") antes da comparação.
+    tensor, tabela = dados['sankey'], dados['tabela']
+    nos = [
+        tensor.nos[estagio][tabela[ESTAGIOS_SANKEY[estagio][0]].cat.categories.get_indexer(esperado.index.get_level_values(nivel))]
+        for nivel, estagio in enumerate((origem, destino))
+    ]
+    agrupado = np.zeros_like(matriz)
+    np.add.at(agrupado, tuple(nos), esperado.to_numpy())
+    assert np.array_equal(agrupado, matriz)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara o groupby por requisição com os fluxos do tensor de contingência do Sankey.')
+    parser.add_argument('--linhas', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    combinacoes = [
+        ({}, ['sintomas', 'classificacaoFinal', 'evolucaoCaso']),
+        ({'ano': 2022}, ['faixa_etaria', 'sexo', 'evolucaoCaso']),
+        ({'raca': ['Parda', 'Branca'], 'sexo': 'Feminino'}, ['condicoes', 'classificacaoFinal', 'evolucaoCaso', 'racaCor']),
+        ({'faixa': ['20 a 24']}, ['sintomas', 'classificacaoFinal', 'evolucaoCaso']),
+    ]
+
+    print(f"{'linhas':>10} {'filtros':>32} {'etapas':>7} {'groupby (ms)':>13} {'tensor (ms)':>12} {'ganho':>7}")
+    for n_linhas in args.linhas:
+        dados = preprocessar_dados(limpar_notificacoes(gerar_notificacoes(n_linhas)), {'hash': 'benchmark', 'versao_esquema': 0})
+        t_construcao = min(timeit.repeat(lambda: TensorSankey(dados['tabela']), number=1, repeat=3))
+        tensor = dados['sankey']
+
+        for filtros, estagios in combinacoes:
+            consulta = compilar_consulta(**filtros)
+            for matriz, esperado, origem, destino in zip(tensor.fluxos(dados, consulta, estagios), agrupar_pares(dados, consulta, estagios), estagios, estagios[1:]):
+                conferir(dados, matriz, esperado, origem, destino)
+
+            t_groupby = min(timeit.repeat(lambda: agrupar_pares(dados, consulta, estagios), number=1, repeat=args.repeticoes))
+            t_tensor = min(timeit.repeat(lambda: tensor.fluxos(dados, consulta, estagios), number=1, repeat=args.repeticoes))
+            descricao = consulta.descricao() or 'sem filtros'
+            print(f"{n_linhas:>10} {descricao:>32} {len(estagios):>7} {t_groupby * 1000:>13.1f} {t_tensor * 1000:>12.2f} {t_groupby / t_tensor:>6.0f}x")
+
+        nos = {estagio: len(rotulos) for estagio, rotulos in tensor.rotulos.items()}
+        print(f"{'':>10} construção {t_construcao * 1000:.0f} ms, memória do tensor: {tensor.memoria() / 2**20:.1f} MB, nós por etapa: {nos}")
+
+
+if __name__ == '__main__':
+    main()
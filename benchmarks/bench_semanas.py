@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from consulta import compilar_consulta
+from indice import IndiceBitmap
+from semanas import SeriesSemanais, inicio_semana, numero_semana
+
+
+def gerar_tabela(n_linhas, semente=0):
+    rng = np.random.default_rng(semente)
+    inicio = np.datetime64('2020-01-01')
+    datas = inicio + rng.integers(0, 5 * 365, n_linhas).astype('timedelta64[D]')
+    tabela = pd.DataFrame({
+        'dataNotificacao': datas.astype('datetime64[ns]'),
+        'racaCor': pd.Categorical(rng.choice(['Parda', 'Branca', 'Preta', 'Amarela', 'Indigena', 'Ignorado'], n_linhas)),
+        'sexo': pd.Categorical(rng.choice(['Feminino', 'Masculino', 'Indefinido'], n_linhas, p=[0.5, 0.48, 0.02])),
+        'municipioIBGE': pd.Categorical(rng.choice([str(2600000 + i * 10) for i in range(185)], n_linhas)),
+        'classificacaoSankey': pd.Categorical(rng.choice(['Confirmado', 'Descartado', 'Não Classificado'], n_linhas)),
+        'evolucaoSankey': pd.Categorical(rng.choice(['Cura', 'Óbito', 'Desconhecido'], n_linhas)),
+    })
+    tabela['ano'] = tabela['dataNotificacao'].dt.year.astype('Int16')
+    return tabela
+
+
+def agrupar_por_semana(tabela, consulta):
+    # Alternativa sem as somas prefixadas: filtrar as notificações e reagrupar a cada requisição.
+    mascara = np.ones(len(tabela), dtype=bool)
+    for coluna, valores in consulta.filtros.items():
+        mascara &= tabela[coluna].isin(valores).to_numpy()
+    selecao = tabela[mascara]
+    semana = pd.to_datetime(inicio_semana(numero_semana(selecao['dataNotificacao'].to_numpy())))
+    return selecao.groupby([semana, selecao['classificacaoSankey']], observed=True).size().unstack(fill_value=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara o reagrupamento por requisição com as contagens semanais acumuladas.')
+    parser.add_argument('--linhas', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    combinacoes = [
+        {},
+        {'ano': 2022},
+        {'raca': ['Parda', 'Branca'], 'sexo': 'Feminino'},
+        {'municipio': '2600070'},
+    ]
+
+    print(f"{'linhas':>10} {'filtros':>40} {'groupby (ms)':>13} {'acumulado (ms)':>15} {'ganho':>7}")
+    for n_linhas in args.linhas:
+        tabela = gerar_tabela(n_linhas)
+        dados = {'tabela': tabela, 'indice': IndiceBitmap(tabela, ['ano', 'racaCor', 'sexo'])}
+        inicio = timeit.default_timer()
+        dados['series'] = SeriesSemanais(tabela)
+        t_construcao = timeit.default_timer() - inicio
+        series = dados['series']
+
+        for filtros in combinacoes:
+            consulta = compilar_consulta(**filtros)
+            esperado = agrupar_por_semana(tabela, consulta)
+            obtido = series.casos(dados, consulta, 'classificacao')['casos']
+            assert obtido.loc[esperado.index, esperado.columns].equals(esperado.astype(obtido.dtypes.iloc[0]))
+
+            t_groupby = min(timeit.repeat(lambda: agrupar_por_semana(tabela, consulta), number=1, repeat=args.repeticoes))
+            t_acumulado = min(timeit.repeat(lambda: series.casos(dados, consulta, 'classificacao'), number=1, repeat=args.repeticoes))
+            descricao = consulta.descricao() or 'sem filtros'
+            print(f"{n_linhas:>10} {descricao:>40} {t_groupby * 1000:>13.1f} {t_acumulado * 1000:>15.2f} {t_groupby / t_acumulado:>6.0f}x")
+
+        print(f"{'':>10} construção {t_construcao * 1000:.0f} ms, memória dos acumulados: {series.memoria() / 2**20:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indice import IndiceBitmap
+from termos import IncidenciaTermos, separar_termos
+
+
+SINTOMAS = ['Febre', 'Tosse', 'Dor de Garganta', 'Dispneia', 'Coriza', 'Cefaleia', 'Mialgia', 'Outros']
+
+
+def gerar_tabela(n_linhas, semente=0):
+    # Listas de 1 a 4 sintomas sem repetição, como no campo livre das notificações.
+    rng = np.random.default_rng(semente)
+    combinacoes = [', '.join(rng.choice(SINTOMAS, rng.integers(1, 5), replace=False)) for _ in range(300)]
+    return pd.DataFrame({
+        'ano': pd.array(rng.choice([2020, 2021, 2022, 2023, 2024], n_linhas), dtype='Int16'),
+        'racaCor': pd.Categorical(rng.choice(['Parda', 'Branca', 'Preta', 'Amarela', 'Indigena', 'Ignorado'], n_linhas)),
+        'sexo': pd.Categorical(rng.choice(['Feminino', 'Masculino', 'Indefinido'], n_linhas, p=[0.5, 0.48, 0.02])),
+        'sintomas': pd.Categorical(rng.choice(combinacoes, n_linhas)),
+    })
+
+
+def contar_explodindo(tabela, linhas):
+    # Alternativa sem o índice: separar e explodir as listas a cada requisição.
+    selecao = tabela['sintomas'] if linhas is None else tabela['sintomas'].take(linhas)
+    return selecao.dropna().astype(str).map(separar_termos).explode().value_counts().sort_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compara explode por requisição com a incidência esparsa de termos.')
+    parser.add_argument('--linhas', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    combinacoes = [
+        {'ano': None, 'racaCor': None, 'sexo': None},
+        {'ano': 2022, 'racaCor': None, 'sexo': None},
+        {'ano': 2021, 'racaCor': 'Parda', 'sexo': 'Feminino'},
+    ]
+
+    print(f"{'linhas':>10} {'filtros':>40} {'explode (ms)':>13} {'CSR (ms)':>9} {'ganho':>7}")
+    for n_linhas in args.linhas:
+        tabela = gerar_tabela(n_linhas)
+        indice = IndiceBitmap(tabela, ['ano', 'racaCor', 'sexo'])
+        inicio = timeit.default_timer()
+        incidencia = IncidenciaTermos(tabela['sintomas'])
+        t_construcao = timeit.default_timer() - inicio
+
+        for filtros in combinacoes:
+            linhas = indice.selecionar(filtros)
+            esperado = contar_explodindo(tabela, linhas)
+            obtido = incidencia.contar(linhas)
+            assert obtido[obtido > 0].to_dict() == esperado.to_dict()
+
+            t_explode = min(timeit.repeat(lambda: contar_explodindo(tabela, indice.selecionar(filtros)), number=1, repeat=args.repeticoes))
+            t_csr = min(timeit.repeat(lambda: incidencia.contar(indice.selecionar(filtros)), number=1, repeat=args.repeticoes))
+            descricao = ', '.join(f'{c}={v}' for c, v in filtros.items() if v) or 'sem filtros'
+            print(f"{n_linhas:>10} {descricao:>40} {t_explode * 1000:>13.1f} {t_csr * 1000:>9.1f} {t_explode / t_csr:>6.1f}x")
+
+        print(f"{'':>10} construção {t_construcao * 1000:.0f} ms, memória da matriz: {incidencia.memoria() / 2**20:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
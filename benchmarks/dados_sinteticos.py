@@ -0,0 +1,113 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import CAMINHO_SHAPEFILE
+
+
+RACAS = ['Parda', 'Branca', 'Preta', 'Amarela', 'Indígena', 'Ignorado']
+SEXOS = ['Feminino', 'Masculino', 'Indefinido']
+FAIXAS = [f'{inicio} a {inicio + 4}' for inicio in range(0, 80, 5)] + ['80+']
+SINTOMAS = ['Febre', 'Tosse', 'Dor de Garganta', 'Dispneia', 'Coriza', 'Dor de Cabeça', 'Distúrbios Gustativos']
+CLASSIFICACOES = [
+    'Confirmado Laboratorial', 'Confirmado Clínico-Imagem', 'Confirmado por Critério Clínico',
+    'Confirmado Clínico-Epidemiológico', 'Descartado', 'Síndrome Gripal Não Especificada',
+]
+EVOLUCOES = ['Cura', 'Óbito', 'Em tratamento domiciliar', 'Internado', 'Ignorado', 'Cancelado']
+CONDICOES = ['Diabetes', 'Doenças cardíacas crônicas', 'Obesidade', 'Gestante', 'Imunossupressão', 'Doenças respiratórias crônicas']
+# Volumes por ano desiguais, com ~1% fora de 2020-2024 (descartado na limpeza).
+ANOS = [2019, 2020, 2021, 2022, 2023, 2024, 2025]
+PESOS_ANOS = [0.004, 0.25, 0.27, 0.22, 0.14, 0.11, 0.006]
+
+
+def _listas(rng, opcoes, n_linhas, maximo=3, n_combinacoes=60):
+    # Combinações "A, B, C" como no e-SUS; poucas combinações concentram a maior parte dos casos.
+    # O vocabulário vem de um gerador fixo, para que blocos gerados com sementes diferentes
+    # compartilhem as mesmas combinações (cardinalidade independente do número de linhas).
+    vocabulario = np.random.default_rng(len(opcoes) * 1000 + maximo)
+    combinacoes = list(dict.fromkeys(
+        ', '.join(vocabulario.choice(opcoes, size=vocabulario.integers(1, maximo + 1), replace=False))
+        for _ in range(n_combinacoes)
+    ))
+    pesos = 1 / np.arange(1, len(combinacoes) + 1)
+    return np.asarray(combinacoes, dtype=object)[rng.choice(len(combinacoes), n_linhas, p=pesos / pesos.sum())]
+
+
+def carregar_municipios(caminho=CAMINHO_SHAPEFILE):
+    # Nomes e códigos reais da malha, para que o mapa e a junção por nome sejam exercitados;
+    # sem o shapefile, gerar_notificacoes usa nomes fictícios.
+    if not os.path.exists(caminho):
+        return None
+    import geopandas as gpd
+    malha = gpd.read_file(caminho, ignore_geometry=True)
+    return malha['NM_MUN'].to_numpy(dtype=object), malha['CD_MUN'].astype(int).to_numpy()
+
+
+def gerar_notificacoes(n_linhas, semente=0, n_municipios=185, municipios=None):
+    rng = np.random.default_rng(semente)
+    if municipios is None:
+        nomes = np.array([f'Município São João {i}' for i in range(n_municipios)], dtype=object)
+        codigos_ibge = 2600000 + np.arange(n_municipios) * 10
+    else:
+        nomes, codigos_ibge = municipios
+    # Poucos municípios grandes concentram as notificações (pesos ~1/posição, em ordem fixa).
+    pesos = 1 / np.random.default_rng(len(nomes)).permutation(np.arange(1, len(nomes) + 1))
+    municipio = rng.choice(len(nomes), n_linhas, p=pesos / pesos.sum())
+
+    # As datas são sorteadas como posições num vocabulário de dias já formatados (sem strftime por linha).
+    dias = pd.date_range(f'{ANOS[0]}-01-01', f'{ANOS[-1]}-12-31')
+    inicio_ano = np.searchsorted(dias, pd.to_datetime([f'{ano}-01-01' for ano in ANOS]))
+    posicoes = inicio_ano[rng.choice(len(ANOS), n_linhas, p=PESOS_ANOS)] + rng.integers(0, 365, n_linhas)
+    datas = np.asarray(dias.strftime('%Y-%m-%d'), dtype=object)[posicoes]
+
+    def com_ausentes(valores, taxa):
+        valores = valores.astype(object)
+        valores[rng.random(n_linhas) < taxa] = None
+        return valores
+
+    return pd.DataFrame({
+        'dataNotificacao': com_ausentes(datas, 0.01),
+        'municipio': nomes[municipio],
+        'municipioNotificacao': nomes[municipio],
+        'municipioIBGE': com_ausentes(codigos_ibge[municipio], 0.005),
+        'racaCor': com_ausentes(rng.choice(RACAS, n_linhas, p=[0.5, 0.3, 0.1, 0.04, 0.01, 0.05]), 0.05),
+        'sexo': rng.choice(SEXOS, n_linhas, p=[0.54, 0.45, 0.01]),
+        'faixa_etaria': com_ausentes(rng.choice(FAIXAS, n_linhas), 0.02),
+        'sintomas': com_ausentes(_listas(rng, SINTOMAS, n_linhas, n_combinacoes=200), 0.1),
+        'classificacaoFinal': com_ausentes(rng.choice(CLASSIFICACOES, n_linhas), 0.2),
+        'evolucaoCaso': com_ausentes(rng.choice(EVOLUCOES, n_linhas, p=[0.7, 0.02, 0.15, 0.03, 0.08, 0.02]), 0.3),
+        'condicoes': com_ausentes(_listas(rng, CONDICOES, n_linhas, maximo=2), 0.6),
+    })
+
+
+def gravar_csv(caminho, n_linhas, semente=0, tamanho_bloco=1_000_000, municipios=None):
+    # Gera e grava em blocos (uma semente por bloco), com memória limitada ao bloco:
+    # dá para chegar a 10M+ linhas no formato do dataset_IC_certoV2.csv.
+    for numero, inicio in enumerate(range(0, n_linhas, tamanho_bloco)):
+        bloco = gerar_notificacoes(min(tamanho_bloco, n_linhas - inicio), semente=semente + numero, municipios=municipios)
+        bloco.to_csv(caminho, sep=';', index=False, mode='w' if numero == 0 else 'a', header=numero == 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera um CSV sintético de notificações no esquema do painel.')
+    parser.add_argument('saida')
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--bloco', type=int, default=1_000_000)
+    parser.add_argument('--municipios-ficticios', action='store_true', help='não lê os municípios do shapefile')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    municipios = None if args.municipios_ficticios else carregar_municipios()
+    gravar_csv(args.saida, args.linhas, args.semente, args.bloco, municipios)
+    print(f"{args.linhas} linhas gravadas em {args.saida} em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import functools
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from consulta import compilar_consulta
+from metricas import etapa
+from serializacao import ler_json, serializar_figura
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheFiguras:
+    # Cache LRU das figuras já serializadas, limitado pelo total de bytes guardados.
+    # A chave inclui a versão dos dados, então uma versão nova nunca reaproveita figuras antigas.
+
+    def __init__(self, limite_bytes, versao=lambda: None, compilar=compilar_consulta):
+        self.limite_bytes = limite_bytes
+        self.versao = versao
+        self.compilar = compilar
+        self.acertos = 0
+        self.falhas = 0
+        self.bytes_usados = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, construir):
+        with self._trava:
+            serializado = self._itens.get(chave)
+            if serializado is not None:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+        if serializado is not None:
+            with etapa('cache'):
+                return ler_json(serializado)
+
+        with self._trava:
+            self.falhas += 1
+        figura = construir()
+        with etapa('serializacao'):
+            serializado = serializar_figura(figura)
+            self._guardar(chave, serializado)
+            return ler_json(serializado)
+
+    def _guardar(self, chave, serializado):
+        if len(serializado) > self.limite_bytes:
+            return
+        with self._trava:
+            anterior = self._itens.pop(chave, None)
+            if anterior is not None:
+                self.bytes_usados -= len(anterior)
+            self._itens[chave] = serializado
+            self.bytes_usados += len(serializado)
+            while self.bytes_usados > self.limite_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self.bytes_usados -= len(removido)
+
+    def em_cache(self, funcao, extras=0):
+        # As últimas `extras` entradas são controles do próprio gráfico: entram na chave como vieram
+        # (listas, de dropdowns com seleção múltipla, como tuplas).
+        @functools.wraps(funcao)
+        def envoltorio(*entradas):
+            # Estados da barra lateral que compilam para a mesma consulta dividem a entrada.
+            filtros, controles = entradas[:len(entradas) - extras], entradas[len(entradas) - extras:]
+            controles = tuple(tuple(controle) if isinstance(controle, list) else controle for controle in controles)
+            consulta = self.compilar(*filtros)
+            chave = (funcao.__name__, self.versao(), consulta.chave, controles)
+            return self.obter(chave, lambda: funcao(consulta, *controles))
+        return envoltorio
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self.bytes_usados = 0
+
+    def estatisticas(self):
+        with self._trava:
+            return {
+                'itens': len(self._itens),
+                'bytes': self.bytes_usados,
+                'limite_bytes': self.limite_bytes,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+            }
+
+    def aquecer(self, funcoes, anos, racas, sexos):
+        # Pré-renderiza em segundo plano todas as combinações de filtros (incluindo "todos").
+        def executar():
+            inicio = time.perf_counter()
+            combinacoes = list(itertools.product([None, *anos], [None, *racas], [None, *sexos]))
+            for filtros in combinacoes:
+                for funcao in funcoes:
+                    funcao(*filtros)
+            logger.info(
+                "Cache de figuras aquecido: %d combinações em %.1fs, %s",
+                len(combinacoes), time.perf_counter() - inicio, self.estatisticas()
+            )
+
+        thread = threading.Thread(target=executar, name='aquecer-cache-figuras', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,81 @@
+import contextlib
+import logging
+import threading
+import time
+
+from flask import jsonify
+
+from metricas import etapa_inicio
+
+
+logger = logging.getLogger(__name__)
+
+
+class Carregamento:
+    # Carga dos dados numa thread própria: o servidor aceita conexões desde a importação e
+    # os callbacks esperam `pronto()`. A etapa em curso e a falha, se houver, vão para o /readyz.
+
+    def __init__(self, versao=lambda: None):
+        self.versao = versao
+        self.etapa_atual = None
+        self.erro = None
+        self.segundos = None
+        self._pronto = threading.Event()
+        self._encerrado = threading.Event()
+
+    def iniciar(self, carregar):
+        thread = threading.Thread(target=self._executar, args=(carregar,), name='carregar-dados', daemon=True)
+        thread.start()
+        return thread
+
+    def _executar(self, carregar):
+        inicio = time.perf_counter()
+        try:
+            carregar()
+        except Exception as erro:
+            self.erro = f'{type(erro).__name__}: {erro}'
+            logger.exception("Falha ao carregar os dados na etapa %s", self.etapa_atual)
+        else:
+            self.segundos = time.perf_counter() - inicio
+            self.etapa_atual = None
+            self._pronto.set()
+            logger.info("Dados prontos em %.1fs (versão %s)", self.segundos, self.versao())
+        finally:
+            self._encerrado.set()
+
+    @contextlib.contextmanager
+    def etapa(self, nome):
+        self.etapa_atual = nome
+        with etapa_inicio(nome):
+            yield
+
+    def pronto(self):
+        return self._pronto.is_set()
+
+    def esperar(self, timeout=None):
+        # Para scripts e benchmarks que importam o painel e usam os dados em seguida.
+        self._encerrado.wait(timeout)
+        if self.erro is not None:
+            raise RuntimeError(f"Falha ao carregar os dados: {self.erro}")
+        if not self.pronto():
+            raise TimeoutError("Dados ainda não carregados")
+
+    def estado(self):
+        if self.pronto():
+            return {'status': 'pronto', 'versao': self.versao(), 'segundos': round(self.segundos, 3)}
+        if self.erro is not None:
+            return {'status': 'falhou', 'etapa': self.etapa_atual, 'erro': self.erro}
+        return {'status': 'carregando', 'etapa': self.etapa_atual}
+
+
+def registrar_rotas_saude(server, carregamento):
+    # /healthz: o processo responde (e a carga não falhou); /readyz: os dados estão carregados.
+    @server.route('/healthz')
+    def vivo():
+        if carregamento.erro is not None:
+            return jsonify(status='falhou', erro=carregamento.erro), 500
+        return jsonify(status='ok')
+
+    @server.route('/readyz')
+    def pronto():
+        return jsonify(carregamento.estado()), 200 if carregamento.pronto() else 503
@@ -0,0 +1,349 @@
+import contextlib
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from atualizacao import versao_dados
+from config import CAMINHO_CSV, DIRETORIO_CACHE
+from indice import IndiceBitmap
+from municipios import ParticoesMunicipio
+from piramide import PiramideEtaria
+from ingestao import carregar_notificacoes, gravar_metadados, ler_metadados
+from preprocessamento import preprocessar_dados, projetar_tabela
+from sankey import TensorSankey
+from semanas import CalendarioSemanas, ContagensSemanais, SeriesSemanais
+from termos import IncidenciaTermos, TermosCelulas
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+PARTES_CSR = ('data', 'indices', 'indptr')
+# Incrementar quando a estrutura publicada mudar de forma incompatível: versões gravadas por
+# um formato anterior ficam numa pasta que os workers novos não leem.
+FORMATO = 3
+
+
+# Cada versão dos dados vira uma pasta de arquivos .npy (códigos das categorias, valores,
+# máscaras e os vetores das matrizes esparsas) mais um JSON com as categorias. Os workers abrem os .npy com mmap somente
+# leitura: as páginas ficam no cache do sistema operacional e são compartilhadas entre processos.
+
+
+@contextlib.contextmanager
+def trava_arquivo(caminho):
+    # Só um processo monta uma versão; os demais esperam e depois apenas anexam.
+    # Sem fcntl (Windows) não há gunicorn, e a trava é dispensável.
+    with open(caminho, 'w') as arquivo:
+        if fcntl is not None:
+            fcntl.flock(arquivo, fcntl.LOCK_EX)
+        yield
+
+
+@contextlib.contextmanager
+def trava_livre(caminho):
+    # Trava exclusiva sem espera: devolve False se outro processo segura a trava, mesmo compartilhada.
+    with open(caminho, 'a') as arquivo:
+        try:
+            if fcntl is not None:
+                fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+        else:
+            yield True
+
+
+def gravar_tabela(df, diretorio, nome):
+    colunas = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        prefixo = os.path.join(diretorio, f'{nome}.{coluna}')
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            np.save(prefixo + '.npy', serie.cat.codes.to_numpy())
+            colunas[coluna] = {'tipo': 'categoria', 'categorias': serie.cat.categories.tolist(), 'ordenada': serie.cat.ordered}
+        elif pd.api.types.is_extension_array_dtype(serie.dtype) and pd.api.types.is_integer_dtype(serie.dtype):
+            np.save(prefixo + '.npy', serie.to_numpy(dtype=serie.dtype.numpy_dtype, na_value=0))
+            np.save(prefixo + '.mascara.npy', serie.isna().to_numpy())
+            colunas[coluna] = {'tipo': 'inteiro_nulo', 'dtype': str(serie.dtype)}
+        elif pd.api.types.is_datetime64_dtype(serie.dtype):
+            np.save(prefixo + '.npy', serie.to_numpy().view('int64'))
+            colunas[coluna] = {'tipo': 'data', 'dtype': str(serie.dtype)}
+        else:
+            np.save(prefixo + '.npy', serie.to_numpy())
+            colunas[coluna] = {'tipo': 'numero'}
+    return colunas
+
+
+def anexar_tabela(diretorio, nome, colunas):
+    series = {}
+    for coluna, info in colunas.items():
+        prefixo = os.path.join(diretorio, f'{nome}.{coluna}')
+        valores = np.load(prefixo + '.npy', mmap_mode='r')
+        if info['tipo'] == 'categoria':
+            dtype = pd.CategoricalDtype(info['categorias'], ordered=info['ordenada'])
+            array = pd.Categorical.from_codes(valores, dtype=dtype, validate=False)
+        elif info['tipo'] == 'inteiro_nulo':
+            array = pd.arrays.IntegerArray(valores, np.load(prefixo + '.mascara.npy', mmap_mode='r'))
+        elif info['tipo'] == 'data':
+            array = valores.view(info['dtype'])
+        else:
+            array = valores
+        series[coluna] = pd.Series(array, name=coluna, copy=False)
+    return pd.DataFrame(series, copy=False)
+
+
+def gravar_dados(dados, diretorio):
+    # Monta a versão numa pasta temporária e renomeia: quem anexa nunca vê uma versão pela metade.
+    temporario = diretorio + '.tmp'
+    shutil.rmtree(temporario, ignore_errors=True)
+    os.makedirs(temporario)
+
+    metadados = {
+        'versao': dados['versao'],
+        'tabela': gravar_tabela(dados['tabela'], temporario, 'tabela'),
+        'cubos': {nome: gravar_tabela(cubo, temporario, f'cubo-{nome}') for nome, cubo in dados['cubos'].items()},
+        'indice': {},
+    }
+    for coluna, bitmaps in dados['indice'].bitmaps.items():
+        valores = list(bitmaps)
+        matriz = np.stack([bitmaps[valor] for valor in valores]) if valores else np.zeros((0, 0), dtype=np.uint8)
+        np.save(os.path.join(temporario, f'indice.{coluna}.npy'), matriz)
+        metadados['indice'][coluna] = [valor.item() if hasattr(valor, 'item') else valor for valor in valores]
+    metadados['termos'] = {}
+    for coluna, incidencia in dados['termos'].items():
+        for parte in PARTES_CSR:
+            np.save(os.path.join(temporario, f'termos.{coluna}.{parte}.npy'), getattr(incidencia.matriz, parte))
+        metadados['termos'][coluna] = {'termos': incidencia.termos.tolist(), 'forma': list(incidencia.matriz.shape)}
+    termos_celulas = dados['termos_celulas']
+    metadados['termos_celulas'] = {
+        'anos': termos_celulas.anos.tolist(),
+        'categorias': {dimensao: valores.tolist() for dimensao, valores in termos_celulas.categorias.items()},
+        'termos': {coluna: valores.tolist() for coluna, valores in termos_celulas.termos.items()},
+        'grupos': {coluna: valores.tolist() for coluna, valores in termos_celulas.grupos.items()},
+    }
+    for coluna, contagens in termos_celulas.contagens.items():
+        np.save(os.path.join(temporario, f'termos_celulas.{coluna}.npy'), contagens)
+    calendario = dados['series'].calendario
+    metadados['series'] = {'calendario': [calendario.primeira, calendario.n_semanas], 'contagens': {}}
+    for nome, lista in dados['series'].contagens.items():
+        metadados['series']['contagens'][nome] = []
+        for i, contagens in enumerate(lista):
+            np.save(os.path.join(temporario, f'series.{nome}.{i}.npy'), contagens.acumulado)
+            metadados['series']['contagens'][nome].append({
+                'coluna': contagens.coluna,
+                'dimensoes': contagens.dimensoes,
+                'grupos': contagens.grupos.tolist(),
+                'valores': {dimensao: valores.tolist() for dimensao, valores in contagens.valores.items()},
+            })
+    municipios = dados['municipios']
+    np.save(os.path.join(temporario, 'municipios.ordem.npy'), municipios.ordem)
+    np.save(os.path.join(temporario, 'municipios.posicoes.npy'), municipios.posicoes)
+    metadados['municipios'] = {'codigos': municipios.codigos.tolist()}
+    sankey = dados['sankey']
+    metadados['sankey'] = {
+        'anos': sankey.anos.tolist(),
+        'categorias': {dimensao: valores.tolist() for dimensao, valores in sankey.categorias.items()},
+        'rotulos': sankey.rotulos,
+        'nos': {estagio: nos.tolist() for estagio, nos in sankey.nos.items()},
+        'pares': [],
+    }
+    for origem, destino in sankey.pares:
+        matriz = sankey.pares[origem, destino]
+        for parte in PARTES_CSR:
+            np.save(os.path.join(temporario, f'sankey.{origem}.{destino}.{parte}.npy'), getattr(matriz, parte))
+        metadados['sankey']['pares'].append([origem, destino, list(matriz.shape)])
+    piramide = dados['piramide']
+    np.save(os.path.join(temporario, 'piramide.contagens.npy'), piramide.contagens)
+    metadados['piramide'] = {
+        'anos': piramide.anos.tolist(),
+        'categorias': {dimensao: valores.tolist() for dimensao, valores in piramide.categorias.items()},
+        'faixas': piramide.faixas.tolist(),
+    }
+    gravar_metadados(os.path.join(temporario, 'metadados.json'), metadados)
+
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.replace(temporario, diretorio)
+
+
+def anexar_dados(diretorio):
+    metadados = ler_metadados(os.path.join(diretorio, 'metadados.json'))
+    tabela = anexar_tabela(diretorio, 'tabela', metadados['tabela'])
+    dados = {'versao': metadados['versao'], 'tabela': tabela, **projetar_tabela(tabela)}
+    dados['cubos'] = {nome: anexar_tabela(diretorio, f'cubo-{nome}', colunas) for nome, colunas in metadados['cubos'].items()}
+
+    bitmaps = {}
+    for coluna, valores in metadados['indice'].items():
+        matriz = np.load(os.path.join(diretorio, f'indice.{coluna}.npy'), mmap_mode='r')
+        bitmaps[coluna] = {valor: matriz[i] for i, valor in enumerate(valores)}
+    dados['indice'] = IndiceBitmap.de_bitmaps(len(tabela), bitmaps)
+
+    dados['termos'] = {}
+    for coluna, info in metadados['termos'].items():
+        partes = [np.load(os.path.join(diretorio, f'termos.{coluna}.{parte}.npy'), mmap_mode='r') for parte in PARTES_CSR]
+        matriz = sparse.csr_matrix(tuple(partes), shape=tuple(info['forma']), copy=False)
+        dados['termos'][coluna] = IncidenciaTermos.de_matriz(coluna, matriz, info['termos'])
+    info = metadados['termos_celulas']
+    contagens = {coluna: np.load(os.path.join(diretorio, f'termos_celulas.{coluna}.npy'), mmap_mode='r') for coluna in info['termos']}
+    dados['termos_celulas'] = TermosCelulas.de_contagens(info['anos'], info['categorias'], info['termos'], info['grupos'], contagens)
+
+    contagens = {
+        nome: [
+            ContagensSemanais.de_acumulado(
+                info['coluna'], info['dimensoes'], info['grupos'], info['valores'],
+                np.load(os.path.join(diretorio, f'series.{nome}.{i}.npy'), mmap_mode='r')
+            )
+            for i, info in enumerate(lista)
+        ]
+        for nome, lista in metadados['series']['contagens'].items()
+    }
+    dados['series'] = SeriesSemanais.de_contagens(CalendarioSemanas(*metadados['series']['calendario']), contagens)
+
+    dados['municipios'] = ParticoesMunicipio.de_particoes(
+        metadados['municipios']['codigos'],
+        np.load(os.path.join(diretorio, 'municipios.ordem.npy'), mmap_mode='r'),
+        np.load(os.path.join(diretorio, 'municipios.posicoes.npy'), mmap_mode='r'),
+    )
+
+    info = metadados['sankey']
+    pares = {}
+    for origem, destino, forma in info['pares']:
+        partes = [np.load(os.path.join(diretorio, f'sankey.{origem}.{destino}.{parte}.npy'), mmap_mode='r') for parte in PARTES_CSR]
+        pares[origem, destino] = sparse.csr_matrix(tuple(partes), shape=tuple(forma), copy=False)
+    nos = {estagio: np.array(valores, dtype=np.int64) for estagio, valores in info['nos'].items()}
+    dados['sankey'] = TensorSankey.de_pares(info['anos'], info['categorias'], info['rotulos'], nos, pares)
+
+    info = metadados['piramide']
+    dados['piramide'] = PiramideEtaria.de_contagens(
+        info['anos'], info['categorias'], info['faixas'], np.load(os.path.join(diretorio, 'piramide.contagens.npy'), mmap_mode='r')
+    )
+    return dados
+
+
+def raiz_compartilhada(diretorio_cache):
+    return os.path.join(diretorio_cache, f'compartilhado-v{FORMATO}')
+
+
+# Arquivos .em_uso das versões anexadas por este processo, abertos com uma trava compartilhada
+# enquanto o processo viver: a limpeza só remove as pastas que ninguém segura.
+_em_uso = {}
+
+
+def anexar_versao(versao, diretorio_cache=DIRETORIO_CACHE):
+    # FileNotFoundError se a versão não foi publicada ou foi removida antes da trava.
+    destino = os.path.join(raiz_compartilhada(diretorio_cache), versao)
+    if destino not in _em_uso:
+        arquivo = open(os.path.join(destino, '.em_uso'), 'a')
+        if fcntl is not None:
+            fcntl.flock(arquivo, fcntl.LOCK_SH)
+        _em_uso[destino] = arquivo
+    if not os.path.exists(os.path.join(destino, 'metadados.json')):
+        _em_uso.pop(destino).close()
+        raise FileNotFoundError(f"Versão {versao} não publicada em {destino}")
+
+    inicio = time.perf_counter()
+    dados = anexar_dados(destino)
+    logger.info("Versão %s anexada em %.1f ms", versao, (time.perf_counter() - inicio) * 1000)
+    return dados
+
+
+def remover_se_livre(pasta):
+    with trava_livre(os.path.join(pasta, '.em_uso')) as livre:
+        if livre:
+            shutil.rmtree(pasta, ignore_errors=True)
+    return livre
+
+
+def remover_versoes_antigas(raiz, atual):
+    # Versões de outro CSV base; as que algum worker ainda tem anexadas ficam para a próxima publicação.
+    for pasta in os.listdir(raiz):
+        caminho = os.path.join(raiz, pasta)
+        if os.path.isdir(caminho) and not pasta.startswith(atual) and not remover_se_livre(caminho):
+            logger.info("Versão %s ainda anexada por outro processo; não removida", pasta)
+
+
+def remover_formatos_antigos(diretorio_cache):
+    # Pastas publicadas por formatos anteriores (a primeira não tinha sufixo), que nenhum worker deste
+    # formato lê. Uma publicação em curso de um worker antigo segura a .trava da pasta, que é pulada.
+    for nome in ['compartilhado', *(f'compartilhado-v{formato}' for formato in range(2, FORMATO))]:
+        raiz = os.path.join(diretorio_cache, nome)
+        if not os.path.isdir(raiz):
+            continue
+        with trava_livre(os.path.join(raiz, '.trava')) as livre:
+            if not livre:
+                logger.info("Publicação em curso em %s; não removida", raiz)
+                continue
+            restantes = [pasta for pasta in os.listdir(raiz) if os.path.isdir(os.path.join(raiz, pasta)) and not remover_se_livre(os.path.join(raiz, pasta))]
+            if not restantes:
+                shutil.rmtree(raiz, ignore_errors=True)
+
+
+def publicar_versao(versao, construir, raiz):
+    destino = os.path.join(raiz, versao)
+    if not os.path.exists(os.path.join(destino, 'metadados.json')):
+        with trava_arquivo(os.path.join(raiz, '.trava')):
+            if not os.path.exists(os.path.join(destino, 'metadados.json')):
+                inicio = time.perf_counter()
+                gravar_dados(construir(), destino)
+                logger.info("Versão %s publicada em memória compartilhada em %.2fs", versao, time.perf_counter() - inicio)
+
+
+def obter_versao(versao, construir, diretorio_cache=DIRETORIO_CACHE):
+    # Anexa a versão se ela já foi publicada por outro worker; senão constrói e publica.
+    raiz = raiz_compartilhada(diretorio_cache)
+    os.makedirs(raiz, exist_ok=True)
+    publicar_versao(versao, construir, raiz)
+    try:
+        return anexar_versao(versao, diretorio_cache)
+    except FileNotFoundError:
+        # Removida entre a publicação e a trava deste processo: publicada de novo.
+        logger.info("Versão %s removida antes de ser anexada; publicando de novo", versao)
+        publicar_versao(versao, construir, raiz)
+        return anexar_versao(versao, diretorio_cache)
+
+
+def carregar_dados_compartilhados(caminho=CAMINHO_CSV, diretorio_cache=DIRETORIO_CACHE):
+    # atual.json aponta para a versão base do CSV. Os workers seguintes comparam só tamanho
+    # e mtime do CSV, sem refazer o hash, e anexam a versão já publicada.
+    raiz = raiz_compartilhada(diretorio_cache)
+    caminho_atual = os.path.join(raiz, 'atual.json')
+    os.makedirs(raiz, exist_ok=True)
+
+    def atualizado(atual):
+        # Mesmo CSV (tamanho e mtime) e mesmos parâmetros de config que a versão publicada.
+        info = os.stat(caminho)
+        return (
+            atual is not None
+            and (atual['impressao']['tamanho'], atual['impressao']['mtime_ns']) == (info.st_size, info.st_mtime_ns)
+            and atual['versao'] == versao_dados(atual['impressao'])
+        )
+
+    def construir():
+        return preprocessar_dados(*carregar_notificacoes(caminho, diretorio_cache))
+
+    atual = ler_metadados(caminho_atual)
+    if not atualizado(atual):
+        with trava_arquivo(os.path.join(raiz, '.trava')):
+            atual = ler_metadados(caminho_atual)
+            if not atualizado(atual):
+                inicio = time.perf_counter()
+                df, impressao = carregar_notificacoes(caminho, diretorio_cache)
+                dados = preprocessar_dados(df, impressao)
+                gravar_dados(dados, os.path.join(raiz, dados['versao']))
+                atual = {'versao': dados['versao'], 'impressao': impressao}
+                gravar_metadados(caminho_atual, atual)
+                logger.info("Versão %s publicada em memória compartilhada em %.2fs", dados['versao'], time.perf_counter() - inicio)
+
+                # Só o processo que publica limpa, ainda com a trava: outros workers nunca removem pastas.
+                remover_versoes_antigas(raiz, atual['versao'])
+                remover_formatos_antigos(diretorio_cache)
+
+    # Se a versão sumiu (removida à mão, por exemplo), o mesmo construtor a publica de novo.
+    return obter_versao(atual['versao'], construir, diretorio_cache), atual['impressao']
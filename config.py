@@ -0,0 +1,57 @@
+import os
+
+
+CAMINHO_CSV = os.environ.get('PIBIC_CSV', 'df/dataset_IC_certoV2.csv')
+DIRETORIO_CACHE = os.environ.get('PIBIC_CACHE', 'df/cache')
+# Linhas por bloco na ingestão em streaming; 0 lê o CSV inteiro de uma vez.
+TAMANHO_BLOCO = int(os.environ.get('PIBIC_TAMANHO_BLOCO', '0'))
+# Segundos entre verificações de novos deltas de notificações; 0 desliga a verificação periódica.
+INTERVALO_ATUALIZACAO = float(os.environ.get('PIBIC_INTERVALO_ATUALIZACAO', '60'))
+CAMINHO_SHAPEFILE = os.environ.get('PIBIC_SHAPEFILE', 'df/PE_Municipios_2023.shp')
+
+# Tolerância em graus (SIRGAS 2000); 0.001 ~ 100 m.
+TOLERANCIA_MAPA = float(os.environ.get('PIBIC_TOLERANCIA_MAPA', '0.001'))
+# Casas decimais das coordenadas enviadas ao navegador; 4 casas ~ 11 m, abaixo da tolerância.
+PRECISAO_MAPA = int(os.environ.get('PIBIC_PRECISAO_MAPA', '4'))
+
+
+def _ler_faixas_piramide(texto):
+    # As faixas da pirâmide juntam as faixas de 5 anos do CSV ("20 a 24"): cada limite tem de cair no início de uma.
+    try:
+        limites = [int(limite) for limite in texto.split(',')]
+    except ValueError:
+        limites = []
+    if not limites or limites[0] != 0 or any(limite % 5 for limite in limites) or any(b <= a for a, b in zip(limites, limites[1:])):
+        raise ValueError(f"PIBIC_FAIXAS_PIRAMIDE deve listar idades múltiplas de 5 em ordem crescente, começando em 0 (recebido {texto!r})")
+    return limites
+
+
+# Idades em que começam as faixas da pirâmide etária; a última faixa é aberta ("55+"). Entram na versão dos dados.
+LIMITES_FAIXAS_PIRAMIDE = _ler_faixas_piramide(os.environ.get('PIBIC_FAIXAS_PIRAMIDE', '0,5,10,15,20,25,30,35,40,45,50,55'))
+
+# Nós por etapa do Sankey; as categorias menos frequentes além do limite viram "Outros". Entra na versão dos dados.
+LIMITE_CATEGORIAS_SANKEY = int(os.environ.get('PIBIC_SANKEY_CATEGORIAS', '15'))
+
+LIMITE_CACHE_FIGURAS_MB = float(os.environ.get('PIBIC_CACHE_FIGURAS_MB', '256'))
+AQUECER_CACHE_FIGURAS = os.environ.get('PIBIC_AQUECER_CACHE', '0') == '1'
+
+# Tabelas e agregados publicados uma vez em arquivos mapeados em memória e anexados
+# somente leitura por cada worker do gunicorn.
+COMPARTILHAR_DADOS = os.environ.get('PIBIC_COMPARTILHAR', '0') == '1'
+
+# Tempo por etapa dos callbacks, exposto em /metricas no formato do Prometheus.
+METRICAS_ATIVAS = os.environ.get('PIBIC_METRICAS', '0') == '1'
+# Callbacks acima deste tempo são registrados no log com o detalhamento por etapa; 0 desliga.
+LIMITE_CALLBACK_LENTO_MS = float(os.environ.get('PIBIC_CALLBACK_LENTO_MS', '0'))
+
+# Filtros aplicados no navegador a partir de um dcc.Store com os agregados.
+MODO_CLIENTE = os.environ.get('PIBIC_MODO_CLIENTE', '0') == '1'
+
+# Respostas comprimidas com brotli/gzip (requer flask-compress).
+COMPRIMIR_RESPOSTAS = os.environ.get('PIBIC_COMPRIMIR', '1') == '1'
+
+# Linhas por lote nas exportações de notificações (/exportar/notificacoes.csv|parquet).
+TAMANHO_LOTE_EXPORTACAO = int(os.environ.get('PIBIC_LOTE_EXPORTACAO', '50000'))
+
+# Pasta de saída da pré-renderização (python pre_renderizacao.py), pronta para um host estático.
+DIRETORIO_ESTATICO = os.environ.get('PIBIC_ESTATICO', 'df/estatico')
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+from agregados import DIMENSOES_FILTRO, consultar_cubo, contar_linhas
+from metricas import etapa
+from municipios import COLUNA_MUNICIPIO
+from semanas import inicio_semana, numero_semana, rotulo_semana
+
+
+# Filtro da barra lateral -> coluna da tabela em que ele é aplicado.
+COLUNAS_FILTRO = {
+    'ano': 'ano',
+    'raca': 'racaCor',
+    'sexo': 'sexo',
+    'faixa': 'faixaPiramide',
+    'municipio': COLUNA_MUNICIPIO,
+    'classificacao': 'classificacaoFinal',
+    'periodo': 'dataNotificacao',
+}
+# Colunas com poucos valores ganham bitmaps no IndiceBitmap; os municípios são lidos das partições
+# por código IBGE, e as demais colunas são filtradas pelos códigos das categorias.
+COLUNAS_INDEXADAS = ['ano', 'racaCor', 'sexo', 'faixaPiramide', 'classificacaoFinal']
+
+
+def _valores(valor):
+    if valor is None or isinstance(valor, str):
+        valor = [valor]
+    return sorted({v for v in valor if v not in (None, '')}, key=str)
+
+
+def _anos(ano, anos_disponiveis=None):
+    # Um ano ou um intervalo [início, fim] (o valor do RangeSlider). O intervalo que cobre
+    # todos os anos disponíveis equivale a não filtrar, e reaproveita o cubo e o cache.
+    if ano is None or ano == '':
+        return []
+    if not isinstance(ano, (list, tuple)):
+        return [int(ano)]
+    if not ano:
+        return []
+    anos = list(range(int(min(ano)), int(max(ano)) + 1))
+    if anos_disponiveis is not None and set(int(disponivel) for disponivel in anos_disponiveis) <= set(anos):
+        return []
+    return anos
+
+
+def _periodo(periodo):
+    # Intervalo de datas selecionado na série temporal, arredondado às semanas epidemiológicas
+    # que ele toca: [início da primeira semana, início da última] como 'AAAA-MM-DD'.
+    if not periodo:
+        return []
+    semanas = numero_semana([str(data)[:10] for data in periodo])
+    return [str(data) for data in inicio_semana([semanas.min(), semanas.max()])]
+
+
+class Consulta:
+    # Estado da barra lateral compilado em {coluna da tabela: valores aceitos}. Todos os
+    # construtores de gráficos recebem a mesma consulta, que vira uma única seleção: pelo cubo
+    # quando os filtros só tocam as dimensões dele, senão pelos bitmaps e códigos da tabela.
+
+    def __init__(self, filtros=None):
+        self.filtros = {coluna: valores for coluna, valores in (filtros or {}).items() if valores}
+        self.chave = tuple(sorted((coluna, tuple(valores)) for coluna, valores in self.filtros.items()))
+
+    def __eq__(self, outra):
+        return isinstance(outra, Consulta) and self.chave == outra.chave
+
+    def __hash__(self):
+        return hash(self.chave)
+
+    def sem(self, *colunas):
+        return Consulta({coluna: valores for coluna, valores in self.filtros.items() if coluna not in colunas})
+
+    def no_cubo(self):
+        return set(self.filtros) <= set(DIMENSOES_FILTRO)
+
+    def linhas(self, dados):
+        # Números das linhas selecionadas, ou None sem filtros. Cada filtro custa uma passada
+        # sobre um bitmap de n/8 bytes, então o custo cresce pouco com o número de filtros.
+        if not self.filtros:
+            return None
+        if COLUNA_MUNICIPIO in self.filtros:
+            # Com município, parte das fatias dele nas partições e confere os demais filtros só
+            # nessas linhas: o custo acompanha o tamanho dos municípios, não o da tabela.
+            linhas = dados['municipios'].linhas(self.filtros[COLUNA_MUNICIPIO])
+            for coluna, valores in self.filtros.items():
+                if coluna != COLUNA_MUNICIPIO:
+                    linhas = linhas[_mascara(dados['tabela'][coluna], valores, linhas)]
+            return linhas
+
+        indice = dados['indice']
+        selecao = None
+        for coluna, valores in self.filtros.items():
+            if coluna in indice.bitmaps:
+                bitmap = indice.bitmap(coluna, valores)
+            elif coluna == 'dataNotificacao':
+                bitmap = np.packbits(_mascara_periodo(dados['tabela'][coluna], valores))
+            else:
+                bitmap = np.packbits(_mascara_categorias(dados['tabela'][coluna], valores))
+            selecao = bitmap.copy() if selecao is None else np.bitwise_and(selecao, bitmap, out=selecao)
+        return np.flatnonzero(np.unpackbits(selecao, count=indice.n_linhas))
+
+    def contar(self, dados, nome, por, completo=()):
+        # Contagens por `por` no formato de consultar_cubo, para o cubo/projeção `nome`.
+        if self.no_cubo():
+            return consultar_cubo(dados['cubos'][nome], por, self.filtros, completo)
+        with etapa('consulta'):
+            return contar_linhas(dados[f'df_{nome}'], self.linhas(dados), por, completo)
+
+    def contar_termos(self, dados, coluna, por=None):
+        # Notificações por termo de uma coluna multivalorada (e por categoria de `por`): pelas contagens
+        # por célula quando os filtros só tocam o cubo, senão pela incidência das linhas selecionadas.
+        with etapa('consulta'):
+            if self.no_cubo():
+                return dados['termos_celulas'].contar(coluna, self.filtros, por)
+            incidencia, linhas = dados['termos'][coluna], self.linhas(dados)
+            return incidencia.contar(linhas) if por is None else incidencia.contar_por(dados['tabela'][por], linhas)
+
+    def descricao(self):
+        partes = []
+        for coluna, valores in self.filtros.items():
+            if coluna == 'ano' and len(valores) > 1:
+                partes.append(f'{valores[0]}–{valores[-1]}')
+            elif coluna == 'dataNotificacao':
+                partes.append(f'{rotulo_semana(valores[0])}–{rotulo_semana(valores[-1])}')
+            else:
+                partes.append(', '.join(str(valor) for valor in valores))
+        return ' · '.join(partes)
+
+
+def _mascara_categorias(serie, valores):
+    # Tabela de consulta por código (o último slot atende os ausentes, código -1).
+    aceitos = np.zeros(len(serie.cat.categories) + 1, dtype=bool)
+    posicoes = serie.cat.categories.get_indexer(valores)
+    aceitos[posicoes[posicoes >= 0]] = True
+    return aceitos[serie.cat.codes.to_numpy()]
+
+
+def _mascara_periodo(serie, periodo):
+    # Notificações da primeira à última semana do período, inclusive (datas ausentes ficam de fora).
+    datas = serie.to_numpy(dtype='datetime64[ns]')
+    return (datas >= np.datetime64(periodo[0])) & (datas < np.datetime64(periodo[-1]) + np.timedelta64(7, 'D'))
+
+
+def _mascara(serie, valores, linhas):
+    # Máscara do filtro só sobre `linhas`, sem varrer a coluna inteira.
+    if serie.name == 'dataNotificacao':
+        return _mascara_periodo(serie.take(linhas), valores)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return _mascara_categorias(serie.take(linhas), valores)
+    return serie.take(linhas).isin(valores).to_numpy()
+
+
+def compilar_consulta(ano=None, raca=None, sexo=None, faixa=None, municipio=None, classificacao=None, periodo=None,
+                      anos_disponiveis=None):
+    # Valores da barra lateral na ordem dos componentes, mais o período da série temporal;
+    # cada filtro aceita um valor ou uma lista.
+    estado = {'ano': _anos(ano, anos_disponiveis), 'raca': _valores(raca), 'sexo': _valores(sexo),
+              'faixa': _valores(faixa), 'municipio': _valores(municipio), 'classificacao': _valores(classificacao),
+              'periodo': _periodo(periodo)}
+    return Consulta({COLUNAS_FILTRO[filtro]: valores for filtro, valores in estado.items()})
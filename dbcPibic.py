@@ -2,15 +2,41 @@ import dash
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
-import plotly.express as px
-import plotly.graph_objects as go
+from dash.dependencies import ClientsideFunction, Input, Output, State
+import logging
 import pandas as pd
-from dash.dependencies import Input, Output, State
-import random
-import geopandas as gpd
-import unicodedata
 from shapely.geometry import Point, Polygon
 
+from atualizacao import MonitorAtualizacoes
+from cache_figuras import CacheFiguras
+from carregamento import Carregamento, registrar_rotas_saude
+from compartilhado import carregar_dados_compartilhados, obter_versao
+from consulta import compilar_consulta
+from config import (
+    AQUECER_CACHE_FIGURAS, COMPARTILHAR_DADOS, COMPRIMIR_RESPOSTAS, INTERVALO_ATUALIZACAO, LIMITE_CACHE_FIGURAS_MB,
+    METRICAS_ATIVAS, MODO_CLIENTE
+)
+from geometria import carregar_malha_municipios
+from graficos import (
+    figura_mapa, grafico_classificacao, grafico_condicoes, grafico_evolucao,
+    grafico_mapa, grafico_piramide, grafico_sankey, grafico_serie_temporal, patch_mapa, resumo_municipios
+)
+from exportacao import registrar_rotas_exportacao, url_exportacao
+from ingestao import carregar_notificacoes
+from metricas import instrumentar, metricas, registrar_rota
+from modo_cliente import comparar_payload, construir_store
+from piramide import COMPARACOES_PIRAMIDE
+from preprocessamento import atualizar_dados, preprocessar_dados
+from sankey import ESTAGIOS_PADRAO, ESTAGIOS_SANKEY
+from serializacao import comprimir_respostas, preparar_figura
+
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+# Copy-on-write ligado uma vez, no ponto de entrada do painel: as projeções df_* de
+# preprocessar_dados compartilham os buffers da tabela em vez de copiá-los.
+pd.set_option('mode.copy_on_write', True)
+
 
 app = dash.Dash(
     __name__, 
@@ -23,239 +49,284 @@ app = dash.Dash(
 
 app.title = "Dashboard de Análise"
 
+if COMPRIMIR_RESPOSTAS:
+    comprimir_respostas(app.server)
 
-df = pd.read_csv('df/dataset_IC_certoV2.csv', sep=';')
-df_piramide = pd.read_csv('df/dataset_IC_certoV2.csv', sep=';', usecols=['racaCor', 'sexo', 'faixa_etaria'])
-
-
-def normalizar_nome(nome):
-   
-        if isinstance(nome, str):
-            return ''.join(c for c in unicodedata.normalize('NFD', nome) if unicodedata.category(c) != 'Mn')
-        else:
-            
-            return nome
 
+# Preenchidos por carregar_dados() na thread de carregamento. Até lá o servidor já responde:
+# o layout sai com a barra lateral vazia e /readyz avisa que os dados ainda não chegaram.
+df = impressao_dados = dados_preprocessados = None
+anos_disponiveis = []
+malha_municipios = figura_mapa_base = None
+opcoes_municipios = []
+monitor_atualizacoes = None
+carregamento = Carregamento(versao=lambda: dados_preprocessados['versao'])
 
-df['municipio'] = df['municipio'].apply(normalizar_nome)
 
-df['municipioIBGE'] = df['municipioIBGE'].astype(str).str.zfill(7).fillna('Desconhecido')
+def consulta_barra_lateral(*filtros):
+    return compilar_consulta(*filtros, anos_disponiveis=anos_disponiveis)
 
-df['dataNotificacao'] = pd.to_datetime(df['dataNotificacao'], errors='coerce')
-df['ano'] = df['dataNotificacao'].dt.year.astype('Int64')
 
-valid_years = [2020, 2021, 2022, 2023, 2024]
-df = df[df['ano'].isin(valid_years) | df['ano'].isna()]
+cache_figuras = CacheFiguras(
+    LIMITE_CACHE_FIGURAS_MB * 2**20, versao=lambda: dados_preprocessados['versao'], compilar=consulta_barra_lateral
+)
 
-anos_disponiveis = sorted(df['ano'].dropna().unique())
 
-def preprocessar_dados():
-    df_piramide = df[['racaCor', 'sexo', 'faixa_etaria', 'ano']].copy()
-    df_piramide['faixa_etaria'] = df_piramide['faixa_etaria'].astype(str).fillna('Desconhecido')
-    df_piramide = df_piramide[df_piramide['faixa_etaria'] != 'nan']
+def aplicar_atualizacao(df_novo, versao):
+    # Os callbacks leem dados_preprocessados uma vez por chamada: a troca é uma atribuição,
+    # e as figuras em cache da versão anterior deixam de ser usadas e são descartadas.
+    global dados_preprocessados
+    if COMPARTILHAR_DADOS:
+        # O primeiro worker a ver o delta publica a nova versão; os outros só anexam.
+        dados_preprocessados = obter_versao(versao, lambda: atualizar_dados(dados_preprocessados, df_novo, versao))
+    else:
+        dados_preprocessados = atualizar_dados(dados_preprocessados, df_novo, versao)
+    cache_figuras.limpar()
 
-   
-    def agrupar_idades(faixa):
-        if ' a ' in faixa:
-            inicio_faixa = int(faixa.split(' a ')[0])
-        elif '+' in faixa:
-            inicio_faixa = int(faixa.split('+')[0])
-        else:
-            return faixa
-        return '55+' if inicio_faixa >= 55 else faixa
-
-    df_piramide['faixa_etaria'] = df_piramide['faixa_etaria'].apply(agrupar_idades)
-    categorias_ordenadas = sorted(
-        df_piramide['faixa_etaria'].unique(),
-        key=lambda x: int(x.split(' a ')[0]) if ' a ' in x and x != '55+' else (float('inf') if x == '55+' else int(x.split('+')[0]))
-    )
-    df_piramide['faixa_etaria'] = pd.Categorical(df_piramide['faixa_etaria'], categories=categorias_ordenadas, ordered=True)
 
-    
-    df_sankey = df[['sintomas', 'classificacaoFinal', 'evolucaoCaso', 'racaCor', 'sexo', 'ano']].copy()
-    df_sankey.fillna({
-        'sintomas': 'Não Informado',
-        'evolucaoCaso': 'Desconhecido',
-        'classificacaoFinal': 'Não Classificado'
-    }, inplace=True)
+store_por_versao = {}
 
-   
-    mapeamento_classificacao = {
-        'confirmado laboratorial': 'Confirmado',
-        'confirmado clínico-imagem': 'Confirmado',
-        'confirmado por critério clínico': 'Confirmado',
-        'confirmação laboratorial': 'Confirmado',
-        'confirmado clínico-epidemiológico': 'Confirmado',
-        'confirmado critério clínico': 'Confirmado'
-    }
-    df_sankey['classificacaoFinal'] = (
-        df_sankey['classificacaoFinal'].str.strip().str.lower()
-        .replace(mapeamento_classificacao)
-        .str.capitalize()
-    )
 
-    
-    df_mapa = df[['municipioNotificacao', 'racaCor', 'sexo', 'ano']].copy()
-    df_mapa['municipioNotificacao'] = df_mapa['municipioNotificacao'].apply(normalizar_nome)
+def store_agregados():
+    dados = dados_preprocessados
+    if dados['versao'] not in store_por_versao:
+        store_por_versao.clear()
+        store_por_versao[dados['versao']] = construir_store(dados, malha_municipios)
+    return store_por_versao[dados['versao']]
 
-    df_classificacao = df[['sintomas', 'classificacaoFinal', 'racaCor', 'sexo', 'ano']].copy()
-    df_evolucao = df[['evolucaoCaso', 'racaCor', 'sexo', 'ano']].copy()
-    df_condicoes = df[['condicoes', 'racaCor', 'sexo', 'ano']].copy()
 
+def propriedades_barra_lateral():
+    # Propriedades dos filtros que dependem dos dados, por id do componente: vazias até o fim da carga.
+    if not carregamento.pronto():
+        return {
+            'filtro-ano': {'min': 0, 'max': 0, 'marks': {}, 'value': None, 'disabled': True},
+            **{id_filtro: {'options': []} for id_filtro in IDS_FILTROS[1:]},
+        }
+    tabela = dados_preprocessados['tabela']
     return {
-        'df_piramide': df_piramide,
-        'df_sankey': df_sankey,
-        'df_mapa': df_mapa,  
-        'df_classificacao': df_classificacao,
-        'df_evolucao': df_evolucao,
-        'df_condicoes': df_condicoes
+        'filtro-ano': {
+            'min': anos_disponiveis[0], 'max': anos_disponiveis[-1], 'marks': {ano: str(ano) for ano in anos_disponiveis},
+            'value': [anos_disponiveis[0], anos_disponiveis[-1]], 'disabled': False,
+        },
+        'filtro-raca': {'options': [{'label': raca, 'value': raca} for raca in tabela['racaCor'].dropna().unique()]},
+        'filtro-sexo': {'options': [{'label': sexo, 'value': sexo} for sexo in tabela['sexo'].dropna().unique()]},
+        'filtro-faixa': {'options': [{'label': faixa, 'value': faixa} for faixa in tabela['faixaPiramide'].cat.categories]},
+        # O filtro de município usa o código IBGE, o mesmo do mapa (CD_MUN) e das partições por município.
+        'filtro-municipio': {'options': opcoes_municipios},
+        'filtro-classificacao': {'options': [{'label': classificacao, 'value': classificacao} for classificacao in tabela['classificacaoFinal'].cat.categories]},
     }
 
 
-dados_preprocessados = preprocessar_dados()
-
-app.layout = html.Div([
-    html.Link(
-        rel='stylesheet',
-        href='https://fonts.googleapis.com/css2?family=Poppins:wght@400;600&display=swap'
-    ),
+def layout_principal(propriedades):
+    return html.Div([
+        html.Link(
+            rel='stylesheet',
+            href='https://fonts.googleapis.com/css2?family=Poppins:wght@400;600&display=swap'
+        ),
 
-    html.Div(
-        className="header",
-        children=[
-            html.Img(src='/assets/DotLab.png', className="header-image"),
-            "Plataforma interativa para visualização dos dados das notificações de síndrome gripal do estado de Pernambuco."
-        ]
-    ),
+        html.Div(
+            className="header",
+            children=[
+                html.Img(src='/assets/DotLab.png', className="header-image"),
+                "Plataforma interativa para visualização dos dados das notificações de síndrome gripal do estado de Pernambuco."
+            ]
+        ),
 
     
-    html.Div(
-        html.Button(
-            html.I(className="fas fa-sliders-h"), 
-            id="sidebar-toggle",
-            className="sidebar-toggle-btn"
+        html.Div(
+            html.Button(
+                html.I(className="fas fa-sliders-h"), 
+                id="sidebar-toggle",
+                className="sidebar-toggle-btn"
+            ),
+            className="sidebar-toggle-container"
         ),
-        className="sidebar-toggle-container"
-    ),
 
     
-    html.Div([
         html.Div([
-            html.H4("Filtros", className="sidebar-title"),
-            html.Hr(),
-            
             html.Div([
-                html.Label("Ano:", className="filter-label"),
-                dcc.Dropdown(
-                    id='filtro-ano',
-                    options=[{'label': str(int(ano)), 'value': ano} for ano in anos_disponiveis if not pd.isna(ano)],
-                    placeholder="Selecione o ano",
-                    className="filter-dropdown"
-                )
-            ], className="filter-group"),
+                html.H4("Filtros", className="sidebar-title"),
+                html.Hr(),
             
-            html.Div([
-                html.Label("Raça:", className="filter-label"),
-                dcc.Dropdown(
-                    id='filtro-raca',
-                    options=[{'label': raca, 'value': raca} for raca in df['racaCor'].dropna().unique()],
-                    placeholder="Selecione a raça",
-                    className="filter-dropdown"
-                )
-            ], className="filter-group"),
+                html.Div([
+                    html.Label("Ano:", className="filter-label"),
+                    dcc.RangeSlider(
+                        id='filtro-ano',
+                        step=1,
+                        className="filter-slider",
+                        **propriedades['filtro-ano']
+                    )
+                ], className="filter-group"),
             
-            html.Div([
-                html.Label("Sexo:", className="filter-label"),
-                dcc.Dropdown(
-                    id='filtro-sexo',
-                    options=[{'label': sexo, 'value': sexo} for sexo in df['sexo'].dropna().unique()],
-                    placeholder="Selecione o sexo",
-                    className="filter-dropdown"
-                )
-            ], className="filter-group"),
+                html.Div([
+                    html.Label("Raça:", className="filter-label"),
+                    dcc.Dropdown(
+                        id='filtro-raca',
+                        placeholder="Selecione a raça",
+                        multi=True,
+                        className="filter-dropdown",
+                        **propriedades['filtro-raca']
+                    )
+                ], className="filter-group"),
             
-            html.Hr(),
+                html.Div([
+                    html.Label("Sexo:", className="filter-label"),
+                    dcc.Dropdown(
+                        id='filtro-sexo',
+                        placeholder="Selecione o sexo",
+                        multi=True,
+                        className="filter-dropdown",
+                        **propriedades['filtro-sexo']
+                    )
+                ], className="filter-group"),
+
+                # Filtros fora das dimensões dos cubos: no modo cliente o navegador não tem como aplicá-los.
+                *[
+                    html.Div([
+                        html.Label(rotulo, className="filter-label"),
+                        dcc.Dropdown(
+                            id=id_filtro,
+                            placeholder=texto_vazio,
+                            multi=True,
+                            disabled=MODO_CLIENTE,
+                            className="filter-dropdown",
+                            **propriedades[id_filtro]
+                        )
+                    ], className="filter-group")
+                    for rotulo, id_filtro, texto_vazio in [
+                        ("Faixa etária:", 'filtro-faixa', "Selecione a faixa etária"),
+                        ("Município:", 'filtro-municipio', "Selecione o município"),
+                        ("Classificação:", 'filtro-classificacao', "Selecione a classificação"),
+                    ]
+                ],
+
+                # Período selecionado na série temporal; também filtra os demais gráficos.
+                html.Div(id='texto-periodo', className="filter-label"),
             
-            html.H4("Páginas", className="sidebar-title"),
-            html.Div([
-                dbc.Button(
-                    [html.I(className="fas fa-chart-pie mr-2"), " Classificação e Evolução"],
-                    id="botao-pagina-1", 
-                    color="primary", 
-                    className="navigation-button",
-                    outline=False,
+                html.Hr(),
+            
+                html.H4("Exportar", className="sidebar-title"),
+                # Notificações já limpas sob os filtros atuais; os agregados de cada gráfico ficam
+                # em /exportar/agregados/<gráfico>.csv com os mesmos parâmetros.
+                html.Div([
+                    html.A(
+                        [html.I(className="fas fa-file-csv mr-2"), " Notificações (CSV)"],
+                        id="exportar-csv",
+                        href=app.get_relative_path('/exportar/notificacoes.csv'),
+                        className="export-link"
+                    ),
+                    html.A(
+                        [html.I(className="fas fa-file-download mr-2"), " Notificações (Parquet)"],
+                        id="exportar-parquet",
+                        href=app.get_relative_path('/exportar/notificacoes.parquet'),
+                        className="export-link"
+                    ),
+                ], className="export-links"),
+
+                html.Hr(),
+
+                html.H4("Páginas", className="sidebar-title"),
+                html.Div([
+                    dbc.Button(
+                        [html.I(className="fas fa-chart-pie mr-2"), " Classificação e Evolução"],
+                        id="botao-pagina-1", 
+                        color="primary", 
+                        className="navigation-button",
+                        outline=False,
                     
-                ),
-                dbc.Button(
-                    [html.I(className="fas fa-chart-bar mr-2"), " Demografia e Geolocalização"],
-                    id="botao-pagina-2", 
-                    color="secondary", 
-                    className="navigation-button",
-                    outline=True,
+                    ),
+                    dbc.Button(
+                        [html.I(className="fas fa-chart-bar mr-2"), " Demografia e Geolocalização"],
+                        id="botao-pagina-2", 
+                        color="secondary", 
+                        className="navigation-button",
+                        outline=True,
                     
-                ),
-            ], className="navigation-buttons-container"),
+                    ),
+                    dbc.Button(
+                        [html.I(className="fas fa-chart-line mr-2"), " Série Temporal"],
+                        id="botao-pagina-3",
+                        color="secondary",
+                        className="navigation-button",
+                        outline=True,
+                    ),
+                ], className="navigation-buttons-container"),
             
-            html.Hr(),
+                html.Hr(),
             
-            html.Div([
-                dbc.Button(
-                    [html.I(className="fas fa-undo mr-2"), " Resetar Filtros"],
-                    id="reset-filters",
-                    color="warning",
-                    className="reset-button",
+                html.Div([
+                    dbc.Button(
+                        [html.I(className="fas fa-undo mr-2"), " Resetar Filtros"],
+                        id="reset-filters",
+                        color="warning",
+                        className="reset-button",
                     
-                )
-            ], className="sidebar-footer")
-        ], className="sidebar-content")
-    ], className="sidebar", id="sidebar"),
-
-    html.Div([
-        dbc.Container([
-            html.Div(id='conteudo-pagina', children=[
-                dcc.Loading(
-                    id="loading-pagina",
-                    type="circle",
-                    children=html.Div(id="pagina-conteudo")
-                )
-            ])
-        ], style={'fontFamily': 'Poppins, sans-serif'}, fluid=True)
-    ], className="main-content"),
+                    )
+                ], className="sidebar-footer")
+            ], className="sidebar-content")
+        ], className="sidebar", id="sidebar"),
 
-    
-    html.Div(
-        className="footer",
-        children=[
-            html.Div(
-                className="footer-content",
-                children=[
-                    html.Img(src='/assets/unifavipLogo.png', className="footer-logo"),
-                    html.P(
-                        """Os dados de Síndrome Gripal mostrados neste painel estão completos para o períod͏o de 2020 a 2023. Mas, os ͏dados acerca de 2024 ainda estão incompletos acerca da constante atualização pelo MS.
-                            Portanto, aconselhamos qu͏e vejam com atençã͏o o ano de 2024, es͏pecialm͏ente quando com͏p͏ararem ͏c͏om ͏os ano͏s͏ anteriores.""",
-                        className="footer-text"
-                    ),
-                    html.Div(className="footer-divider"),
-                    html.P(
-                        "Projeto desenvolvido em parceria com o grupo de pesquisa DotLab e Unifavip WYDEN.",
-                        className="footer-text"
-                    ),
-                    html.Div(
-                        className="footer-links",
-                        children=[
-                            html.A("Contato", href="#"),
-                        ]
-                    ),  
-                    html.P(
-                        "© 2023 DotLab - Todos os direitos reservados",
-                        className="footer-copyright"
+        html.Div([
+            dbc.Container([
+                html.Div(id='conteudo-pagina', children=[
+                    dcc.Loading(
+                        id="loading-pagina",
+                        type="circle",
+                        children=html.Div(id="pagina-conteudo")
                     )
-                ]
-            )
-        ]
-    )
-])
+                ])
+            ], style={'fontFamily': 'Poppins, sans-serif'}, fluid=True)
+        ], className="main-content"),
 
+    
+        html.Div(
+            className="footer",
+            children=[
+                html.Div(
+                    className="footer-content",
+                    children=[
+                        html.Img(src='/assets/unifavipLogo.png', className="footer-logo"),
+                        html.P(
+                            """Os dados de Síndrome Gripal mostrados neste painel estão completos para o períod͏o de 2020 a 2023. Mas, os ͏dados acerca de 2024 ainda estão incompletos acerca da constante atualização pelo MS.
+                                Portanto, aconselhamos qu͏e vejam com atençã͏o o ano de 2024, es͏pecialm͏ente quando com͏p͏ararem ͏c͏om ͏os ano͏s͏ anteriores.""",
+                            className="footer-text"
+                        ),
+                        html.Div(className="footer-divider"),
+                        html.P(
+                            "Projeto desenvolvido em parceria com o grupo de pesquisa DotLab e Unifavip WYDEN.",
+                            className="footer-text"
+                        ),
+                        html.Div(
+                            className="footer-links",
+                            children=[
+                                html.A("Contato", href="#"),
+                            ]
+                        ),  
+                        html.P(
+                            "© 2023 DotLab - Todos os direitos reservados",
+                            className="footer-copyright"
+                        )
+                    ]
+                )
+            ]
+        )
+    ])
+
+
+def servir_layout():
+    # Servido a cada carregamento de página, para que o store do modo cliente acompanhe a versão dos dados.
+    # Aberta durante a carga, a página consulta o servidor pelo intervalo até os dados ficarem prontos.
+    pronto = carregamento.pronto()
+    return html.Div([
+        dcc.Store(id='store-agregados', data=store_agregados() if MODO_CLIENTE and pronto else None),
+        dcc.Store(id='filtro-periodo'),
+        dcc.Store(id='dados-prontos'),
+        dcc.Interval(id='intervalo-carregamento', interval=1000, disabled=pronto),
+        *layout_principal(propriedades_barra_lateral()).children
+    ])
+
+
+app.layout = servir_layout
 
 
 @app.callback(
@@ -270,370 +341,462 @@ def toggle_sidebar(n_clicks, current_class):
         return "sidebar"
     return "sidebar"
 
+IDS_FILTROS = ['filtro-ano', 'filtro-raca', 'filtro-sexo', 'filtro-faixa', 'filtro-municipio', 'filtro-classificacao']
+
+
 @app.callback(
-    [Output('filtro-ano', 'value'),
-     Output('filtro-raca', 'value'),
-     Output('filtro-sexo', 'value')],
+    [Output(id_filtro, 'value') for id_filtro in IDS_FILTROS] + [Output('filtro-periodo', 'data')],
     [Input('reset-filters', 'n_clicks')]
 )
 def reset_filters(n_clicks):
-    if n_clicks:
-        return None, None, None
+    if n_clicks and carregamento.pronto():
+        return [anos_disponiveis[0], anos_disponiveis[-1]], None, None, None, None, None, None
    
-    return dash.no_update, dash.no_update, dash.no_update
+    return [dash.no_update] * (len(IDS_FILTROS) + 1)
+
+
+@app.callback(
+    Output('filtro-periodo', 'data', allow_duplicate=True),
+    Input('grafico-serie-temporal', 'relayoutData'),
+    prevent_initial_call=True
+)
+def selecionar_periodo(relayout):
+    # Zoom, seletor de faixa ou arraste do range slider da série temporal; o duplo clique volta a tudo.
+    if not relayout:
+        return dash.no_update
+    if relayout.get('xaxis.autorange'):
+        return None
+    intervalo = relayout.get('xaxis.range') or [relayout.get('xaxis.range[0]'), relayout.get('xaxis.range[1]')]
+    if None in intervalo:
+        return dash.no_update
+    return [str(data)[:10] for data in intervalo]
+
+
+@app.callback(
+    Output('filtro-municipio', 'value', allow_duplicate=True),
+    Input('grafico-mapa-calor', 'clickData'),
+    State('filtro-municipio', 'value'),
+    prevent_initial_call=True
+)
+def selecionar_municipio(clique, selecionados):
+    # O clique no mapa filtra os demais gráficos pelo município (código IBGE, a location do mapa);
+    # clicar de novo no mesmo município limpa o filtro.
+    if not clique:
+        return dash.no_update
+    codigo = clique['points'][0]['location']
+    return None if selecionados == [codigo] else [codigo]
+
+
+def formatar_inteiro(valor):
+    return f"{valor:,}".replace(',', '.')
+
+
+def painel_municipio(resumo):
+    if resumo is None:
+        return html.P("Clique em um município no mapa para ver os detalhes e filtrar os demais gráficos.", className="painel-municipio-vazio")
+
+    linhas = [
+        ("Casos notificados", formatar_inteiro(resumo['casos'])),
+        ("Participação no estado", f"{resumo['participacao']:.1f}%".replace('.', ',')),
+        ("Confirmados", formatar_inteiro(resumo['confirmados'])),
+        ("Óbitos", formatar_inteiro(resumo['obitos'])),
+        ("Faixa etária mais frequente", resumo['faixa_predominante'] or "-"),
+    ]
+    if resumo['posicao'] is not None:
+        linhas.insert(2, ("Posição no estado", f"{resumo['posicao']}º de {resumo['n_municipios']}"))
+
+    return [
+        html.H5(', '.join(resumo['municipios']), className="painel-municipio-titulo"),
+        html.Small(f"Código IBGE: {', '.join(resumo['codigos'])}", className="text-muted"),
+        dbc.Table(
+            html.Tbody([html.Tr([html.Th(rotulo), html.Td(valor)]) for rotulo, valor in linhas]),
+            bordered=False, hover=True, size="sm", className="mt-3 mb-0"
+        ),
+    ]
+
+
+@app.callback(
+    [Output('dados-prontos', 'data'), Output('intervalo-carregamento', 'disabled'), Output('store-agregados', 'data')]
+    + [Output(id_filtro, propriedade, allow_duplicate=True) if propriedade == 'value' else Output(id_filtro, propriedade)
+       for id_filtro, valores in propriedades_barra_lateral().items() for propriedade in valores],
+    Input('intervalo-carregamento', 'n_intervals'),
+    prevent_initial_call=True
+)
+def acompanhar_carregamento(n_intervals):
+    # Ao fim da carga preenche a barra lateral e remonta a página atual; o novo valor do ano
+    # dispara os gráficos. O intervalo é desligado em seguida.
+    if not carregamento.pronto():
+        return [dash.no_update] * len(dash.callback_context.outputs_list)
+    propriedades = propriedades_barra_lateral()
+    return [
+        dados_preprocessados['versao'], True, store_agregados() if MODO_CLIENTE else None,
+        *[valor for valores in propriedades.values() for valor in valores.values()]
+    ]
+
+
+@app.callback(Output('texto-periodo', 'children'), Input('filtro-periodo', 'data'))
+def exibir_periodo(periodo):
+    descricao = compilar_consulta(periodo=periodo).descricao()
+    return f"Período da série temporal: {descricao}" if descricao else None
+
+
+def figura_inicial(id_grafico):
+    # No modo cliente os gráficos já nascem com a figura sem filtros, que o navegador recorta depois.
+    if not MODO_CLIENTE:
+        return {'data': [], 'layout': {}}
+    _, callback = callbacks_graficos[id_grafico]
+    return callback()
 
 
 @app.callback(
     [Output('pagina-conteudo', 'children'),
      Output('botao-pagina-1', 'outline'),
-     Output('botao-pagina-2', 'outline')],
+     Output('botao-pagina-2', 'outline'),
+     Output('botao-pagina-3', 'outline')],
     [Input('botao-pagina-1', 'n_clicks'),
-     Input('botao-pagina-2', 'n_clicks')]
+     Input('botao-pagina-2', 'n_clicks'),
+     Input('botao-pagina-3', 'n_clicks'),
+     Input('dados-prontos', 'data')],
+    [State('botao-pagina-2', 'outline'),
+     State('botao-pagina-3', 'outline')]
 )
-def navegar_paginas(botao1, botao2):
+@instrumentar
+def navegar_paginas(botao1, botao2, botao3, versao, outline_atual2, outline_atual3):
     ctx = dash.callback_context
     pagina = 'pagina1'  
     outline_pagina1 = False  
     outline_pagina2 = True   
+    outline_pagina3 = True
 
     if ctx.triggered:
         trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+        if trigger_id == 'dados-prontos':
+            # Dados recém-carregados: remonta a página que já estava aberta.
+            trigger_id = 'botao-pagina-2' if outline_atual2 is False else 'botao-pagina-3' if outline_atual3 is False else None
         if trigger_id == "botao-pagina-2":
             pagina = 'pagina2'
             outline_pagina1 = True   
             outline_pagina2 = False  
-
+        elif trigger_id == "botao-pagina-3":
+            pagina = 'pagina3'
+            outline_pagina1 = True
+            outline_pagina3 = False
+
+    if not carregamento.pronto():
+        aviso = html.Div("Carregando os dados das notificações…", className="carregando-dados")
+        return aviso, outline_pagina1, outline_pagina2, outline_pagina3
     if pagina == 'pagina1':
         return [
             dbc.Row([
-                dbc.Col(dcc.Graph(id='grafico-classificacao'), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
+                dbc.Col(dcc.Graph(id='grafico-classificacao', figure=figura_inicial('grafico-classificacao')), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
             ]),
             dbc.Row([
-                dbc.Col(dcc.Graph(id='grafico-evolucao'), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
+                dbc.Col(dcc.Graph(id='grafico-evolucao', figure=figura_inicial('grafico-evolucao')), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
             ]),
             dbc.Row([
-                dbc.Col(dcc.Graph(id='grafico-condicoes'), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
+                dbc.Col(dcc.Graph(id='grafico-condicoes', figure=figura_inicial('grafico-condicoes')), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
             ])
-        ], outline_pagina1, outline_pagina2
-    else:  # pagina2
+        ], outline_pagina1, outline_pagina2, outline_pagina3
+    elif pagina == 'pagina2':
         return [
             dbc.Row([
-                dbc.Col(dcc.Graph(id='grafico-piramide-etaria'), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
+                dbc.Col(html.Div([
+                    # No modo cliente o store só traz a pirâmide simples, em contagens.
+                    dcc.RadioItems(
+                        id='piramide-comparar',
+                        options=[{'label': ' Sem comparação', 'value': 'nenhuma'}] + [
+                            {'label': f' {rotulo}', 'value': coluna, 'disabled': MODO_CLIENTE} for coluna, rotulo in COMPARACOES_PIRAMIDE.items()
+                        ],
+                        value='nenhuma',
+                        inline=True,
+                        className="serie-controle"
+                    ),
+                    html.Div([
+                        dcc.Dropdown(id='piramide-valor-a', clearable=False, className="piramide-valor"),
+                        dcc.Dropdown(id='piramide-valor-b', clearable=False, className="piramide-valor"),
+                    ], id='piramide-valores', className="piramide-valores", style={'display': 'none'}),
+                    dcc.Checklist(
+                        id='piramide-normalizar',
+                        options=[{'label': ' Casos por mil', 'value': 'por_mil', 'disabled': MODO_CLIENTE}],
+                        value=[],
+                        inline=True,
+                        className="serie-controle"
+                    ),
+                ], className="piramide-controles"), width=12, lg={"size": 10, "offset": 1}),
+            ]),
+            dbc.Row([
+                dbc.Col(dcc.Graph(id='grafico-piramide-etaria', figure=figura_inicial('grafico-piramide-etaria')), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
+            ]),
+            dbc.Row([
+                dbc.Col(html.Div([
+                    html.Label("Etapas do fluxo", className="sankey-rotulo"),
+                    # No modo cliente o store só traz as etapas padrão.
+                    dcc.Dropdown(
+                        id='sankey-estagios',
+                        options=[{'label': titulo, 'value': estagio} for estagio, (_, titulo) in ESTAGIOS_SANKEY.items()],
+                        value=ESTAGIOS_PADRAO,
+                        multi=True,
+                        clearable=False,
+                        disabled=MODO_CLIENTE,
+                        className="sankey-estagios"
+                    ),
+                ], className="sankey-controles"), width=12, lg={"size": 10, "offset": 1}),
+            ]),
+            dbc.Row([
+                dbc.Col(dcc.Graph(id='grafico-sankey', figure=figura_inicial('grafico-sankey')), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
+            ]),
+            dbc.Row([
+                dbc.Col(dcc.Graph(id='grafico-mapa-calor', figure=figura_mapa_base), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
             ]),
             dbc.Row([
-                dbc.Col(dcc.Graph(id='grafico-sankey'), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
+                dbc.Col(dbc.Card(dbc.CardBody(id='painel-municipio'), className="painel-municipio"), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
+            ])
+        ], outline_pagina1, outline_pagina2, outline_pagina3
+    else:  # pagina3
+        return [
+            dbc.Row([
+                dbc.Col(html.Div([
+                    dcc.RadioItems(
+                        id='serie-agrupamento',
+                        options=[{'label': ' Classificação', 'value': 'classificacao'}, {'label': ' Evolução', 'value': 'evolucao'}],
+                        value='classificacao',
+                        inline=True,
+                        className="serie-controle"
+                    ),
+                    dcc.RadioItems(
+                        id='serie-media-movel',
+                        options=[{'label': ' Semanal', 'value': 1}, {'label': ' Média móvel de 3 semanas', 'value': 3}, {'label': ' Média móvel de 4 semanas', 'value': 4}],
+                        value=1,
+                        inline=True,
+                        className="serie-controle"
+                    ),
+                ], className="serie-controles"), width=12, lg={"size": 10, "offset": 1}),
             ]),
             dbc.Row([
-                dbc.Col(dcc.Graph(id='grafico-mapa-calor'), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
+                dbc.Col(dcc.Graph(id='grafico-serie-temporal', figure={'data': [], 'layout': {}}), width=12, lg={"size": 10, "offset": 1}, className="mb-4"),
             ])
-        ], outline_pagina1, outline_pagina2    
+        ], outline_pagina1, outline_pagina2, outline_pagina3
+
+
+# Versões agregadas dos construtores, usadas fora dos callbacks (benchmarks, pré-renderização).
+# Recebem os valores da barra lateral na ordem de IDS_FILTROS, mais o período da série temporal.
+@instrumentar
+def criar_graficos(*filtros):
+    consulta = consulta_barra_lateral(*filtros)
+    return (
+        grafico_piramide(dados_preprocessados, consulta),
+        grafico_sankey(dados_preprocessados, consulta),
+        grafico_mapa(dados_preprocessados, malha_municipios, consulta),
+    )
 
-@app.callback(
-    [Output('grafico-piramide-etaria', 'figure'),
-     Output('grafico-sankey', 'figure'),
-     Output('grafico-mapa-calor', 'figure')],
-    [Input('filtro-ano', 'value'),
-     Input('filtro-raca', 'value'),
-     Input('filtro-sexo', 'value')]
-)
-def criar_graficos(filtro_ano, filtro_raca, filtro_sexo):
-    
-    df_piramide = dados_preprocessados['df_piramide']
-    df_sankey = dados_preprocessados['df_sankey']
-    df_mapa = dados_preprocessados['df_mapa']
-
-    if filtro_ano:
-        df_piramide = df_piramide[df_piramide['ano'] == filtro_ano]
-        df_sankey = df_sankey[df_sankey['ano'] == filtro_ano]
-        df_mapa = df_mapa[df_mapa['ano'] == filtro_ano]
-    if filtro_raca:
-        df_piramide = df_piramide[df_piramide['racaCor'] == filtro_raca]
-        df_sankey = df_sankey[df_sankey['racaCor'] == filtro_raca]
-        df_mapa = df_mapa[df_mapa['racaCor'] == filtro_raca]
-    if filtro_sexo:
-        df_piramide = df_piramide[df_piramide['sexo'] == filtro_sexo]
-        df_sankey = df_sankey[df_sankey['sexo'] == filtro_sexo]
-        df_mapa = df_mapa[df_mapa['sexo'] == filtro_sexo]
-
-
-    casos_por_municipio = df_mapa.groupby('municipioNotificacao', as_index=False).size()
-    casos_por_municipio.columns = ['municipioNotificacao', 'casos']
-
-    piramide_data = df_piramide.groupby(['faixa_etaria', 'sexo']).size().reset_index(name='contagem')
-    piramide_data['contagem_negativa'] = piramide_data['contagem'] * piramide_data['sexo'].map({'Feminino': -1, 'Masculino': 1})
-    piramide_data['percentual'] = piramide_data['contagem'] / piramide_data['contagem'].sum() * 100
-    piramide_data['texto'] = piramide_data.apply(lambda row: f"{row['contagem']} ({row['percentual']:.1f}%)", axis=1)
 
-    
-    fig_piramide = px.bar(
-        piramide_data,
-        x='contagem_negativa',
-        y='faixa_etaria',
-        color='sexo',
-        orientation='h',
-        title='<b>Pirâmide Etária</b>',
-        labels={'faixa_etaria': 'Faixa Etária', 'contagem_negativa': 'Contagem', 'sexo': 'Sexo'},
-        color_discrete_map={'Masculino': '#1f77b4', 'Feminino': '#e377c2'},
-        text='texto'
+@instrumentar
+def atualizar_graficos(*filtros):
+    consulta = consulta_barra_lateral(*filtros)
+    return (
+        grafico_classificacao(dados_preprocessados, consulta),
+        grafico_evolucao(dados_preprocessados, consulta),
+        grafico_condicoes(dados_preprocessados, consulta),
     )
 
-    
-    fig_piramide.update_layout(
-        template='plotly_white',
-        height=700,
-        bargap=0.1,
-        title=dict(x=0.5, xanchor='center', font=dict(size=20, family='Poppins, sans-serif', color="black", weight='bold')),
-        xaxis=dict(title=dict(text='População', font=dict(size=14, family='Poppins, sans-serif', color="black")), showgrid=True, zeroline=True, zerolinewidth=1.5, zerolinecolor='gray'),
-        yaxis=dict(title=dict(text='Faixa Etária', font=dict(size=14, family='Poppins, sans-serif', color="black")), showgrid=False),
-        legend=dict(title='<b>Sexo</b>', font=dict(size=12, family='Poppins, sans-serif'), bgcolor='rgba(240,240,240,0.8)', bordercolor='gray', borderwidth=1),
-        transition={'duration': 800, 'easing': 'cubic-in-out'}
-    )
 
-   
-    fig_piramide.update_traces(marker_line_width=1, marker_line_color='black', textposition='outside')
-    fig_piramide.for_each_trace(lambda t: t.update(textposition='outside' if t.name == 'Masculino' else 'inside'))
+def atualizar_piramide(consulta, comparacao, valor_a, valor_b, normalizar):
+    # Sem os dois valores escolhidos, a pirâmide fica simples.
+    if comparacao not in COMPARACOES_PIRAMIDE or valor_a is None or valor_b is None:
+        comparacao = None
+    return grafico_piramide(dados_preprocessados, consulta, comparacao, [valor_a, valor_b], 'por_mil' in normalizar)
 
 
-    colunas_sankey = ['sintomas', 'classificacaoFinal', 'evolucaoCaso']
+# A comparação e a normalização entram na chave do cache junto com a consulta.
+atualizar_piramide = instrumentar(cache_figuras.em_cache(atualizar_piramide, extras=4))
 
-    sankey_data = pd.concat([
-        df_sankey.groupby([colunas_sankey[i], colunas_sankey[i + 1]])
-        .size()
-        .reset_index(name='fluxo')
-        .rename(columns={colunas_sankey[i]: 'categoria_origem', colunas_sankey[i + 1]: 'categoria_destino'})
-        for i in range(len(colunas_sankey) - 1)
-    ], ignore_index=True)
 
-    
-    todos_os_nos = list(set(sankey_data['categoria_origem']).union(set(sankey_data['categoria_destino'])))
-    indices_nos = {nome: i for i, nome in enumerate(todos_os_nos)}
+# Aquecimento e figura inicial: os valores iniciais dos controles da pirâmide.
+def piramide_padrao(*filtros):
+    return atualizar_piramide(*filtros, 'nenhuma', None, None, [])
 
-    
-    cores_nos_definidas = {
-        'Cura': '#00995E', 'Óbito': '#000000', 'Febre': '#FFC567',
-        'Confirmado': '#FD5A46', 'Não Classificado': '#058CD7',
-        'Não Informado': '#B0BEC5', 'Desconhecido': '#607D8B'
-    }
 
-    def gerar_cor_aleatoria():
-        return f'#{random.randint(0, 0xFFFFFF):06x}'
+def atualizar_sankey(consulta, estagios):
+    return grafico_sankey(dados_preprocessados, consulta, estagios)
 
-    cores_nos = [cores_nos_definidas.get(categoria, gerar_cor_aleatoria()) for categoria in todos_os_nos]
 
-   
-    fig_sankey = go.Figure(data=[go.Sankey(
-        node=dict(
-            pad=20, thickness=30, line=dict(color="black", width=0.5),
-            label=todos_os_nos, color=cores_nos
-        ),
-        link=dict(
-            source=sankey_data['categoria_origem'].map(indices_nos).tolist(),
-            target=sankey_data['categoria_destino'].map(indices_nos).tolist(),
-            value=sankey_data['fluxo'].tolist(),
-            color="rgba(0, 123, 255, 0.4)",
-            line=dict(color="rgba(0, 123, 255, 0.8)", width=1)
-        )
-    )])
+# As etapas escolhidas entram na chave do cache junto com a consulta.
+atualizar_sankey = instrumentar(cache_figuras.em_cache(atualizar_sankey, extras=1))
 
-   
-    fig_sankey.update_layout(
-        title_text="Fluxo de Sintomas, Classificação e Evolução dos Casos",
-        title_font=dict(size=22, family='Poppins, sans-serif', color='black'),
-        font_size=14, height=700, template="plotly_white", showlegend=False,
-        margin=dict(l=50, r=50, t=80, b=50),
-        plot_bgcolor='rgba(240, 240, 240, 0.9)',
-        title={'x': 0.5, 'xanchor': 'center', 'yanchor': 'top'}
-    )
 
+# Aquecimento e figura inicial: as etapas padrão, com a mesma chave do valor inicial do dropdown.
+def sankey_padrao(*filtros):
+    return atualizar_sankey(*filtros, ESTAGIOS_PADRAO)
 
-    
-    gdf_municipios = gpd.read_file('df/PE_Municipios_2023.shp')
 
-    
-    gdf_mapa = gdf_municipios.merge(casos_por_municipio, left_on='NM_MUN', right_on='municipioNotificacao', how='left')
+@instrumentar
+@cache_figuras.em_cache
+def atualizar_mapa(consulta):
+    return patch_mapa(dados_preprocessados, malha_municipios, consulta)
 
-    
-    gdf_mapa['casos'] = gdf_mapa['casos'].fillna(0)
 
-    
-    fig_mapa_calor = go.Figure(go.Choroplethmapbox(
-        geojson=gdf_mapa.__geo_interface__,  
-        locations=gdf_mapa.index,  
-        z=gdf_mapa['casos'],  
-        colorscale='Viridis',  
-        marker_opacity=0.8,
-        marker_line_width=0.5,
-        colorbar_title="Casos",
-        hovertemplate=(
-            "<b>Município:</b> %{customdata[0]}<br>"
-            "<b>Casos:</b> %{z}<extra></extra>"
-        ),
-        customdata=gdf_mapa[['NM_MUN']].values  
-    ))
+@instrumentar
+@cache_figuras.em_cache
+def atualizar_classificacao(consulta):
+    return grafico_classificacao(dados_preprocessados, consulta)
 
-    
-    fig_mapa_calor.update_layout(
-        mapbox=dict(
-            style='carto-positron',
-            zoom=6.5,
-            center=dict(lat=-8.5, lon=-37.8),
-        ),
-        margin=dict(r=0, t=50, l=0, b=0),
-        height=700,
-        title=dict(
-            text="Mapa de Casos por Município - Síndrome Gripal",
-            x=0.5, xanchor='center',
-            font=dict(size=20, family='Poppins, sans-serif', color="black")
+
+@instrumentar
+@cache_figuras.em_cache
+def atualizar_evolucao(consulta):
+    return grafico_evolucao(dados_preprocessados, consulta)
+
+
+@instrumentar
+@cache_figuras.em_cache
+def atualizar_condicoes(consulta):
+    return grafico_condicoes(dados_preprocessados, consulta)
+
+
+def atualizar_serie_temporal(consulta, agrupamento, media_movel):
+    return grafico_serie_temporal(dados_preprocessados, consulta, agrupamento or 'classificacao', int(media_movel or 1))
+
+
+# Os dois controles da página entram na chave do cache junto com a consulta.
+atualizar_serie_temporal = instrumentar(cache_figuras.em_cache(atualizar_serie_temporal, extras=2))
+
+
+callbacks_graficos = {
+    'grafico-piramide-etaria': ('piramide', piramide_padrao),
+    'grafico-sankey': ('sankey', sankey_padrao),
+    'grafico-mapa-calor': ('mapa', atualizar_mapa),
+    'grafico-classificacao': ('classificacao', atualizar_classificacao),
+    'grafico-evolucao': ('evolucao', atualizar_evolucao),
+    'grafico-condicoes': ('condicoes', atualizar_condicoes),
+}
+
+# Controles da página de cada gráfico, que chegam depois dos filtros.
+controles_graficos = {
+    'grafico-piramide-etaria': (atualizar_piramide, ['piramide-comparar', 'piramide-valor-a', 'piramide-valor-b', 'piramide-normalizar']),
+    'grafico-sankey': (atualizar_sankey, ['sankey-estagios']),
+}
+
+entradas_filtros = [Input(id_filtro, 'value') for id_filtro in IDS_FILTROS] + [Input('filtro-periodo', 'data')]
+
+for id_grafico, (nome_cliente, callback) in callbacks_graficos.items():
+    if MODO_CLIENTE:
+        # Os filtros são aplicados no navegador sobre o store de agregados (Assets/filtro_cliente.js);
+        # os cubos só têm ano, raça e sexo como dimensões de filtro (e nenhuma data: o período
+        # selecionado na série temporal não se aplica aqui).
+        app.clientside_callback(
+            ClientsideFunction(namespace='pibic', function_name=nome_cliente),
+            Output(id_grafico, 'figure'),
+            [Input('store-agregados', 'data')] + entradas_filtros[:3],
+            State(id_grafico, 'figure')
         )
-    )
+    elif id_grafico in controles_graficos:
+        funcao, controles = controles_graficos[id_grafico]
+        app.callback(Output(id_grafico, 'figure'), entradas_filtros + [Input(controle, 'value') for controle in controles])(funcao)
+    else:
+        app.callback(Output(id_grafico, 'figure'), entradas_filtros)(callback)
 
-    return fig_piramide, fig_sankey, fig_mapa_calor 
+@instrumentar
+def atualizar_painel_municipio(*filtros):
+    return painel_municipio(resumo_municipios(dados_preprocessados, malha_municipios, consulta_barra_lateral(*filtros)))
 
 
-@app.callback(
-    [Output('grafico-classificacao', 'figure'),
-     Output('grafico-evolucao', 'figure'),
-     Output('grafico-condicoes', 'figure')],
-    [Input('filtro-ano', 'value'),
-     Input('filtro-raca', 'value'),
-     Input('filtro-sexo', 'value')]
-)
-def atualizar_graficos(filtro_ano, filtro_raca, filtro_sexo):
-    
-    df_classificacao = dados_preprocessados['df_classificacao']
-    df_evolucao = dados_preprocessados['df_evolucao']
-    df_condicoes = dados_preprocessados['df_condicoes']
-
-    if filtro_ano:
-        df_classificacao = df_classificacao[df_classificacao['ano'] == filtro_ano]
-        df_evolucao = df_evolucao[df_evolucao['ano'] == filtro_ano]
-        df_condicoes = df_condicoes[df_condicoes['ano'] == filtro_ano]
-    if filtro_raca:
-        df_classificacao = df_classificacao[df_classificacao['racaCor'] == filtro_raca]
-        df_evolucao = df_evolucao[df_evolucao['racaCor'] == filtro_raca]
-        df_condicoes = df_condicoes[df_condicoes['racaCor'] == filtro_raca]
-    if filtro_sexo:
-        df_classificacao = df_classificacao[df_classificacao['sexo'] == filtro_sexo]
-        df_evolucao = df_evolucao[df_evolucao['sexo'] == filtro_sexo]
-        df_condicoes = df_condicoes[df_condicoes['sexo'] == filtro_sexo]
-    
-    df_classificacao_agg = df_classificacao.groupby(['sintomas', 'classificacaoFinal']).size().reset_index(name='count')
-    df_evolucao_agg = df_evolucao.groupby('evolucaoCaso').size().reset_index(name='Contagem')
-    df_condicoes_agg = df_condicoes.groupby('condicoes').size().reset_index(name='Contagem').nlargest(10, 'Contagem')
+app.callback(Output('painel-municipio', 'children'), entradas_filtros)(atualizar_painel_municipio)
 
-    
-    
-    fig_classificacao = px.bar(
-        df_classificacao_agg, 
-        y='sintomas',  
-        x='count',     
-        color='classificacaoFinal',
-        title='Classificação Final X Sintomas',
-        labels={'count': 'Número de Casos', 'sintomas': 'Sintomas'},
-        barmode='group',
-        color_discrete_sequence=px.colors.qualitative.Set2,
-        orientation='h'  
-    )
-   
-    fig_classificacao.update_layout(
-        title={'text': '<b>Classificação Final por Sintomas</b>', 'y': 0.95, 'x': 0.5, 'xanchor': 'center', 'yanchor': 'top'},
-        yaxis=dict(categoryorder='total ascending', title_font=dict(size=16, family='Poppins, sans-serif', color='black')),  
-        xaxis=dict(title_font=dict(size=16, family='Poppins, sa ns-serif', color='black')),  
-        legend=dict(title='<b>Classificação Final:</b>', font=dict(size=14, family='Poppins, sans-serif', color='black'), bgcolor='rgba(240,240,240,0.8)', bordercolor='gray', borderwidth=1),
-        margin=dict(l=50, r=50, t=80, b=50),
-        bargap=0.2,
-        bargroupgap=0.1,
-        plot_bgcolor='rgba(240,240,240,0.5)',
-        transition={
-            'duration': 500,
-            'easing': 'cubic-in-out'  
-        }
-    )
 
-    fig_classificacao.update_traces(marker=dict(line=dict(color='black', width=1)))
-
-    fig_evolucao = px.bar(
-        df_evolucao_agg, 
-        y='evolucaoCaso',  
-        x='Contagem',      
-        title='<b>Contagem de Evolução de Casos</b>',
-        labels={'Contagem': 'Número de Casos', 'evolucaoCaso': 'Evolução do Caso'},
-        color='evolucaoCaso',
-        color_discrete_sequence=px.colors.qualitative.Pastel,
-        orientation='h'  
-    )
+@app.callback(
+    [Output('piramide-valor-a', 'options'), Output('piramide-valor-b', 'options'),
+     Output('piramide-valor-a', 'value'), Output('piramide-valor-b', 'value'), Output('piramide-valores', 'style')],
+    Input('piramide-comparar', 'value')
+)
+def opcoes_comparacao_piramide(comparacao):
+    # Os dois anos mais recentes ou as duas primeiras raças já vêm escolhidos.
+    if comparacao == 'ano':
+        valores = anos_disponiveis
+        padrao = valores[-2:] if len(valores) > 1 else valores * 2
+    elif comparacao == 'racaCor':
+        valores = list(dados_preprocessados['tabela']['racaCor'].dropna().unique())
+        padrao = valores[:2] if len(valores) > 1 else valores * 2
+    else:
+        return [], [], None, None, {'display': 'none'}
+    opcoes = [{'label': str(valor), 'value': valor} for valor in valores]
+    return opcoes, opcoes, *(padrao or [None, None]), {}
+
+
+@app.callback([Output('exportar-csv', 'href'), Output('exportar-parquet', 'href')], entradas_filtros)
+def atualizar_links_exportacao(*filtros):
+    return [url_exportacao(app.get_relative_path(f'/exportar/notificacoes.{formato}'), *filtros) for formato in ('csv', 'parquet')]
+
+
+# A série temporal é sempre montada no servidor: o store do modo cliente não tem as datas.
+app.callback(
+    Output('grafico-serie-temporal', 'figure'),
+    entradas_filtros + [Input('serie-agrupamento', 'value'), Input('serie-media-movel', 'value')]
+)(atualizar_serie_temporal)
+
+def metricas_cache_figuras():
+    estatisticas = cache_figuras.estatisticas()
+    return {
+        'pibic_cache_figuras_itens': ('gauge', 'Figuras guardadas no cache.', estatisticas['itens']),
+        'pibic_cache_figuras_bytes': ('gauge', 'Bytes ocupados pelo cache de figuras.', estatisticas['bytes']),
+        'pibic_cache_figuras_acertos_total': ('counter', 'Figuras servidas do cache.', estatisticas['acertos']),
+        'pibic_cache_figuras_falhas_total': ('counter', 'Figuras construídas por falta no cache.', estatisticas['falhas']),
+    }
 
-    fig_evolucao.update_layout(
-        showlegend=False,
-        template='plotly_white',
-        title=dict(y=0.95, x=0.5, xanchor='center', yanchor='top', font=dict(size=20, family='Poppins, sans-serif', color="black", weight='bold')),
-        yaxis=dict(title_font=dict(size=16, family='Poppins, sans-serif', color='black'), tickfont=dict(size=12, family='Poppins, sans-serif', color='black')),  
-        xaxis=dict(title_font=dict(size=16, family='Poppins, sans-serif', color='black'), tickfont=dict(size=12, family='Poppins, sans-serif', color='black')),  
-        margin=dict(l=50, r=50, t=80, b=50),
-        bargap=0.2,
-        plot_bgcolor='rgba(240,240,240,0.5)',
-        transition={'duration': 500, 'easing': 'cubic-in-out'}
-    )
 
-    fig_evolucao.update_traces(marker_line=dict(color='black', width=1))
-    
-    fig_condicoes = px.bar(
-    df_condicoes_agg,
-    y='condicoes',
-    x='Contagem',
-    title='Top 10 Condições mais Frequentes',
-    labels={'Contagem': 'Número de Casos', 'condicoes': 'Condição'},
-    color='Contagem',
-    color_continuous_scale=px.colors.sequential.Viridis,
-    orientation='h',
-    text='Contagem'  
+if METRICAS_ATIVAS:
+    registrar_rota(app.server)
+    metricas.coletores.append(metricas_cache_figuras)
+
+def carregar_dados():
+    # Executada na thread de carregamento; cada etapa é cronometrada em /metricas e no log.
+    global df, impressao_dados, dados_preprocessados, anos_disponiveis
+    global malha_municipios, figura_mapa_base, opcoes_municipios, monitor_atualizacoes
+    if COMPARTILHAR_DADOS:
+        # Os workers anexam as tabelas publicadas pelo primeiro deles, sem cópia própria.
+        with carregamento.etapa('dados_compartilhados'):
+            dados_preprocessados, impressao_dados = carregar_dados_compartilhados()
+        df = dados_preprocessados['tabela']
+    else:
+        with carregamento.etapa('ingestao'):
+            df, impressao_dados = carregar_notificacoes()
+        with carregamento.etapa('preprocessamento'):
+            dados_preprocessados = preprocessar_dados(df, impressao_dados)
+
+    anos_disponiveis = sorted(int(ano) for ano in df['ano'].dropna().unique())
+
+    with carregamento.etapa('malha'):
+        malha_municipios = carregar_malha_municipios()
+        # Figura do mapa só com a geometria; os callbacks de filtro enviam apenas Patch sobre ela.
+        figura_mapa_base = preparar_figura(figura_mapa(malha_municipios))
+    opcoes_municipios = sorted(
+        ({'label': nome, 'value': codigo} for nome, codigo in zip(malha_municipios['nomes'], malha_municipios['codigos'])),
+        key=lambda opcao: opcao['label']
     )
 
-    fig_condicoes.update_layout(
-        showlegend=False,
-        coloraxis_showscale=False,
-        template='plotly_white',
-        title=dict(
-            y=0.95, 
-            x=0.5, 
-            xanchor='center', 
-            yanchor='top', 
-            font=dict(size=20, family='Poppins, sans-serif', weight='bold', color="black")
-        ),
-        yaxis=dict(
-            title_font=dict(size=16, family='Poppins, sans-serif', color='black'), 
-            tickfont=dict(size=12, family='Poppins, sans-serif', color='black'),
-            automargin=True  
-        ),
-        xaxis=dict(
-            title_font=dict(size=16, family='Poppins, sans-serif', color='black'), 
-            tickfont=dict(size=12, family='Poppins, sans-serif', color='black')
-        ),
-        margin=dict(l=100, r=50, t=80, b=50),  
-        bargap=0.2,
-        plot_bgcolor='rgba(240,240,240,0.5)',
-        transition={'duration': 500, 'easing': 'cubic-in-out'},
-        uniformtext_minsize=10,  
-        uniformtext_mode='hide'  
-    )
+    # Deltas já registrados entram antes de ficar pronto; os seguintes são verificados periodicamente.
+    with carregamento.etapa('atualizacoes'):
+        monitor_atualizacoes = MonitorAtualizacoes(impressao_dados, aplicar_atualizacao)
+        monitor_atualizacoes.verificar()
+    if INTERVALO_ATUALIZACAO > 0:
+        monitor_atualizacoes.iniciar(INTERVALO_ATUALIZACAO)
+
+    if MODO_CLIENTE:
+        with carregamento.etapa('modo_cliente'):
+            comparar_payload(
+                store_agregados(),
+                [callback() for _, callback in callbacks_graficos.values()]
+            )
 
-    
-    fig_condicoes.update_traces(
-        marker_line=dict(color='black', width=1),
-        texttemplate='%{x}',  
-        textposition='outside',  
-        textfont=dict(
-            size=12,
-            family='Poppins, sans-serif',
-            color='black'
-        ),
-        cliponaxis=False  
-    )
+    if AQUECER_CACHE_FIGURAS:
+        cache_figuras.aquecer(
+            [callback for _, callback in callbacks_graficos.values()],
+            anos_disponiveis, df['racaCor'].dropna().unique(), df['sexo'].dropna().unique()
+        )
 
-    
-    fig_condicoes.update_xaxes(rangemode="tozero", autorange=True)
 
-    return fig_classificacao, fig_evolucao, fig_condicoes
+registrar_rotas_saude(app.server, carregamento)
+registrar_rotas_exportacao(app.server, carregamento, lambda: (dados_preprocessados, malha_municipios), consulta_barra_lateral)
+carregamento.iniciar(carregar_dados)
 
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,217 @@
+import io
+import logging
+import time
+from urllib.parse import urlencode
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from flask import Response, abort, request
+
+from config import TAMANHO_LOTE_EXPORTACAO
+from graficos import casos_mapa
+from piramide import COMPARACOES_PIRAMIDE
+from sankey import ESTAGIOS_PADRAO, ESTAGIOS_SANKEY
+
+
+logger = logging.getLogger(__name__)
+
+# Coluna exportada -> coluna da tabela, já com a limpeza do painel: nomes de município normalizados,
+# classificação mapeada, faixas etárias agrupadas e ausentes nomeados como nos gráficos.
+COLUNAS_EXPORTACAO = {
+    'dataNotificacao': 'dataNotificacao',
+    'ano': 'ano',
+    'municipio': 'municipio',
+    'municipioIBGE': 'municipioIBGE',
+    'racaCor': 'racaCor',
+    'sexo': 'sexo',
+    'faixa_etaria': 'faixa_etaria',
+    'faixa_piramide': 'faixaPiramide',
+    'sintomas': 'sintomasSankey',
+    'classificacaoFinal': 'classificacaoSankey',
+    'evolucaoCaso': 'evolucaoSankey',
+    'condicoes': 'condicoes',
+}
+# Parâmetros da URL na ordem de IDS_FILTROS mais o período; cada um pode se repetir (?raca=Parda&raca=Branca),
+# e ano e período são intervalos [início, fim] como no RangeSlider e na seleção da série temporal.
+PARAMETROS_FILTRO = ['ano', 'raca', 'sexo', 'faixa', 'municipio', 'classificacao', 'periodo']
+FORMATOS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+
+def _piramide(dados, malha, consulta, parametros):
+    # ?comparar=ano&valor=2021&valor=2022 empilha as pirâmides dos valores, cada uma com seu por_mil.
+    piramide = dados['piramide']
+    comparacao = parametros.get('comparar')
+    if comparacao is None:
+        return piramide.tabela(piramide.contar(dados, consulta))
+    if comparacao not in COMPARACOES_PIRAMIDE:
+        raise ValueError(f"Comparação desconhecida: {comparacao}")
+    valores = [int(valor) if comparacao == 'ano' else valor for valor in parametros.getlist('valor')]
+    contagens = piramide.comparar(dados, consulta, comparacao, valores)
+    colunas = [comparacao, 'faixa_etaria', 'sexo', 'contagem', 'por_mil']
+    partes = [piramide.tabela(matriz).assign(**{comparacao: valor})[colunas] for valor, matriz in zip(valores, contagens)]
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=colunas)
+
+
+def _sankey(dados, malha, consulta, parametros):
+    estagios = [estagio for estagio in parametros.getlist('estagio') if estagio in ESTAGIOS_SANKEY] or ESTAGIOS_PADRAO
+    tensor = dados['sankey']
+    partes = []
+    for origem, destino, matriz in zip(estagios, estagios[1:], tensor.fluxos(dados, consulta, estagios)):
+        contagens = pd.DataFrame(matriz, index=tensor.rotulos[origem], columns=tensor.rotulos[destino]).stack()
+        contagens = contagens[contagens > 0].rename_axis(['origem', 'destino']).reset_index(name='contagem')
+        partes.append(contagens.assign(etapa_origem=origem, etapa_destino=destino))
+    colunas = ['etapa_origem', 'origem', 'etapa_destino', 'destino', 'contagem']
+    return pd.concat(partes, ignore_index=True)[colunas] if partes else pd.DataFrame(columns=colunas)
+
+
+def _serie(dados, malha, consulta, parametros):
+    agrupamento = parametros.get('agrupamento', 'classificacao')
+    if agrupamento not in ('classificacao', 'evolucao'):
+        raise ValueError(f"Agrupamento desconhecido: {agrupamento}")
+    casos = dados['series'].casos(dados, consulta, agrupamento, int(parametros.get('media_movel', 1)))['casos']
+    return casos.rename_axis('semana').reset_index()
+
+
+# As mesmas consultas dos construtores de graficos.py, sem a figura. Condições vão completas,
+# não só as dez do gráfico.
+TABELAS_GRAFICOS = {
+    'piramide': _piramide,
+    'sankey': _sankey,
+    'mapa': lambda dados, malha, consulta, parametros: pd.DataFrame({
+        'municipioIBGE': malha['codigos'], 'municipio': malha['nomes'], 'contagem': casos_mapa(dados, malha, consulta)}),
+    'classificacao': lambda dados, malha, consulta, parametros: consulta.contar_termos(
+        dados, 'sintomas', 'classificacaoFinal').reset_index(name='contagem'),
+    'evolucao': lambda dados, malha, consulta, parametros: consulta.contar(
+        dados, 'evolucao', 'evolucaoCaso').reset_index(name='contagem'),
+    'condicoes': lambda dados, malha, consulta, parametros: consulta.contar_termos(
+        dados, 'condicoes').reset_index(name='contagem'),
+    'serie': _serie,
+}
+
+
+def url_exportacao(caminho, *filtros):
+    # Link de download para o estado da barra lateral (valores na ordem de PARAMETROS_FILTRO).
+    parametros = []
+    for nome, valor in zip(PARAMETROS_FILTRO, filtros):
+        valores = valor if isinstance(valor, (list, tuple)) else [valor]
+        parametros += [(nome, v) for v in valores if v not in (None, '')]
+    return f"{caminho}?{urlencode(parametros)}" if parametros else caminho
+
+
+def lotes_notificacoes(dados, consulta, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    # A seleção sai em fatias de `tamanho_lote` linhas: só a fatia corrente é copiada da tabela,
+    # e a seleção inteira nunca existe como DataFrame. Uma seleção vazia ainda gera um lote (vazio),
+    # para que o arquivo tenha cabeçalho/esquema.
+    comeco = time.perf_counter()
+    tabela = dados['tabela'][list(COLUNAS_EXPORTACAO.values())].set_axis(list(COLUNAS_EXPORTACAO), axis=1)
+    linhas = consulta.linhas(dados)
+    total = len(tabela) if linhas is None else len(linhas)
+    for inicio in range(0, max(total, 1), tamanho_lote):
+        if linhas is None:
+            yield tabela.iloc[inicio:inicio + tamanho_lote]
+        else:
+            yield tabela.take(linhas[inicio:inicio + tamanho_lote])
+    logger.info(
+        "Exportação de %d notificações (%s) em %.1fs", total, consulta.descricao() or 'sem filtros', time.perf_counter() - comeco
+    )
+
+
+def csv_em_lotes(lotes):
+    # Escrito pelo pyarrow, bem mais rápido que DataFrame.to_csv; datas saem sem o horário.
+    for i, lote in enumerate(lotes):
+        tabela = pa.Table.from_pandas(lote, preserve_index=False)
+        for j, campo in enumerate(tabela.schema):
+            if pa.types.is_timestamp(campo.type):
+                tabela = tabela.set_column(j, campo.name, tabela.column(j).cast(pa.date32()))
+        saida = io.BytesIO()
+        pa_csv.write_csv(tabela, saida, pa_csv.WriteOptions(include_header=i == 0, quoting_style='needed'))
+        yield saida.getvalue()
+
+
+class SaidaEmPartes:
+    # Arquivo só de escrita para o ParquetWriter: os bytes ficam aqui até serem retirados e enviados.
+    # tell() conta tudo o que já foi escrito, para que os deslocamentos no rodapé fiquem certos.
+
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+        self.closed = False
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def retirar(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+
+def parquet_em_lotes(lotes):
+    # Um row group por lote, enviado assim que escrito; o rodapé vai no fim.
+    saida = SaidaEmPartes()
+    escritor = None
+    for lote in lotes:
+        tabela = pa.Table.from_pandas(lote, preserve_index=False)
+        if escritor is None:
+            escritor = pq.ParquetWriter(pa.PythonFile(saida, mode='w'), tabela.schema)
+        escritor.write_table(tabela)
+        yield saida.retirar()
+    escritor.close()
+    yield saida.retirar()
+
+
+def _resposta(partes, formato, nome, versao):
+    return Response(partes, mimetype=FORMATOS[formato], headers={
+        'Content-Disposition': f'attachment; filename="{nome}.{formato}"',
+        'X-Versao-Dados': versao,
+    })
+
+
+def registrar_rotas_exportacao(server, carregamento, estado, compilar):
+    # Downloads com o estado da barra lateral na URL. `estado` devolve (dados, malha) da versão em uso,
+    # lida uma vez por requisição: um delta aplicado durante o download não mistura versões.
+    # O corpo é um gerador, produzido enquanto o cliente lê, na thread da própria requisição.
+
+    def consulta_requisicao():
+        if not carregamento.pronto():
+            abort(503)
+        try:
+            return compilar(*[request.args.getlist(nome) or None for nome in PARAMETROS_FILTRO])
+        except ValueError:
+            abort(400)
+
+    @server.route('/exportar/notificacoes.<formato>')
+    def exportar_notificacoes(formato):
+        if formato not in FORMATOS:
+            abort(404)
+        consulta = consulta_requisicao()
+        dados, _ = estado()
+
+        partes = (csv_em_lotes if formato == 'csv' else parquet_em_lotes)(lotes_notificacoes(dados, consulta))
+        return _resposta(partes, formato, 'notificacoes', dados['versao'])
+
+    @server.route('/exportar/agregados/<grafico>.<formato>')
+    def exportar_agregados(grafico, formato):
+        if grafico not in TABELAS_GRAFICOS or formato not in FORMATOS:
+            abort(404)
+        consulta = consulta_requisicao()
+        dados, malha = estado()
+        try:
+            tabela = TABELAS_GRAFICOS[grafico](dados, malha, consulta, request.args)
+        except ValueError:
+            abort(400)
+        partes = (csv_em_lotes if formato == 'csv' else parquet_em_lotes)([tabela])
+        return _resposta(partes, formato, grafico, dados['versao'])
@@ -0,0 +1,64 @@
+import json
+import logging
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from config import CAMINHO_SHAPEFILE, PRECISAO_MAPA, TOLERANCIA_MAPA
+
+
+logger = logging.getLogger(__name__)
+
+
+def _simplificar(geometrias, tolerancia):
+    # coverage_simplify (shapely >= 2.1) mantém as fronteiras compartilhadas entre
+    # municípios; nas versões anteriores cada polígono é simplificado isoladamente.
+    if hasattr(shapely, 'coverage_simplify'):
+        return gpd.GeoSeries(shapely.coverage_simplify(geometrias.values, tolerancia), index=geometrias.index, crs=geometrias.crs)
+    return geometrias.simplify(tolerancia, preserve_topology=True)
+
+
+def _arredondar(geometrias, precisao):
+    # Vértices compartilhados arredondam para o mesmo ponto, então as fronteiras continuam coincidindo.
+    return gpd.GeoSeries(shapely.transform(geometrias.values, lambda coordenadas: np.round(coordenadas, precisao)), index=geometrias.index, crs=geometrias.crs)
+
+
+def _tamanho_json(geojson):
+    return len(json.dumps(geojson, separators=(',', ':')).encode('utf-8'))
+
+
+def carregar_malha_municipios(caminho=CAMINHO_SHAPEFILE, tolerancia=TOLERANCIA_MAPA, precisao=PRECISAO_MAPA):
+    gdf = gpd.read_file(caminho)[['CD_MUN', 'NM_MUN', 'geometry']].reset_index(drop=True)
+
+    tamanho_original = _tamanho_json(gdf.__geo_interface__)
+    if tolerancia:
+        gdf['geometry'] = _simplificar(gdf.geometry, tolerancia)
+    if precisao >= 0:
+        gdf['geometry'] = _arredondar(gdf.geometry, precisao)
+
+    geojson = gdf.__geo_interface__
+    geojson_serializado = json.dumps(geojson, separators=(',', ':'))
+    tamanho_simplificado = len(geojson_serializado.encode('utf-8'))
+
+    logger.info(
+        "Malha municipal: %d municípios, GeoJSON %.1f KB -> %.1f KB (tolerância %s, %d casas decimais)",
+        len(gdf), tamanho_original / 1024, tamanho_simplificado / 1024, tolerancia, precisao
+    )
+
+    # Municípios identificados pelo código IBGE (CD_MUN), o mesmo de municipioIBGE nas notificações.
+    codigos = gdf['CD_MUN'].astype(str).tolist()
+    return {
+        'geojson': geojson,
+        'geojson_serializado': geojson_serializado,
+        'locations': codigos,
+        'nomes': gdf['NM_MUN'].tolist(),
+        'codigos': codigos,
+        'tamanho_original': tamanho_original,
+        'tamanho_simplificado': tamanho_simplificado,
+    }
+
+
+def vetor_casos(malha, casos_por_municipio):
+    # casos_por_municipio: Series indexada pelo código IBGE do município.
+    return casos_por_municipio.reindex(malha['codigos'], fill_value=0).to_numpy(dtype=np.int64)
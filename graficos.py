@@ -0,0 +1,441 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from dash import Patch
+
+from geometria import vetor_casos
+from municipios import COLUNA_MUNICIPIO
+from preprocessamento import rotulos_piramide
+from sankey import ESTAGIOS_PADRAO, ESTAGIOS_SANKEY
+from semanas import rotulo_semana
+from serializacao import vetor_binario
+
+
+def grafico_piramide(dados, consulta, comparacao=None, valores=None, normalizar=False):
+    # Com `comparacao` ('ano' ou 'racaCor') e dois `valores`, uma pirâmide para cada valor, lado a lado.
+    # Normalizada, cada pirâmide mostra casos por mil da sua própria seleção.
+    piramide = dados['piramide']
+    if comparacao:
+        grupos = dict(zip(valores, piramide.comparar(dados, consulta, comparacao, valores)))
+    else:
+        grupos = {None: piramide.contar(dados, consulta)}
+
+    partes = []
+    for grupo, contagens in grupos.items():
+        parte = piramide.tabela(contagens)
+        parte['contagem_negativa'] = (parte['por_mil'] if normalizar else parte['contagem']) * parte['sexo'].map({'Feminino': -1, 'Masculino': 1})
+        parte['percentual'] = parte['contagem'] / parte['contagem'].sum() * 100
+        if normalizar:
+            parte['texto'] = rotulos_piramide(parte['contagem'], parte['por_mil'], '‰')
+        else:
+            parte['texto'] = rotulos_piramide(parte['contagem'], parte['percentual'])
+        partes.append(parte.assign(grupo=str(grupo)) if comparacao else parte)
+    piramide_data = pd.concat(partes, ignore_index=True) if comparacao else partes[0]
+
+    titulo = '<b>Pirâmide Etária</b>' if not comparacao else f"<b>Pirâmide Etária: {' × '.join(str(valor) for valor in valores)}</b>"
+    fig_piramide = px.bar(
+        piramide_data,
+        x='contagem_negativa',
+        y='faixa_etaria',
+        color='sexo',
+        facet_col='grupo' if comparacao else None,
+        orientation='h',
+        title=titulo,
+        labels={'faixa_etaria': 'Faixa Etária', 'contagem_negativa': 'Casos por mil' if normalizar else 'Contagem', 'sexo': 'Sexo'},
+        color_discrete_map={'Masculino': '#1f77b4', 'Feminino': '#e377c2'},
+        text='texto'
+    )
+
+    
+    fig_piramide.update_layout(
+        template='plotly_white',
+        height=700,
+        bargap=0.1,
+        title=dict(x=0.5, xanchor='center', font=dict(size=20, family='Poppins, sans-serif', color="black", weight='bold')),
+        yaxis=dict(title=dict(text='Faixa Etária', font=dict(size=14, family='Poppins, sans-serif', color="black")), showgrid=False),
+        legend=dict(title='<b>Sexo</b>', font=dict(size=12, family='Poppins, sans-serif'), bgcolor='rgba(240,240,240,0.8)', bordercolor='gray', borderwidth=1),
+        transition={'duration': 800, 'easing': 'cubic-in-out'}
+    )
+    fig_piramide.update_xaxes(
+        title=dict(text='Casos por mil' if normalizar else 'População', font=dict(size=14, family='Poppins, sans-serif', color="black")),
+        showgrid=True, zeroline=True, zerolinewidth=1.5, zerolinecolor='gray'
+    )
+    # Títulos das colunas da comparação só com o valor ("2022" em vez de "grupo=2022").
+    fig_piramide.for_each_annotation(lambda a: a.update(text=a.text.split('=')[-1]))
+
+   
+    fig_piramide.update_traces(marker_line_width=1, marker_line_color='black', textposition='outside')
+    fig_piramide.for_each_trace(lambda t: t.update(textposition='outside' if t.name == 'Masculino' else 'inside'))
+
+    return fig_piramide
+
+
+# Cores fixas por rótulo; os demais nós pegam a cor da paleta pela posição na etapa, sempre a mesma.
+CORES_NOS_SANKEY = {
+    'Cura': '#00995E', 'Óbito': '#000000', 'Febre': '#FFC567',
+    'Confirmado': '#FD5A46', 'Não Classificado': '#058CD7',
+    'Não Informado': '#B0BEC5', 'Desconhecido': '#607D8B', 'Outros': '#9E9E9E'
+}
+PALETA_SANKEY = px.colors.qualitative.Safe
+
+
+def cores_sankey(rotulos):
+    return [CORES_NOS_SANKEY.get(rotulo, PALETA_SANKEY[i % len(PALETA_SANKEY)]) for i, rotulo in enumerate(rotulos)]
+
+
+def grafico_sankey(dados, consulta, estagios=None):
+    estagios = [estagio for estagio in dict.fromkeys(estagios or ESTAGIOS_PADRAO) if estagio in ESTAGIOS_SANKEY]
+    tensor = dados['sankey']
+    matrizes = tensor.fluxos(dados, consulta, estagios)
+
+    # Um nó por (etapa, rótulo) com fluxo: o mesmo rótulo em duas etapas são dois nós. Os ids
+    # seguem a ordem das etapas e, dentro de cada uma, a dos rótulos.
+    ativos = [np.zeros(len(tensor.rotulos[estagio]), dtype=bool) for estagio in estagios]
+    for i, matriz in enumerate(matrizes):
+        ativos[i] |= matriz.sum(axis=1) > 0
+        ativos[i + 1] |= matriz.sum(axis=0) > 0
+    ids, rotulos, cores, etapas, inicio = [], [], [], [], 0
+    for estagio, ativo in zip(estagios, ativos):
+        ids.append(np.where(ativo, inicio + np.cumsum(ativo) - 1, -1))
+        rotulos += [rotulo for rotulo, mantido in zip(tensor.rotulos[estagio], ativo) if mantido]
+        cores += [cor for cor, mantido in zip(cores_sankey(tensor.rotulos[estagio]), ativo) if mantido]
+        etapas += [ESTAGIOS_SANKEY[estagio][1]] * int(ativo.sum())
+        inicio += int(ativo.sum())
+
+    origens, destinos, fluxos = [], [], []
+    for i, matriz in enumerate(matrizes):
+        linhas, colunas = np.nonzero(matriz)
+        origens += ids[i][linhas].tolist()
+        destinos += ids[i + 1][colunas].tolist()
+        fluxos += matriz[linhas, colunas].tolist()
+
+   
+    fig_sankey = go.Figure(data=[go.Sankey(
+        node=dict(
+            pad=20, thickness=30, line=dict(color="black", width=0.5),
+            label=rotulos, color=cores, customdata=etapas,
+            hovertemplate='%{customdata}: %{label}<br>%{value} notificações<extra></extra>'
+        ),
+        link=dict(
+            source=origens,
+            target=destinos,
+            value=fluxos,
+            color="rgba(0, 123, 255, 0.4)",
+            line=dict(color="rgba(0, 123, 255, 0.8)", width=1)
+        )
+    )])
+
+    if len(estagios) < 2:
+        titulo = "Selecione ao menos duas etapas para ver o fluxo"
+    elif estagios == ESTAGIOS_PADRAO:
+        titulo = "Fluxo de Sintomas, Classificação e Evolução dos Casos"
+    else:
+        titulo = "Fluxo dos Casos: " + " → ".join(ESTAGIOS_SANKEY[estagio][1] for estagio in estagios)
+   
+    fig_sankey.update_layout(
+        title_text=titulo,
+        title_font=dict(size=22, family='Poppins, sans-serif', color='black'),
+        font_size=14, height=700, template="plotly_white", showlegend=False,
+        margin=dict(l=50, r=50, t=80, b=50),
+        plot_bgcolor='rgba(240, 240, 240, 0.9)',
+        title={'x': 0.5, 'xanchor': 'center', 'yanchor': 'top'}
+    )
+
+    return fig_sankey
+
+
+TITULO_MAPA = "Mapa de Casos por Município - Síndrome Gripal"
+
+
+def casos_mapa(dados, malha_municipios, consulta):
+    # O mapa continua mostrando todos os municípios; os selecionados só ficam em destaque.
+    casos_por_municipio = consulta.sem(COLUNA_MUNICIPIO).contar(dados, 'mapa', COLUNA_MUNICIPIO)
+    return vetor_casos(malha_municipios, casos_por_municipio)
+
+
+def municipios_destacados(malha_municipios, consulta):
+    codigos = consulta.filtros.get(COLUNA_MUNICIPIO)
+    if not codigos:
+        return None
+    posicoes = pd.Index(malha_municipios['codigos']).get_indexer(codigos)
+    return posicoes[posicoes >= 0].tolist()
+
+
+def figura_mapa(malha_municipios, casos=None, destacados=None):
+    # Sem `casos`, devolve só a geometria (z zerado), enviada ao navegador uma vez por renderização da página.
+    if casos is None:
+        casos = np.zeros(len(malha_municipios['locations']), dtype=np.int64)
+
+    fig_mapa_calor = go.Figure(go.Choroplethmapbox(
+        geojson=malha_municipios['geojson'],  
+        locations=malha_municipios['locations'],  
+        featureidkey='properties.CD_MUN',
+        z=casos,  
+        selectedpoints=destacados,
+        unselected=dict(marker=dict(opacity=0.3)),
+        colorscale='Viridis',  
+        marker_opacity=0.8,
+        marker_line_width=0.5,
+        colorbar_title="Casos",
+        hovertemplate=(
+            "<b>Município:</b> %{customdata[0]}<br>"
+            "<b>Casos:</b> %{z}<extra></extra>"
+        ),
+        customdata=[[nome] for nome in malha_municipios['nomes']]  
+    ))
+
+    
+    fig_mapa_calor.update_layout(
+        mapbox=dict(
+            style='carto-positron',
+            zoom=6.5,
+            center=dict(lat=-8.5, lon=-37.8),
+        ),
+        margin=dict(r=0, t=50, l=0, b=0),
+        height=700,
+        title=dict(
+            text=TITULO_MAPA,
+            x=0.5, xanchor='center',
+            font=dict(size=20, family='Poppins, sans-serif', color="black")
+        )
+    )
+
+    return fig_mapa_calor
+
+
+def grafico_mapa(dados, malha_municipios, consulta):
+    return figura_mapa(malha_municipios, casos_mapa(dados, malha_municipios, consulta), municipios_destacados(malha_municipios, consulta))
+
+
+def patch_mapa(dados, malha_municipios, consulta):
+    # Atualização parcial: só os valores de z, a escala de cores e o título trafegam.
+    casos = casos_mapa(dados, malha_municipios, consulta)
+    descricao = consulta.sem(COLUNA_MUNICIPIO).descricao()
+
+    patch = Patch()
+    patch['data'][0]['z'] = vetor_binario(casos)
+    patch['data'][0]['zauto'] = False
+    patch['data'][0]['zmin'] = 0
+    patch['data'][0]['zmax'] = max(int(casos.max(initial=0)), 1)
+    patch['data'][0]['selectedpoints'] = municipios_destacados(malha_municipios, consulta)
+    patch['layout']['title']['text'] = f"{TITULO_MAPA} ({descricao})" if descricao else TITULO_MAPA
+    return patch
+
+
+def resumo_municipios(dados, malha_municipios, consulta):
+    # Números do painel de detalhe dos municípios selecionados, sob os demais filtros. As contagens
+    # por município vêm da mesma consulta do mapa; as demais, das partições dos selecionados.
+    codigos = consulta.filtros.get(COLUNA_MUNICIPIO)
+    if not codigos:
+        return None
+    nomes = dict(zip(malha_municipios['codigos'], malha_municipios['nomes']))
+    por_municipio = consulta.sem(COLUNA_MUNICIPIO).contar(dados, 'mapa', COLUNA_MUNICIPIO)
+    casos = int(por_municipio.reindex(codigos, fill_value=0).sum())
+    total_estado = int(por_municipio.sum())
+    classificacao = consulta.contar(dados, 'sankey', 'classificacaoFinal')
+    evolucao = consulta.contar(dados, 'evolucao', 'evolucaoCaso')
+    faixas = consulta.contar(dados, 'piramide', 'faixa_etaria')
+
+    return {
+        'municipios': [nomes.get(codigo, codigo) for codigo in codigos],
+        'codigos': codigos,
+        'casos': casos,
+        'participacao': casos / total_estado * 100 if total_estado else 0.0,
+        # Posição no ranking de casos do estado, só para um município.
+        'posicao': int((por_municipio > casos).sum()) + 1 if len(codigos) == 1 else None,
+        'n_municipios': len(malha_municipios['codigos']),
+        'confirmados': int(classificacao.get('Confirmado', 0)),
+        'obitos': int(evolucao.get('Óbito', 0)),
+        'faixa_predominante': faixas.idxmax() if faixas.sum() else None,
+    }
+
+
+def grafico_classificacao(dados, consulta):
+    # Cada sintoma da lista conta separadamente, e não a combinação como veio no registro.
+    df_classificacao_agg = consulta.contar_termos(dados, 'sintomas', 'classificacaoFinal').reset_index(name='count')
+
+    fig_classificacao = px.bar(
+        df_classificacao_agg, 
+        y='sintomas',  
+        x='count',     
+        color='classificacaoFinal',
+        title='Classificação Final X Sintomas',
+        labels={'count': 'Número de Casos', 'sintomas': 'Sintomas'},
+        barmode='group',
+        color_discrete_sequence=px.colors.qualitative.Set2,
+        orientation='h'  
+    )
+   
+    fig_classificacao.update_layout(
+        title={'text': '<b>Classificação Final por Sintomas</b>', 'y': 0.95, 'x': 0.5, 'xanchor': 'center', 'yanchor': 'top'},
+        yaxis=dict(categoryorder='total ascending', title_font=dict(size=16, family='Poppins, sans-serif', color='black')),  
+        xaxis=dict(title_font=dict(size=16, family='Poppins, sa ns-serif', color='black')),  
+        legend=dict(title='<b>Classificação Final:</b>', font=dict(size=14, family='Poppins, sans-serif', color='black'), bgcolor='rgba(240,240,240,0.8)', bordercolor='gray', borderwidth=1),
+        margin=dict(l=50, r=50, t=80, b=50),
+        bargap=0.2,
+        bargroupgap=0.1,
+        plot_bgcolor='rgba(240,240,240,0.5)',
+        transition={
+            'duration': 500,
+            'easing': 'cubic-in-out'  
+        }
+    )
+
+    fig_classificacao.update_traces(marker=dict(line=dict(color='black', width=1)))
+
+    return fig_classificacao
+
+
+def grafico_evolucao(dados, consulta):
+    df_evolucao_agg = consulta.contar(dados, 'evolucao', 'evolucaoCaso').reset_index(name='Contagem')
+
+    fig_evolucao = px.bar(
+        df_evolucao_agg, 
+        y='evolucaoCaso',  
+        x='Contagem',      
+        title='<b>Contagem de Evolução de Casos</b>',
+        labels={'Contagem': 'Número de Casos', 'evolucaoCaso': 'Evolução do Caso'},
+        color='evolucaoCaso',
+        color_discrete_sequence=px.colors.qualitative.Pastel,
+        orientation='h'  
+    )
+
+    fig_evolucao.update_layout(
+        showlegend=False,
+        template='plotly_white',
+        title=dict(y=0.95, x=0.5, xanchor='center', yanchor='top', font=dict(size=20, family='Poppins, sans-serif', color="black", weight='bold')),
+        yaxis=dict(title_font=dict(size=16, family='Poppins, sans-serif', color='black'), tickfont=dict(size=12, family='Poppins, sans-serif', color='black')),  
+        xaxis=dict(title_font=dict(size=16, family='Poppins, sans-serif', color='black'), tickfont=dict(size=12, family='Poppins, sans-serif', color='black')),  
+        margin=dict(l=50, r=50, t=80, b=50),
+        bargap=0.2,
+        plot_bgcolor='rgba(240,240,240,0.5)',
+        transition={'duration': 500, 'easing': 'cubic-in-out'}
+    )
+
+    fig_evolucao.update_traces(marker_line=dict(color='black', width=1))
+
+    return fig_evolucao
+
+
+def grafico_condicoes(dados, consulta):
+    contagens = consulta.contar_termos(dados, 'condicoes')
+    df_condicoes_agg = contagens[contagens > 0].reset_index(name='Contagem').nlargest(10, 'Contagem')
+
+    fig_condicoes = px.bar(
+    df_condicoes_agg,
+    y='condicoes',
+    x='Contagem',
+    title='Top 10 Condições mais Frequentes',
+    labels={'Contagem': 'Número de Casos', 'condicoes': 'Condição'},
+    color='Contagem',
+    color_continuous_scale=px.colors.sequential.Viridis,
+    orientation='h',
+    text='Contagem'  
+    )
+
+    fig_condicoes.update_layout(
+        showlegend=False,
+        coloraxis_showscale=False,
+        template='plotly_white',
+        title=dict(
+            y=0.95, 
+            x=0.5, 
+            xanchor='center', 
+            yanchor='top', 
+            font=dict(size=20, family='Poppins, sans-serif', weight='bold', color="black")
+        ),
+        yaxis=dict(
+            title_font=dict(size=16, family='Poppins, sans-serif', color='black'), 
+            tickfont=dict(size=12, family='Poppins, sans-serif', color='black'),
+            automargin=True  
+        ),
+        xaxis=dict(
+            title_font=dict(size=16, family='Poppins, sans-serif', color='black'), 
+            tickfont=dict(size=12, family='Poppins, sans-serif', color='black')
+        ),
+        margin=dict(l=100, r=50, t=80, b=50),  
+        bargap=0.2,
+        plot_bgcolor='rgba(240,240,240,0.5)',
+        transition={'duration': 500, 'easing': 'cubic-in-out'},
+        uniformtext_minsize=10,  
+        uniformtext_mode='hide'  
+    )
+
+    
+    fig_condicoes.update_traces(
+        marker_line=dict(color='black', width=1),
+        texttemplate='%{x}',  
+        textposition='outside',  
+        textfont=dict(
+            size=12,
+            family='Poppins, sans-serif',
+            color='black'
+        ),
+        cliponaxis=False  
+    )
+
+    
+    fig_condicoes.update_xaxes(rangemode="tozero", autorange=True)
+
+    return fig_condicoes
+
+
+TITULOS_SERIE = {'classificacao': 'Classificação Final', 'evolucao': 'Evolução do Caso'}
+
+
+def grafico_serie_temporal(dados, consulta, agrupamento='classificacao', media_movel=1):
+    # A série ignora o próprio período selecionado: ele só define a faixa visível e os totais da legenda.
+    series = dados['series'].casos(dados, consulta, agrupamento, media_movel)
+    casos, totais = series['casos'], series['totais']
+    periodo = consulta.filtros.get('dataNotificacao')
+    cores = px.colors.qualitative.Set2
+
+    fig_serie = go.Figure()
+    for i, grupo in enumerate(casos.columns):
+        if not casos[grupo].any():
+            continue
+        cor = cores[i % len(cores)]
+        nome = f"{grupo} ({totais[grupo]:,})".replace(',', '.')
+        fig_serie.add_trace(go.Scatter(
+            x=casos.index, y=casos[grupo].to_numpy(), customdata=series['rotulos'],
+            name=nome, legendgroup=grupo, mode='lines', line=dict(color=cor, width=1.5),
+            opacity=0.35 if series['media'] is not None else 1,
+            showlegend=series['media'] is None,
+            hovertemplate="<b>%{customdata}</b><br>" + f"{grupo}: " + "%{y}<extra></extra>"
+        ))
+        if series['media'] is not None:
+            fig_serie.add_trace(go.Scatter(
+                x=casos.index, y=series['media'][grupo].to_numpy(), customdata=series['rotulos'],
+                name=nome, legendgroup=grupo, mode='lines', line=dict(color=cor, width=3),
+                hovertemplate="<b>%{customdata}</b><br>" + f"{grupo} (média de {media_movel} semanas): " + "%{y:.1f}<extra></extra>"
+            ))
+
+    titulo = f"<b>Casos por Semana Epidemiológica — {TITULOS_SERIE[agrupamento]}</b>"
+    if periodo:
+        titulo += f"<br><sup>Totais da legenda: {rotulo_semana(periodo[0])} a {rotulo_semana(periodo[-1])}</sup>"
+
+    fig_serie.update_layout(
+        template='plotly_white',
+        height=600,
+        title=dict(text=titulo, x=0.5, xanchor='center', font=dict(size=20, family='Poppins, sans-serif', color="black")),
+        yaxis=dict(title=dict(text='Número de Casos', font=dict(size=14, family='Poppins, sans-serif', color="black")), rangemode='tozero'),
+        xaxis=dict(
+            title=dict(text='Início da Semana Epidemiológica', font=dict(size=14, family='Poppins, sans-serif', color="black")),
+            rangeslider=dict(visible=True, thickness=0.08),
+            rangeselector=dict(buttons=[
+                dict(count=3, label='3m', step='month', stepmode='backward'),
+                dict(count=6, label='6m', step='month', stepmode='backward'),
+                dict(count=1, label='1a', step='year', stepmode='backward'),
+                dict(step='all', label='Tudo'),
+            ]),
+        ),
+        legend=dict(title=f'<b>{TITULOS_SERIE[agrupamento]}:</b>', font=dict(size=12, family='Poppins, sans-serif'), bgcolor='rgba(240,240,240,0.8)', bordercolor='gray', borderwidth=1),
+        hovermode='x unified',
+        margin=dict(l=50, r=50, t=100, b=50),
+    )
+    if periodo:
+        # A faixa selecionada (que filtra os demais gráficos) cobre as semanas inteiras do período.
+        fig_serie.update_xaxes(range=[periodo[0], str(np.datetime64(periodo[-1]) + np.timedelta64(7, 'D'))])
+
+    return fig_serie
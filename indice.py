@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+
+class IndiceBitmap:
+    # Um bitmap compactado (np.packbits) por valor distinto de cada coluna indexada.
+    # Uma combinação de filtros vira uma única seleção de linhas pela interseção dos bitmaps.
+
+    def __init__(self, df, colunas):
+        self.n_linhas = len(df)
+        self.bitmaps = {}
+        for coluna in colunas:
+            self.adicionar_coluna(df[coluna])
+
+    @classmethod
+    def de_bitmaps(cls, n_linhas, bitmaps):
+        # Reaproveita bitmaps já montados (por exemplo, mapeados de disco) sem recalculá-los.
+        indice = cls.__new__(cls)
+        indice.n_linhas = n_linhas
+        indice.bitmaps = bitmaps
+        return indice
+
+    def adicionar_coluna(self, serie):
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+        else:
+            codigos, valores = pd.factorize(serie)
+
+        self.bitmaps[serie.name] = {
+            valor: np.packbits(codigos == i)
+            for i, valor in enumerate(valores)
+        }
+
+    def bitmap(self, coluna, valor):
+        bitmaps = self.bitmaps[coluna]
+        if isinstance(valor, (list, tuple, set)):
+            resultado = np.zeros((self.n_linhas + 7) // 8, dtype=np.uint8)
+            for v in valor:
+                if v in bitmaps:
+                    resultado |= bitmaps[v]
+            return resultado
+        if valor in bitmaps:
+            return bitmaps[valor]
+        return np.zeros((self.n_linhas + 7) // 8, dtype=np.uint8)
+
+    def selecionar(self, filtros):
+        # filtros: {coluna: valor ou lista de valores}; None ou lista vazia não filtram.
+        # Devolve os números das linhas selecionadas, ou None quando nenhum filtro se aplica.
+        selecao = None
+        for coluna, valor in filtros.items():
+            if not valor:
+                continue
+            bitmap = self.bitmap(coluna, valor)
+            selecao = bitmap.copy() if selecao is None else np.bitwise_and(selecao, bitmap, out=selecao)
+
+        if selecao is None:
+            return None
+        return np.flatnonzero(np.unpackbits(selecao, count=self.n_linhas))
+
+    def memoria(self):
+        return sum(b.nbytes for bitmaps in self.bitmaps.values() for b in bitmaps.values())
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import CAMINHO_CSV, DIRETORIO_CACHE, TAMANHO_BLOCO
+from utils import normalizar_nome, recodificar_categorias
+
+
+logger = logging.getLogger(__name__)
+
+# Incrementar sempre que a limpeza abaixo mudar, para invalidar os caches antigos.
+VERSAO_ESQUEMA = 4
+
+valid_years = [2020, 2021, 2022, 2023, 2024]
+
+COLUNAS_CATEGORICAS = [
+    'municipio', 'municipioNotificacao', 'municipioIBGE', 'racaCor', 'sexo', 'faixa_etaria',
+    'sintomas', 'classificacaoFinal', 'evolucaoCaso', 'condicoes',
+]
+
+COLUNAS_CSV = ['dataNotificacao'] + COLUNAS_CATEGORICAS
+
+# Esquema fixo das partições: blocos em que uma coluna vem toda vazia continuam compatíveis.
+ESQUEMA_PARQUET = pa.schema(
+    [('dataNotificacao', pa.timestamp('ns'))]
+    + [(coluna, pa.dictionary(pa.int32(), pa.string())) for coluna in COLUNAS_CATEGORICAS]
+    + [('ano', pa.int16())]
+)
+
+
+def padronizar_ibge(codigo):
+    # Códigos lidos como float (coluna com ausentes) perdem o ".0" antes do preenchimento com zeros.
+    if isinstance(codigo, float) and codigo.is_integer():
+        codigo = int(codigo)
+    return str(codigo).zfill(7)
+
+
+def limpar_notificacoes(df):
+    # A conversão para categoria vem antes da limpeza: normalização e preenchimento
+    # rodam uma vez por valor distinto e são propagados pelos códigos.
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype('category')
+
+    df['municipio'] = recodificar_categorias(df['municipio'], normalizar_nome)
+    df['municipioIBGE'] = recodificar_categorias(df['municipioIBGE'], padronizar_ibge, valor_ausente='Desconhecido')
+
+    df['dataNotificacao'] = pd.to_datetime(df['dataNotificacao'], errors='coerce', cache=True)
+    df['ano'] = df['dataNotificacao'].dt.year.astype('Int16')
+
+    df = df[df['ano'].isin(valid_years) | df['ano'].isna()].reset_index(drop=True)
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].cat.remove_unused_categories()
+
+    return df
+
+
+def relatorio_memoria(df):
+    memoria = df.memory_usage(deep=True, index=False)
+    return pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'categorias': [df[c].cat.categories.size if isinstance(df[c].dtype, pd.CategoricalDtype) else None for c in df.columns],
+        'MB': (memoria / 2**20).round(2),
+    }).astype({'categorias': 'Int64'})
+
+
+def ler_csv(caminho, **kwargs):
+    # Só as colunas usadas pelo painel, já lidas como categoria.
+    return pd.read_csv(
+        caminho, sep=';',
+        usecols=lambda coluna: coluna in COLUNAS_CSV,
+        dtype={coluna: 'category' for coluna in COLUNAS_CATEGORICAS},
+        **kwargs
+    )
+
+
+def pasta_ano(ano):
+    return 'sem_ano' if pd.isna(ano) else str(int(ano))
+
+
+def gravar_particoes(df, diretorio, nome_parte):
+    # Uma pasta por ano (sem_ano para datas inválidas), um arquivo por bloco.
+    for ano, grupo in df.groupby('ano', dropna=False, observed=True):
+        pasta = os.path.join(diretorio, pasta_ano(ano))
+        os.makedirs(pasta, exist_ok=True)
+        tabela = pa.Table.from_pandas(grupo[ESQUEMA_PARQUET.names], schema=ESQUEMA_PARQUET, preserve_index=False)
+        pq.write_table(tabela, os.path.join(pasta, f'{nome_parte}.parquet'))
+
+
+def ingerir_em_blocos(caminho, diretorio_particoes, tamanho_bloco):
+    # Lê, limpa e grava um bloco por vez: o pico de memória depende do tamanho do bloco,
+    # não do arquivo. As partições são montadas numa pasta temporária e trocadas no final.
+    temporario = diretorio_particoes + '.tmp'
+    shutil.rmtree(temporario, ignore_errors=True)
+
+    inicio = time.perf_counter()
+    linhas_lidas = linhas_validas = 0
+    with ler_csv(caminho, chunksize=tamanho_bloco) as leitor:
+        for numero, bloco in enumerate(leitor):
+            linhas_lidas += len(bloco)
+            bloco = limpar_notificacoes(bloco)
+            linhas_validas += len(bloco)
+            gravar_particoes(bloco, temporario, f'parte-{numero:05d}')
+
+            decorrido = time.perf_counter() - inicio
+            logger.info(
+                "Bloco %d: %d linhas lidas, %d válidas (%.0f linhas/s)",
+                numero + 1, linhas_lidas, linhas_validas, linhas_lidas / decorrido if decorrido else 0
+            )
+
+    antigo = diretorio_particoes + '.antigo'
+    shutil.rmtree(antigo, ignore_errors=True)
+    if os.path.exists(diretorio_particoes):
+        os.replace(diretorio_particoes, antigo)
+    os.replace(temporario, diretorio_particoes)
+    shutil.rmtree(antigo, ignore_errors=True)
+
+
+def ler_particoes(diretorio_particoes, anos=None, partes=None):
+    # anos e partes restringem a leitura a algumas pastas de ano e a alguns nomes de arquivo.
+    pastas = sorted(os.listdir(diretorio_particoes))
+    if anos is not None:
+        pastas = [pasta for pasta in pastas if pasta in {pasta_ano(ano) for ano in anos}]
+    arquivos = [
+        os.path.join(diretorio_particoes, pasta, arquivo)
+        for pasta in pastas
+        for arquivo in sorted(os.listdir(os.path.join(diretorio_particoes, pasta)))
+        if partes is None or os.path.splitext(arquivo)[0] in partes
+    ]
+    tabelas = [pq.read_table(arquivo, schema=ESQUEMA_PARQUET) for arquivo in arquivos]
+    tabela = pa.concat_tables(tabelas) if tabelas else ESQUEMA_PARQUET.empty_table()
+    return tabela.to_pandas(types_mapper={pa.int16(): pd.Int16Dtype()}.get)
+
+
+def hash_linhas(df):
+    # O CSV não traz identificador de notificação: cada linha é identificada pelo hash
+    # das colunas já limpas (categorias são hasheadas pelo valor, não pelo código).
+    return pd.util.hash_pandas_object(df[COLUNAS_CSV], index=False)
+
+
+def remover_duplicadas(novas, existentes):
+    # Diferença de multiconjuntos: uma linha que aparece k vezes em `novas` e j vezes em
+    # `existentes` entra max(0, k - j) vezes, preservando notificações idênticas legítimas.
+    hashes = hash_linhas(novas)
+    ja_existentes = hash_linhas(existentes).value_counts()
+    ocorrencia = hashes.groupby(hashes).cumcount()
+    manter = ocorrencia.to_numpy() >= hashes.map(ja_existentes).fillna(0).to_numpy()
+    return novas[manter].reset_index(drop=True)
+
+
+def impressao_digital(caminho, anterior=None):
+    # Com o mesmo tamanho e mtime da impressão `anterior` (a dos metadados do cache), o hash é
+    # reaproveitado sem reler o arquivo; qualquer diferença nos dois faz o hash ser recalculado.
+    info = os.stat(caminho)
+    if anterior is not None and (anterior.get('tamanho'), anterior.get('mtime_ns')) == (info.st_size, info.st_mtime_ns):
+        return {**anterior, 'versao_esquema': VERSAO_ESQUEMA}
+
+    hash_arquivo = hashlib.blake2b(digest_size=16)
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1 << 20), b''):
+            hash_arquivo.update(bloco)
+
+    return {
+        'tamanho': info.st_size,
+        'mtime_ns': info.st_mtime_ns,
+        'hash': hash_arquivo.hexdigest(),
+        'versao_esquema': VERSAO_ESQUEMA,
+    }
+
+
+def caminhos_cache(caminho, diretorio_cache, particionado=False):
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    destino = os.path.join(diretorio_cache, f'{nome}_particoes' if particionado else f'{nome}.parquet')
+    return destino, destino + '.json'
+
+
+def gravar_metadados(caminho_metadados, metadados):
+    with open(caminho_metadados + '.tmp', 'w', encoding='utf-8') as arquivo:
+        json.dump(metadados, arquivo)
+    os.replace(caminho_metadados + '.tmp', caminho_metadados)
+
+
+def ler_metadados(caminho_metadados):
+    try:
+        with open(caminho_metadados, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+def carregar_notificacoes(caminho=CAMINHO_CSV, diretorio_cache=DIRETORIO_CACHE, tamanho_bloco=TAMANHO_BLOCO):
+    # Com tamanho_bloco > 0 o CSV é ingerido em blocos para partições Parquet por ano;
+    # senão, lido inteiro para um único Parquet.
+    inicio = time.perf_counter()
+    destino, caminho_metadados = caminhos_cache(caminho, diretorio_cache, particionado=bool(tamanho_bloco))
+    metadados = ler_metadados(caminho_metadados)
+    impressao = impressao_digital(caminho, metadados)
+    ler_cache = ler_particoes if tamanho_bloco else pd.read_parquet
+
+    mesmo_conteudo = metadados is not None and all(metadados.get(chave) == impressao[chave] for chave in ('hash', 'versao_esquema'))
+    if mesmo_conteudo and os.path.exists(destino):
+        # Um CSV só tocado (mtime novo, mesmo conteúdo) mantém o cache; o mtime é atualizado
+        # para que a próxima carga não precise ler o arquivo de novo.
+        if metadados != impressao:
+            gravar_metadados(caminho_metadados, impressao)
+        df = ler_cache(destino)
+        logger.info("Cache %s carregado em %.2fs (%d linhas)", destino, time.perf_counter() - inicio, len(df))
+        logger.info("Memória por coluna:\n%s", relatorio_memoria(df).to_string())
+        return df, impressao
+
+    os.makedirs(diretorio_cache, exist_ok=True)
+    if tamanho_bloco:
+        ingerir_em_blocos(caminho, destino, tamanho_bloco)
+        df = ler_particoes(destino)
+    else:
+        df = limpar_notificacoes(ler_csv(caminho))
+        # Grava em arquivo temporário e renomeia, para que outro processo nunca leia um cache pela metade.
+        df.to_parquet(destino + '.tmp', index=False)
+        os.replace(destino + '.tmp', destino)
+    gravar_metadados(caminho_metadados, impressao)
+
+    logger.info("%s processado e gravado em cache em %.2fs (%d linhas)", caminho, time.perf_counter() - inicio, len(df))
+    logger.info("Memória por coluna:\n%s", relatorio_memoria(df).to_string())
+    return df, impressao
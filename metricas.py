@@ -0,0 +1,203 @@
+import contextlib
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, has_request_context
+
+from config import LIMITE_CALLBACK_LENTO_MS, METRICAS_ATIVAS
+
+
+logger = logging.getLogger(__name__)
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_NULO = contextlib.nullcontext()
+_medicao_atual = contextvars.ContextVar('medicao_atual', default=None)
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                break
+        else:
+            i = len(self.limites)
+        self.contagens[i] += 1
+        self.soma += valor
+        self.total += 1
+
+
+class Medicao:
+    # Uma execução de callback: duração total, tempo por etapa, linhas e bytes da resposta.
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.inicio = time.perf_counter()
+        self.duracao = None
+        self.etapas = defaultdict(float)
+        self.linhas = 0
+        self.bytes = None
+
+    def encerrar(self):
+        self.duracao = time.perf_counter() - self.inicio
+        # O que não foi medido em nenhuma etapa é a montagem da figura Plotly.
+        self.etapas['figura'] = max(self.duracao - sum(self.etapas.values()), 0.0)
+
+
+class Metricas:
+    def __init__(self, limite_lento_ms=0):
+        self.limite_lento_ms = limite_lento_ms
+        self._trava = threading.Lock()
+        self.duracoes = defaultdict(lambda: Histograma(LIMITES_SEGUNDOS))
+        self.etapas = defaultdict(lambda: Histograma(LIMITES_SEGUNDOS))
+        self.linhas = defaultdict(lambda: [0, 0])
+        self.bytes = defaultdict(lambda: [0, 0])
+        self.lentos = defaultdict(int)
+        self.inicio = {}
+        self.coletores = []
+
+    def registrar(self, medicao):
+        with self._trava:
+            self.duracoes[medicao.callback].observar(medicao.duracao)
+            for etapa, segundos in medicao.etapas.items():
+                self.etapas[medicao.callback, etapa].observar(segundos)
+            self.linhas[medicao.callback][0] += medicao.linhas
+            self.linhas[medicao.callback][1] += 1
+            if medicao.bytes is not None:
+                self.bytes[medicao.callback][0] += medicao.bytes
+                self.bytes[medicao.callback][1] += 1
+
+        if self.limite_lento_ms and medicao.duracao * 1000 >= self.limite_lento_ms:
+            with self._trava:
+                self.lentos[medicao.callback] += 1
+            logger.warning(
+                "Callback lento: %s em %.0f ms (%s; %d linhas; %s bytes)",
+                medicao.callback, medicao.duracao * 1000,
+                ', '.join(f'{etapa}={segundos * 1000:.1f}ms' for etapa, segundos in medicao.etapas.items()),
+                medicao.linhas, medicao.bytes if medicao.bytes is not None else '?'
+            )
+
+    def texto_prometheus(self):
+        linhas = []
+
+        def histograma(nome, ajuda, series):
+            linhas.extend([f'# HELP {nome} {ajuda}', f'# TYPE {nome} histogram'])
+            for rotulos, hist in series:
+                acumulado = 0
+                for limite, contagem in zip([*hist.limites, '+Inf'], hist.contagens):
+                    acumulado += contagem
+                    linhas.append(f'{nome}_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+                linhas.append(f'{nome}_sum{{{rotulos}}} {hist.soma}')
+                linhas.append(f'{nome}_count{{{rotulos}}} {hist.total}')
+
+        def resumo(nome, ajuda, series):
+            linhas.extend([f'# HELP {nome} {ajuda}', f'# TYPE {nome} summary'])
+            for rotulos, (soma, total) in series:
+                linhas.append(f'{nome}_sum{{{rotulos}}} {soma}')
+                linhas.append(f'{nome}_count{{{rotulos}}} {total}')
+
+        with self._trava:
+            histograma('pibic_callback_segundos', 'Duração total dos callbacks.',
+                       [(f'callback="{c}"', h) for c, h in sorted(self.duracoes.items())])
+            histograma('pibic_callback_etapa_segundos', 'Duração de cada etapa dos callbacks.',
+                       [(f'callback="{c}",etapa="{e}"', h) for (c, e), h in sorted(self.etapas.items())])
+            resumo('pibic_callback_linhas', 'Notificações selecionadas pelos filtros.',
+                   [(f'callback="{c}"', v) for c, v in sorted(self.linhas.items())])
+            resumo('pibic_callback_resposta_bytes', 'Tamanho da resposta HTTP dos callbacks.',
+                   [(f'callback="{c}"', v) for c, v in sorted(self.bytes.items())])
+            linhas.extend(['# HELP pibic_callbacks_lentos_total Callbacks acima do limite de lentidão.',
+                           '# TYPE pibic_callbacks_lentos_total counter'])
+            linhas.extend(f'pibic_callbacks_lentos_total{{callback="{c}"}} {n}' for c, n in sorted(self.lentos.items()))
+            linhas.extend(['# HELP pibic_inicio_segundos Duração das etapas de inicialização.',
+                           '# TYPE pibic_inicio_segundos gauge'])
+            linhas.extend(f'pibic_inicio_segundos{{etapa="{e}"}} {s}' for e, s in self.inicio.items())
+
+        for coletor in self.coletores:
+            for nome, (tipo, ajuda, valor) in coletor().items():
+                linhas.extend([f'# HELP {nome} {ajuda}', f'# TYPE {nome} {tipo}', f'{nome} {valor}'])
+        return '\n'.join(linhas) + '\n'
+
+
+metricas = Metricas(LIMITE_CALLBACK_LENTO_MS)
+
+
+def instrumentar(funcao):
+    # Desligadas, as métricas não envolvem o callback: nenhum custo por chamada.
+    if not METRICAS_ATIVAS:
+        return funcao
+
+    @functools.wraps(funcao)
+    def envoltorio(*args, **kwargs):
+        medicao = Medicao(funcao.__name__)
+        token = _medicao_atual.set(medicao)
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            _medicao_atual.reset(token)
+            medicao.encerrar()
+            _finalizar(medicao)
+    return envoltorio
+
+
+def _finalizar(medicao):
+    # Dentro de uma requisição o registro espera o after_request, que conhece o tamanho da resposta.
+    if has_request_context():
+        g.setdefault('medicoes_pibic', []).append(medicao)
+    else:
+        metricas.registrar(medicao)
+
+
+@contextlib.contextmanager
+def _cronometrar(medicao, nome):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.etapas[nome] += time.perf_counter() - inicio
+
+
+def etapa(nome):
+    medicao = _medicao_atual.get() if METRICAS_ATIVAS else None
+    return _NULO if medicao is None else _cronometrar(medicao, nome)
+
+
+def registrar_linhas(contagens):
+    # Recebe as contagens já filtradas; a soma só é feita quando há medição em curso.
+    medicao = _medicao_atual.get() if METRICAS_ATIVAS else None
+    if medicao is not None:
+        # Consultas do mesmo callback recortam as mesmas notificações: vale a maior soma.
+        medicao.linhas = max(medicao.linhas, int(contagens.sum()))
+
+
+@contextlib.contextmanager
+def etapa_inicio(nome):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        metricas.inicio[nome] = time.perf_counter() - inicio
+        logger.info("Etapa de inicialização %s: %.2fs", nome, metricas.inicio[nome])
+
+
+def registrar_rota(server, caminho='/metricas'):
+    @server.after_request
+    def medir_resposta(resposta):
+        for medicao in g.pop('medicoes_pibic', []):
+            if not resposta.direct_passthrough:
+                medicao.bytes = len(resposta.get_data())
+            metricas.registrar(medicao)
+        return resposta
+
+    @server.route(caminho)
+    def expor_metricas():
+        return Response(metricas.texto_prometheus(), mimetype='text/plain; version=0.0.4')
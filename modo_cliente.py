@@ -0,0 +1,83 @@
+import base64
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+
+from graficos import cores_sankey
+from sankey import ESTAGIOS_PADRAO, ESTAGIOS_SANKEY
+
+
+logger = logging.getLogger(__name__)
+
+CUBOS_CLIENTE = ['piramide', 'mapa', 'classificacao', 'evolucao', 'condicoes']
+
+
+def _valores_python(valores):
+    return [valor.item() if hasattr(valor, 'item') else valor for valor in valores]
+
+
+def codificar_inteiros(valores):
+    # Vetor inteiro no menor dtype que comporta os valores, em base64 (little-endian),
+    # lido no navegador como Int8Array/Int16Array/Int32Array.
+    valores = np.asarray(valores, dtype=np.int64)
+    for dtype in ('int8', 'int16', 'int32'):
+        info = np.iinfo(dtype)
+        if valores.size == 0 or (valores.min() >= info.min and valores.max() <= info.max):
+            break
+    return {'dtype': dtype, 'dados': base64.b64encode(valores.astype(f'<{np.dtype(dtype).str[1:]}').tobytes()).decode('ascii')}
+
+
+def compactar_cubo(cubo):
+    # Cada coluna vira um dicionário de valores distintos mais um vetor de códigos inteiros
+    # (-1 para ausente); categorias mantêm a ordem do dtype.
+    compacto = {'dicionarios': {}, 'codigos': {}, 'contagem': codificar_inteiros(cubo['contagem'])}
+    for coluna in cubo.columns.drop('contagem'):
+        if isinstance(cubo[coluna].dtype, pd.CategoricalDtype):
+            codigos, valores = cubo[coluna].cat.codes.to_numpy(), cubo[coluna].cat.categories
+        else:
+            codigos, valores = pd.factorize(cubo[coluna], sort=True)
+        compacto['dicionarios'][coluna] = _valores_python(valores)
+        compacto['codigos'][coluna] = codificar_inteiros(codigos)
+    return compacto
+
+
+def construir_store(dados, malha_municipios):
+    store = {nome: compactar_cubo(dados['cubos'][nome]) for nome in CUBOS_CLIENTE}
+
+    # No mapa o dicionário de municípios vira a posição de cada um na malha, para montar z direto.
+    mapa = store['mapa']
+    posicoes = pd.Index(malha_municipios['codigos']).get_indexer(mapa['dicionarios']['municipioIBGE'])
+    mapa['dicionarios']['municipioIBGE'] = posicoes.tolist()
+    mapa['n_municipios'] = len(malha_municipios['codigos'])
+
+    # O Sankey vai como um cubo por par de etapas padrão, tirado do tensor, com os nós de cada
+    # etapa na ordem e nas cores do servidor.
+    tensor = dados['sankey']
+    store['sankey'] = {
+        'estagios': ESTAGIOS_PADRAO,
+        'rotulos': {estagio: tensor.rotulos[estagio] for estagio in ESTAGIOS_PADRAO},
+        'cores': {estagio: cores_sankey(tensor.rotulos[estagio]) for estagio in ESTAGIOS_PADRAO},
+        'titulos': {estagio: ESTAGIOS_SANKEY[estagio][1] for estagio in ESTAGIOS_PADRAO},
+    }
+    for origem, destino in zip(ESTAGIOS_PADRAO, ESTAGIOS_PADRAO[1:]):
+        store[f'sankey:{origem}:{destino}'] = compactar_cubo(tensor.cubo_par(origem, destino))
+
+    store['versao'] = dados['versao']
+    return store
+
+
+def tamanho_json(objeto):
+    return len(json.dumps(objeto, cls=PlotlyJSONEncoder, separators=(',', ':')).encode('utf-8'))
+
+
+def comparar_payload(store, figuras_por_interacao):
+    tamanho_store = tamanho_json(store)
+    tamanho_interacao = sum(tamanho_json(figura) for figura in figuras_por_interacao)
+    logger.info(
+        "Modo cliente: store de agregados %.1f KB (enviado uma vez) vs %.1f KB por mudança de filtro no modo servidor",
+        tamanho_store / 1024, tamanho_interacao / 1024
+    )
+    return tamanho_store, tamanho_interacao
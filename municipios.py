@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+
+COLUNA_MUNICIPIO = 'municipioIBGE'
+
+
+class ParticoesMunicipio:
+    # Notificações ordenadas pelo código IBGE do município: a partição de cada município é uma
+    # fatia contígua de `ordem`, então selecioná-lo não varre as linhas dos demais.
+
+    def __init__(self, tabela):
+        serie = tabela[COLUNA_MUNICIPIO]
+        self.codigos = serie.cat.categories
+        codigos = serie.cat.codes.to_numpy()
+        # argsort estável: dentro de cada município as linhas continuam em ordem crescente.
+        self.ordem = np.argsort(codigos, kind='stable').astype(np.int32)
+        # Início da fatia de cada código; a última posição é o fim. Os ausentes (código -1)
+        # ficam antes da primeira fatia e não pertencem a nenhuma.
+        self.posicoes = np.searchsorted(codigos[self.ordem], np.arange(len(self.codigos) + 1), side='left')
+
+    @classmethod
+    def de_particoes(cls, codigos, ordem, posicoes):
+        particoes = cls.__new__(cls)
+        particoes.codigos = pd.Index(codigos)
+        particoes.ordem = ordem
+        particoes.posicoes = posicoes
+        return particoes
+
+    def linhas(self, valores):
+        # Números das linhas dos municípios `valores` (códigos IBGE), em ordem crescente.
+        indices = self.codigos.get_indexer(valores)
+        fatias = [self.ordem[self.posicoes[i]:self.posicoes[i + 1]] for i in sorted(indices[indices >= 0])]
+        if len(fatias) == 1:
+            return fatias[0]
+        return np.sort(np.concatenate(fatias)) if fatias else np.zeros(0, dtype=np.int32)
+
+    def memoria(self):
+        return self.ordem.nbytes + self.posicoes.nbytes
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from agregados import codigos_celulas, eixos_celulas, mascaras_celulas, posicoes_celulas
+from consulta import Consulta
+from metricas import etapa, registrar_linhas
+
+
+# Filtros da barra lateral em que a pirâmide pode ser comparada lado a lado.
+COMPARACOES_PIRAMIDE = {'ano': 'Dois anos', 'racaCor': 'Duas raças'}
+
+
+def por_mil(contagens):
+    # Contagens por mil casos da própria seleção: pirâmides de tamanhos diferentes na mesma escala.
+    total = contagens.sum()
+    return contagens * 1000 / total if total else np.zeros(contagens.shape)
+
+
+class PiramideEtaria:
+    # Contagens por faixa etária em cada célula de filtro (ano × raça × sexo), num vetor denso
+    # de forma (anos, raças, sexos, faixas) — o sexo já é uma das dimensões da célula. A pirâmide
+    # de qualquer consulta do cubo é a soma das células aceitas; as demais descem às notificações
+    # selecionadas, contadas pelo código da faixa guardado na tabela.
+
+    def __init__(self, tabela, anos=None):
+        # `anos` amplia o eixo dos anos além dos presentes na tabela (usado ao somar um delta).
+        self.anos, self.categorias = eixos_celulas(tabela)
+        if anos is not None:
+            self.anos = np.union1d(self.anos, anos)
+        self.faixas = tabela['faixaPiramide'].cat.categories
+
+        codigos = tabela['faixaCodigo'].to_numpy()
+        validas = codigos >= 0
+        celulas = np.ravel_multi_index(codigos_celulas(tabela, self.anos, self.categorias), self.forma_celulas)
+        chave = celulas[validas] * len(self.faixas) + codigos[validas]
+        n_celulas = int(np.prod(self.forma_celulas))
+        self.contagens = np.bincount(chave, minlength=n_celulas * len(self.faixas)).reshape(*self.forma_celulas, len(self.faixas))
+
+    @classmethod
+    def de_contagens(cls, anos, categorias, faixas, contagens):
+        piramide = cls.__new__(cls)
+        piramide.anos = np.asarray(anos, dtype=np.int64)
+        piramide.categorias = {dimensao: pd.Index(valores) for dimensao, valores in categorias.items()}
+        piramide.faixas = pd.Index(faixas)
+        piramide.contagens = contagens
+        return piramide
+
+    def somar(self, delta):
+        # Atualização incremental, como em somar_cubos: só as linhas novas da tabela concatenada
+        # (`delta`, com as categorias já unidas) são contadas, e as contagens existentes são somadas
+        # nas células ampliadas por anos ou categorias novas.
+        somada = PiramideEtaria(delta, self.anos)
+        posicoes = posicoes_celulas(self.anos, self.categorias, somada.anos, somada.categorias)
+        somada.contagens[np.ix_(*posicoes, np.arange(len(self.faixas)))] += self.contagens
+        return somada
+
+    @property
+    def forma_celulas(self):
+        return (len(self.anos) + 1, len(self.categorias['racaCor']) + 1, len(self.categorias['sexo']) + 1)
+
+    def contar(self, dados, consulta):
+        # Matriz sexo × faixa da consulta (sem o slot dos sexos ausentes, que a pirâmide não mostra).
+        with etapa('consulta'):
+            if consulta.no_cubo():
+                anos, racas, sexos = mascaras_celulas(consulta.filtros, self.anos, self.categorias)
+                contagens = self.contagens.compress(anos, axis=0).compress(racas, axis=1).sum(axis=(0, 1))[:-1] * sexos[:-1, None]
+            else:
+                linhas = consulta.linhas(dados)
+                tabela = dados['tabela']
+                faixas = tabela['faixaCodigo'].to_numpy()[linhas]
+                sexos = tabela['sexo'].cat.codes.to_numpy()[linhas]
+                validas = (faixas >= 0) & (sexos >= 0)
+                chave = sexos[validas].astype(np.int64) * len(self.faixas) + faixas[validas]
+                contagens = np.bincount(chave, minlength=len(self.categorias['sexo']) * len(self.faixas)).reshape(-1, len(self.faixas))
+        registrar_linhas(contagens)
+        return contagens
+
+    def comparar(self, dados, consulta, coluna, valores):
+        # Uma matriz por valor de `coluna` (ano ou raça), no lugar do filtro da barra lateral nessa coluna.
+        return [self.contar(dados, Consulta({**consulta.filtros, coluna: [valor]})) for valor in valores]
+
+    def tabela(self, contagens):
+        # A matriz no formato de consultar_cubo por (faixa_etaria, sexo): todas as faixas, só os sexos
+        # com casos, mais a coluna por_mil.
+        observados = np.flatnonzero(contagens.sum(axis=1))
+        return pd.DataFrame({
+            'faixa_etaria': pd.Categorical.from_codes(np.repeat(np.arange(len(self.faixas)), len(observados)), self.faixas, ordered=True),
+            'sexo': pd.Categorical.from_codes(np.tile(observados, len(self.faixas)), self.categorias['sexo']),
+            'contagem': contagens[observados].T.ravel(),
+            'por_mil': por_mil(contagens)[observados].T.ravel(),
+        })
+
+    def memoria(self):
+        return self.contagens.nbytes
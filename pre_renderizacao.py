@@ -0,0 +1,226 @@
+import argparse
+import ast
+import gzip
+import hashlib
+import itertools
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+import graficos
+from agregados import DIMENSOES_FILTRO, consultar_cubo
+from atualizacao import MonitorAtualizacoes
+from compartilhado import anexar_versao, carregar_dados_compartilhados, obter_versao
+from config import DIRETORIO_CACHE, DIRETORIO_ESTATICO
+from consulta import compilar_consulta
+from geometria import carregar_malha_municipios
+from ingestao import gravar_metadados, ler_metadados
+from preprocessamento import atualizar_dados
+from sankey import ESTAGIOS_PADRAO
+from serializacao import preparar_figura, serializar_figura
+
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando o formato dos pacotes ou do manifesto mudar: todos são refeitos.
+FORMATO = 1
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+VISUALIZADOR = os.path.join(RAIZ, 'visualizador')
+# Pontos de partida dos construtores: os gráficos, as consultas e a serialização dos pacotes.
+MODULOS_CONSTRUTORES = ('graficos', 'consulta', 'serializacao')
+
+
+def modulos_construtores():
+    # Os módulos de partida e todos os módulos do projeto que eles importam, direta ou indiretamente.
+    pendentes, vistos = list(MODULOS_CONSTRUTORES), set()
+    while pendentes:
+        nome = pendentes.pop()
+        caminho = os.path.join(RAIZ, f'{nome}.py')
+        if nome in vistos or not os.path.exists(caminho):
+            continue
+        vistos.add(nome)
+        with open(caminho, 'rb') as arquivo:
+            arvore = ast.parse(arquivo.read())
+        for no in ast.walk(arvore):
+            if isinstance(no, ast.Import):
+                pendentes += [apelido.name for apelido in no.names]
+            elif isinstance(no, ast.ImportFrom) and no.level == 0:
+                pendentes.append(no.module)
+    return sorted(vistos)
+
+
+def versao_construtores():
+    # Mudar o código dos gráficos, ou de qualquer módulo que eles usam (pirâmide, Sankey, séries,
+    # termos, rótulos...), invalida todos os pacotes, mesmo com os agregados iguais.
+    resumo = hashlib.sha1(str(FORMATO).encode())
+    for nome in modulos_construtores():
+        with open(os.path.join(RAIZ, f'{nome}.py'), 'rb') as arquivo:
+            resumo.update(nome.encode() + b'\0' + arquivo.read())
+    return resumo.hexdigest()[:16]
+
+
+def impressao_consulta(dados, consulta, versao):
+    # Hash de tudo o que os construtores leem para a consulta: os recortes dos cubos, a pirâmide,
+    # os fluxos do Sankey e as contagens de termos. Consultas com a mesma impressão dividem o mesmo pacote.
+    resumo = hashlib.sha1(versao.encode())
+    for nome in ('mapa', 'evolucao'):
+        cubo = dados['cubos'][nome]
+        por = [coluna for coluna in cubo.columns if coluna not in DIMENSOES_FILTRO and coluna != 'contagem']
+        resumo.update(pd.util.hash_pandas_object(consultar_cubo(cubo, por, consulta.filtros)).to_numpy().tobytes())
+    piramide = dados['piramide']
+    resumo.update(repr([list(piramide.faixas), list(piramide.categorias['sexo'])]).encode())
+    resumo.update(np.ascontiguousarray(piramide.contar(dados, consulta), dtype=np.int64).tobytes())
+    tensor = dados['sankey']
+    resumo.update(repr([tensor.rotulos[estagio] for estagio in ESTAGIOS_PADRAO]).encode())
+    for matriz in tensor.fluxos(dados, consulta, ESTAGIOS_PADRAO):
+        resumo.update(np.ascontiguousarray(matriz, dtype=np.int64).tobytes())
+    resumo.update(pd.util.hash_pandas_object(consulta.contar_termos(dados, 'sintomas', 'classificacaoFinal')).to_numpy().tobytes())
+    resumo.update(pd.util.hash_pandas_object(consulta.contar_termos(dados, 'condicoes')).to_numpy().tobytes())
+    return resumo.hexdigest()[:16]
+
+
+def figura_sem_geometria(figura):
+    # O GeoJSON vai uma vez só, em malha.json.gz; o visualizador o devolve ao traço do mapa.
+    figura = preparar_figura(figura)
+    return {**figura, 'data': [{chave: valor for chave, valor in traco.items() if chave != 'geojson'} for traco in figura['data']]}
+
+
+# Os mesmos construtores de criar_graficos e atualizar_graficos, na ordem em que aparecem no painel.
+CONSTRUTORES = {
+    'piramide': lambda dados, malha, consulta: graficos.grafico_piramide(dados, consulta),
+    'sankey': lambda dados, malha, consulta: graficos.grafico_sankey(dados, consulta),
+    'mapa': lambda dados, malha, consulta: figura_sem_geometria(graficos.grafico_mapa(dados, malha, consulta)),
+    'classificacao': lambda dados, malha, consulta: graficos.grafico_classificacao(dados, consulta),
+    'evolucao': lambda dados, malha, consulta: graficos.grafico_evolucao(dados, consulta),
+    'condicoes': lambda dados, malha, consulta: graficos.grafico_condicoes(dados, consulta),
+}
+
+
+def gravar_gzip(caminho, conteudo):
+    # mtime=0: o mesmo conteúdo gera os mesmos bytes. A troca é atômica para quem está servindo a pasta.
+    temporario = caminho + '.tmp'
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(gzip.compress(conteudo, 9, mtime=0))
+    os.replace(temporario, caminho)
+    return os.path.getsize(caminho)
+
+
+_dados = None
+_malha = None
+
+
+def _iniciar_processo(versao, diretorio_cache, malha):
+    # Cada processo do pool anexa a versão já publicada pelo processo principal, sem cópia própria.
+    global _dados, _malha
+    logging.disable(logging.INFO)
+    try:
+        _dados = anexar_versao(versao, diretorio_cache)
+    except FileNotFoundError:
+        # A versão sumiu da pasta compartilhada: o processo monta os dados como o principal,
+        # a partir do CSV e dos deltas registrados.
+        _dados = carregar_dados(diretorio_cache)
+    _malha = malha
+
+
+def _renderizar(destino, impressao, consulta):
+    partes = [b'"%s":%s' % (nome.encode(), serializar_figura(construtor(_dados, _malha, consulta))) for nome, construtor in CONSTRUTORES.items()]
+    return gravar_gzip(os.path.join(destino, 'figuras', f'{impressao}.json.gz'), b'{' + b','.join(partes) + b'}')
+
+
+def chave_combinacao(filtros):
+    return '|'.join('' if valor is None else str(valor) for valor in filtros)
+
+
+def carregar_dados(diretorio_cache):
+    # Os dados como os workers do painel os veem: a versão compartilhada mais os deltas registrados.
+    dados, impressao = carregar_dados_compartilhados(diretorio_cache=diretorio_cache)
+    estado = {'dados': dados}
+
+    def aplicar(df_novo, versao):
+        estado['dados'] = obter_versao(versao, lambda: atualizar_dados(estado['dados'], df_novo, versao), diretorio_cache)
+
+    MonitorAtualizacoes(impressao, aplicar, diretorio_cache=diretorio_cache).verificar()
+    return estado['dados']
+
+
+def copiar_visualizador(destino):
+    for nome in os.listdir(VISUALIZADOR):
+        shutil.copyfile(os.path.join(VISUALIZADOR, nome), os.path.join(destino, nome))
+    caminho_plotly = os.path.join(destino, 'plotly.min.js')
+    if not os.path.exists(caminho_plotly):
+        with open(caminho_plotly, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(get_plotlyjs())
+
+
+def pre_renderizar(destino=DIRETORIO_ESTATICO, diretorio_cache=DIRETORIO_CACHE, processos=None, refazer=False):
+    inicio = time.perf_counter()
+    os.makedirs(os.path.join(destino, 'figuras'), exist_ok=True)
+    dados = carregar_dados(diretorio_cache)
+    malha = carregar_malha_municipios()
+    tabela = dados['tabela']
+    anos = sorted(int(ano) for ano in tabela['ano'].dropna().unique())
+    racas = sorted(tabela['racaCor'].dropna().unique())
+    sexos = sorted(tabela['sexo'].dropna().unique())
+
+    # Todas as combinações de um ano, uma raça e um sexo, cada filtro também como "todos".
+    versao = versao_construtores()
+    combinacoes, pendentes = {}, {}
+    for filtros in itertools.product([None, *anos], [None, *racas], [None, *sexos]):
+        consulta = compilar_consulta(*filtros, anos_disponiveis=anos)
+        impressao = impressao_consulta(dados, consulta, versao)
+        combinacoes[chave_combinacao(filtros)] = f'figuras/{impressao}.json.gz'
+        if refazer or not os.path.exists(os.path.join(destino, 'figuras', f'{impressao}.json.gz')):
+            pendentes.setdefault(impressao, consulta)
+    logger.info(
+        "%d combinações, %d pacotes distintos, %d a renderizar (%.1fs)",
+        len(combinacoes), len(set(combinacoes.values())), len(pendentes), time.perf_counter() - inicio
+    )
+
+    bytes_escritos = 0
+    if pendentes:
+        with ProcessPoolExecutor(processos, initializer=_iniciar_processo, initargs=(dados['versao'], diretorio_cache, malha)) as pool:
+            futuros = [pool.submit(_renderizar, destino, impressao, consulta) for impressao, consulta in pendentes.items()]
+            bytes_escritos = sum(futuro.result() for futuro in futuros)
+
+    gravar_gzip(os.path.join(destino, 'malha.json.gz'), malha['geojson_serializado'].encode('utf-8'))
+    copiar_visualizador(destino)
+    gravar_metadados(os.path.join(destino, 'manifesto.json'), {
+        'formato': FORMATO,
+        'versao_dados': dados['versao'],
+        'versao_construtores': versao,
+        'graficos': list(CONSTRUTORES),
+        'anos': anos,
+        'racas': racas,
+        'sexos': sexos,
+        'combinacoes': combinacoes,
+    })
+
+    # Pacotes que nenhuma combinação usa mais (dados ou código antigos) são removidos.
+    em_uso = {os.path.basename(arquivo) for arquivo in combinacoes.values()}
+    removidos = [nome for nome in os.listdir(os.path.join(destino, 'figuras')) if nome not in em_uso]
+    for nome in removidos:
+        os.remove(os.path.join(destino, 'figuras', nome))
+
+    logger.info(
+        "Pré-renderização em %s: %d pacotes novos (%.1f MB), %d removidos, em %.1fs",
+        destino, len(pendentes), bytes_escritos / 2**20, len(removidos), time.perf_counter() - inicio
+    )
+    return ler_metadados(os.path.join(destino, 'manifesto.json'))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    # Como no painel: as projeções df_* sem cópia (os processos do pool herdam a opção).
+    pd.set_option('mode.copy_on_write', True)
+    parser = argparse.ArgumentParser(description='Pré-renderiza as figuras de todas as combinações de ano, raça e sexo para servir o painel de um host estático.')
+    parser.add_argument('--destino', default=DIRETORIO_ESTATICO)
+    parser.add_argument('--processos', type=int, default=None, help='processos do pool (padrão: um por CPU)')
+    parser.add_argument('--refazer', action='store_true', help='renderiza de novo mesmo os pacotes inalterados')
+    args = parser.parse_args()
+    pre_renderizar(args.destino, processos=args.processos, refazer=args.refazer)
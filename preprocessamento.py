@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+from agregados import construir_cubos, somar_cubos
+from atualizacao import versao_dados
+from config import LIMITES_FAIXAS_PIRAMIDE
+from consulta import COLUNAS_INDEXADAS
+from indice import IndiceBitmap
+from municipios import ParticoesMunicipio
+from piramide import PiramideEtaria
+from sankey import TensorSankey
+from semanas import SeriesSemanais
+from termos import TermosCelulas, construir_incidencias
+from utils import concatenar_tabelas, recodificar_categorias
+
+
+mapeamento_classificacao = {
+    'confirmado laboratorial': 'Confirmado',
+    'confirmado clínico-imagem': 'Confirmado',
+    'confirmado por critério clínico': 'Confirmado',
+    'confirmação laboratorial': 'Confirmado',
+    'confirmado clínico-epidemiológico': 'Confirmado',
+    'confirmado critério clínico': 'Confirmado'
+}
+
+
+def limpar_classificacao(classificacao):
+    classificacao = classificacao.strip().lower()
+    return mapeamento_classificacao.get(classificacao, classificacao).capitalize()
+
+
+def rotulos_piramide(contagem, percentual, unidade='%'):
+    # "contagem (percentual%)" montado sobre os vetores inteiros, sem apply por linha.
+    # np.char.mod devolve o próprio vetor float quando ele é vazio, daí o astype(str).
+    return np.char.add(
+        np.char.add(np.asarray(contagem).astype(str), ' ('),
+        np.char.add(np.char.mod('%.1f', np.asarray(percentual, dtype=float)).astype(str), unidade + ')')
+    )
+
+
+def rotulos_faixas(limites=LIMITES_FAIXAS_PIRAMIDE):
+    return [f'{inicio} a {fim - 1}' for inicio, fim in zip(limites, limites[1:])] + [f'{limites[-1]}+']
+
+
+def codigos_faixa(serie, limites=LIMITES_FAIXAS_PIRAMIDE):
+    # Faixa da pirâmide de cada notificação: a idade inicial ("20 a 24", "80+") é lida uma vez por
+    # categoria e localizada entre os limites; ausentes e idades fora dos limites ficam com -1.
+    inicios = pd.to_numeric(serie.cat.categories.astype(str).str.extract(r'^\s*(\d+)', expand=False), errors='coerce').to_numpy(dtype=float)
+    por_categoria = np.searchsorted(limites, np.nan_to_num(inicios, nan=-1), side='right') - 1
+    return np.append(por_categoria, -1).astype(np.int8)[serie.cat.codes.to_numpy()]
+
+
+def derivar_tabela(df):
+    # As colunas derivadas são recodificadas sobre as categorias e anexadas à tabela
+    # compartilhada; cada df_* é apenas uma projeção dela (sem cópia com o copy-on-write ligado em dbcPibic.py).
+    faixa_codigo = codigos_faixa(df['faixa_etaria'])
+
+    return df.assign(
+        faixaCodigo=faixa_codigo,
+        faixaPiramide=pd.Categorical.from_codes(faixa_codigo, rotulos_faixas(), ordered=True),
+        sintomasSankey=recodificar_categorias(df['sintomas'], valor_ausente='Não Informado'),
+        classificacaoSankey=recodificar_categorias(df['classificacaoFinal'], limpar_classificacao, valor_ausente='Não Classificado'),
+        evolucaoSankey=recodificar_categorias(df['evolucaoCaso'], valor_ausente='Desconhecido'),
+    )
+
+
+def projetar_tabela(tabela):
+    return {
+        'df_piramide': tabela[['racaCor', 'sexo', 'faixaPiramide', 'ano']].rename(columns={'faixaPiramide': 'faixa_etaria'}),
+        'df_sankey': tabela[['sintomasSankey', 'classificacaoSankey', 'evolucaoSankey', 'racaCor', 'sexo', 'ano']].rename(columns={
+            'sintomasSankey': 'sintomas',
+            'classificacaoSankey': 'classificacaoFinal',
+            'evolucaoSankey': 'evolucaoCaso'
+        }),
+        'df_mapa': tabela[['municipioIBGE', 'racaCor', 'sexo', 'ano']],
+        'df_classificacao': tabela[['sintomas', 'classificacaoFinal', 'racaCor', 'sexo', 'ano']],
+        'df_evolucao': tabela[['evolucaoCaso', 'racaCor', 'sexo', 'ano']],
+        'df_condicoes': tabela[['condicoes', 'racaCor', 'sexo', 'ano']],
+    }
+
+
+def preprocessar_dados(df, impressao_dados):
+    tabela = derivar_tabela(df)
+    dados = {
+        'versao': versao_dados(impressao_dados),
+        'tabela': tabela,
+        **projetar_tabela(tabela)
+    }
+    dados['cubos'] = construir_cubos(dados)
+    # Seleção de linhas compartilhada para consultas que descem ao nível das notificações.
+    dados['indice'] = IndiceBitmap(tabela, COLUNAS_INDEXADAS)
+    # Contagens acumuladas por semana epidemiológica para a página de série temporal.
+    dados['series'] = SeriesSemanais(tabela)
+    # Notificações particionadas por município (código IBGE), para o clique no mapa.
+    dados['municipios'] = ParticoesMunicipio(tabela)
+    # Contingência de cada par de etapas do Sankey por célula de ano × raça × sexo.
+    dados['sankey'] = TensorSankey(tabela)
+    # Contagens faixa etária × sexo por célula, para a pirâmide e suas comparações.
+    dados['piramide'] = PiramideEtaria(tabela)
+    # Por último a maior estrutura retida, para não somá-la aos vetores temporários das anteriores:
+    # sintomas e condições tokenizados, uma matriz esparsa notificações × termos por coluna.
+    dados['termos'] = construir_incidencias(tabela)
+    # As mesmas contagens por termo somadas por célula de ano × raça × sexo, para consultas sem outros filtros.
+    dados['termos_celulas'] = TermosCelulas(tabela, dados['termos'])
+
+    return dados
+
+
+def atualizar_dados(dados, df_novo, versao):
+    # Aplica um delta de notificações já limpas e deduplicadas: só as linhas novas passam
+    # pela derivação e pelos cubos, que são somados aos existentes. Devolve um novo dict,
+    # sem alterar `dados`, para que a troca da versão em uso seja uma única atribuição.
+    tabela_nova = derivar_tabela(df_novo)
+    # As faixas são as mesmas nas duas tabelas; a união das categorias só perde a ordenação.
+    tabela = concatenar_tabelas(dados['tabela'], tabela_nova)
+    tabela['faixaPiramide'] = tabela['faixaPiramide'].cat.as_ordered()
+
+    cubos_delta = construir_cubos(projetar_tabela(tabela_nova))
+    cubos = {nome: somar_cubos(cubo, cubos_delta[nome]) for nome, cubo in dados['cubos'].items()}
+    cubos['piramide']['faixa_etaria'] = cubos['piramide']['faixa_etaria'].cat.as_ordered()
+
+    # As linhas novas já com as categorias da tabela concatenada, para as estruturas que somam o delta.
+    delta = tabela.iloc[len(dados['tabela']):]
+
+    atualizados = {'versao': versao, 'tabela': tabela, **projetar_tabela(tabela)}
+    atualizados['cubos'] = cubos
+    atualizados['indice'] = IndiceBitmap(tabela, COLUNAS_INDEXADAS)
+    incidencias_delta = construir_incidencias(delta)
+    atualizados['termos'] = {coluna: incidencia.somar(incidencias_delta[coluna]) for coluna, incidencia in dados['termos'].items()}
+    atualizados['termos_celulas'] = dados['termos_celulas'].somar(delta, incidencias_delta)
+    atualizados['series'] = dados['series'].somar(delta)
+    atualizados['municipios'] = ParticoesMunicipio(tabela)
+    atualizados['sankey'] = dados['sankey'].somar(delta)
+    atualizados['piramide'] = dados['piramide'].somar(delta)
+    return atualizados
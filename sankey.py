@@ -0,0 +1,168 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from agregados import codigos_celulas, eixos_celulas, mascaras_celulas, posicoes_celulas
+from config import LIMITE_CATEGORIAS_SANKEY
+from metricas import etapa, registrar_linhas
+
+
+# Etapa do Sankey -> (coluna da tabela, título). As três etapas do fluxo original usam as
+# colunas já limpas, com os ausentes nomeados.
+ESTAGIOS_SANKEY = {
+    'sintomas': ('sintomasSankey', 'Sintomas'),
+    'classificacaoFinal': ('classificacaoSankey', 'Classificação'),
+    'evolucaoCaso': ('evolucaoSankey', 'Evolução'),
+    'faixa_etaria': ('faixaPiramide', 'Faixa Etária'),
+    'racaCor': ('racaCor', 'Raça'),
+    'sexo': ('sexo', 'Sexo'),
+    'condicoes': ('condicoes', 'Condições'),
+}
+ESTAGIOS_PADRAO = ['sintomas', 'classificacaoFinal', 'evolucaoCaso']
+ROTULO_OUTROS = 'Outros'
+ROTULO_AUSENTE = 'Não Informado'
+
+
+def agrupar_categorias(serie, limite=LIMITE_CATEGORIAS_SANKEY):
+    # Rótulos dos nós de uma etapa e o nó de cada código da coluna (o último slot recebe os
+    # ausentes, código -1). Acima de `limite` categorias, as menos frequentes viram "Outros".
+    categorias = serie.cat.categories
+    mantidas = np.ones(len(categorias), dtype=bool)
+    if len(categorias) > limite:
+        contagens = np.bincount(serie.cat.codes.to_numpy()[serie.cat.codes.to_numpy() >= 0], minlength=len(categorias))
+        mantidas[:] = False
+        mantidas[np.argsort(-contagens, kind='stable')[:limite - 1]] = True
+
+    rotulos = [str(categoria) for categoria, mantida in zip(categorias, mantidas) if mantida]
+    rotulos += [rotulo for rotulo in (ROTULO_OUTROS, ROTULO_AUSENTE) if rotulo not in rotulos]
+    posicoes = {rotulo: i for i, rotulo in enumerate(rotulos)}
+    nos = [posicoes[str(categoria) if mantida else ROTULO_OUTROS] for categoria, mantida in zip(categorias, mantidas)]
+    return rotulos, np.array(nos + [posicoes[ROTULO_AUSENTE]], dtype=np.int64)
+
+
+class TensorSankey:
+    # Tabelas de contingência de cada par de etapas por célula de filtro (ano × raça × sexo),
+    # numa matriz esparsa células × (origem · destino). Os fluxos de qualquer lista de etapas sob
+    # os filtros do cubo somam as linhas das células aceitas, sem voltar às notificações.
+
+    def __init__(self, tabela, limite=LIMITE_CATEGORIAS_SANKEY):
+        self.anos, self.categorias = eixos_celulas(tabela)
+        self.rotulos, self.nos = {}, {}
+        for estagio, (coluna, _) in ESTAGIOS_SANKEY.items():
+            self.rotulos[estagio], self.nos[estagio] = agrupar_categorias(tabela[coluna], limite)
+        self.pares = self._contar(tabela)
+
+    def _contar(self, tabela):
+        # Matrizes de cada par nas células e nos nós já definidos.
+        celulas = np.ravel_multi_index(codigos_celulas(tabela, self.anos, self.categorias), self.forma_celulas)
+        n_celulas = int(np.prod(self.forma_celulas))
+
+        # Os nós de cada linha no menor inteiro que os comporta: são sete vetores do tamanho da tabela.
+        nos = {
+            estagio: self.nos[estagio].astype(np.min_scalar_type(len(self.rotulos[estagio])))[tabela[coluna].cat.codes.to_numpy()]
+            for estagio, (coluna, _) in ESTAGIOS_SANKEY.items()
+        }
+        pares = {}
+        for origem, destino in itertools.combinations(ESTAGIOS_SANKEY, 2):
+            n_destino = len(self.rotulos[destino])
+            largura = len(self.rotulos[origem]) * n_destino
+            chave = celulas * largura + nos[origem].astype(np.int64) * n_destino + nos[destino]
+            contagens = np.bincount(chave, minlength=n_celulas * largura).reshape(n_celulas, largura)
+            pares[origem, destino] = sparse.csr_matrix(contagens.astype(np.int32))
+        return pares
+
+    def somar(self, delta):
+        # Atualização incremental: só as linhas novas da tabela concatenada (`delta`, com as categorias
+        # já unidas, as antigas primeiro) são contadas, e as matrizes existentes são somadas nas células
+        # ampliadas. Os nós ficam os mesmos: as categorias novas de cada etapa entram em "Outros".
+        anos, categorias = eixos_celulas(delta)
+        nos = {}
+        for estagio, (coluna, _) in ESTAGIOS_SANKEY.items():
+            novas = len(delta[coluna].cat.categories) - (len(self.nos[estagio]) - 1)
+            outros = np.full(novas, self.rotulos[estagio].index(ROTULO_OUTROS))
+            nos[estagio] = np.concatenate([self.nos[estagio][:-1], outros, self.nos[estagio][-1:]])
+        somado = TensorSankey.de_pares(np.union1d(self.anos, anos), categorias, self.rotulos, nos, {})
+
+        # Célula nova de cada célula antiga, na ordem das linhas das matrizes.
+        posicoes = posicoes_celulas(self.anos, self.categorias, somado.anos, somado.categorias)
+        mapa = np.ravel_multi_index(np.meshgrid(*posicoes, indexing='ij'), somado.forma_celulas).ravel()
+        n_celulas = int(np.prod(somado.forma_celulas))
+        for par, matriz in somado._contar(delta).items():
+            antiga = self.pares[par].tocoo()
+            antiga = sparse.csr_matrix((antiga.data, (mapa[antiga.row], antiga.col)), shape=(n_celulas, matriz.shape[1]))
+            somado.pares[par] = matriz + antiga
+        return somado
+
+    @classmethod
+    def de_pares(cls, anos, categorias, rotulos, nos, pares):
+        tensor = cls.__new__(cls)
+        tensor.anos = np.asarray(anos, dtype=np.int64)
+        tensor.categorias = {dimensao: pd.Index(valores) for dimensao, valores in categorias.items()}
+        tensor.rotulos = rotulos
+        tensor.nos = nos
+        tensor.pares = pares
+        return tensor
+
+    @property
+    def forma_celulas(self):
+        return (len(self.anos) + 1, len(self.categorias['racaCor']) + 1, len(self.categorias['sexo']) + 1)
+
+    def celulas(self, filtros):
+        # Células aceitas pelos filtros de ano, raça e sexo.
+        anos, racas, sexos = mascaras_celulas(filtros, self.anos, self.categorias)
+        return np.flatnonzero(anos[:, None, None] & racas[None, :, None] & sexos[None, None, :])
+
+    def _par(self, origem, destino):
+        # Matriz do par na orientação pedida: guardada só uma vez, na ordem de ESTAGIOS_SANKEY.
+        if (origem, destino) in self.pares:
+            return self.pares[origem, destino], False
+        return self.pares[destino, origem], True
+
+    def fluxos(self, dados, consulta, estagios):
+        # Matrizes origem × destino de cada par consecutivo de `estagios` sob a consulta. Filtros
+        # fora do cubo descem às notificações selecionadas, contadas com os mesmos nós.
+        with etapa('consulta'):
+            if consulta.no_cubo():
+                celulas = self.celulas(consulta.filtros) if consulta.filtros else None
+                matrizes = []
+                for origem, destino in zip(estagios, estagios[1:]):
+                    matriz, invertida = self._par(origem, destino)
+                    soma = np.asarray((matriz if celulas is None else matriz[celulas]).sum(axis=0)).ravel()
+                    if invertida:
+                        matrizes.append(soma.reshape(len(self.rotulos[destino]), len(self.rotulos[origem])).T)
+                    else:
+                        matrizes.append(soma.reshape(len(self.rotulos[origem]), len(self.rotulos[destino])))
+            else:
+                linhas = consulta.linhas(dados)
+                nos = {estagio: self.nos[estagio][dados['tabela'][ESTAGIOS_SANKEY[estagio][0]].cat.codes.to_numpy()[linhas]] for estagio in estagios}
+                matrizes = []
+                for origem, destino in zip(estagios, estagios[1:]):
+                    forma = (len(self.rotulos[origem]), len(self.rotulos[destino]))
+                    chave = nos[origem] * forma[1] + nos[destino]
+                    matrizes.append(np.bincount(chave, minlength=forma[0] * forma[1]).reshape(forma))
+        if matrizes:
+            registrar_linhas(matrizes[0])
+        return matrizes
+
+    def cubo_par(self, origem, destino):
+        # O par como cubo (ano, racaCor, sexo, origem, destino, contagem), para o store do modo cliente.
+        matriz, invertida = self._par(origem, destino)
+        coo = matriz.tocoo()
+        primeira, segunda = (destino, origem) if invertida else (origem, destino)
+        codigos_primeira, codigos_segunda = np.divmod(coo.col, len(self.rotulos[segunda]))
+        ano, raca, sexo = np.unravel_index(coo.row, self.forma_celulas)
+        valores_ano = np.append(self.anos, 0)[ano]
+        cubo = pd.DataFrame({
+            'ano': pd.arrays.IntegerArray(valores_ano.astype(np.int16), ano == len(self.anos)),
+            'racaCor': pd.Categorical.from_codes(np.where(raca == len(self.categorias['racaCor']), -1, raca), self.categorias['racaCor']),
+            'sexo': pd.Categorical.from_codes(np.where(sexo == len(self.categorias['sexo']), -1, sexo), self.categorias['sexo']),
+            primeira: pd.Categorical.from_codes(codigos_primeira, self.rotulos[primeira]),
+            segunda: pd.Categorical.from_codes(codigos_segunda, self.rotulos[segunda]),
+            'contagem': coo.data.astype(np.int64),
+        })
+        return cubo[['ano', 'racaCor', 'sexo', origem, destino, 'contagem']]
+
+    def memoria(self):
+        return sum(matriz.data.nbytes + matriz.indices.nbytes + matriz.indptr.nbytes for matriz in self.pares.values())
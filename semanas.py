@@ -0,0 +1,286 @@
+import numpy as np
+import pandas as pd
+
+from agregados import realocar
+from metricas import etapa, registrar_linhas
+
+
+# Curvas da página de série temporal -> coluna da tabela, com os rótulos já limpos e os ausentes nomeados.
+COLUNAS_SERIES = {'classificacao': 'classificacaoSankey', 'evolucao': 'evolucaoSankey'}
+# Combinações de filtros com contagens acumuladas próprias; as demais descem às notificações.
+DIMENSOES_SERIES = [('racaCor', 'sexo'), ('municipioIBGE',)]
+
+
+def numero_semana(dias):
+    # Semanas (domingo a sábado) contadas desde a de 04/01/1970, o primeiro domingo da época Unix.
+    return (np.asarray(dias, dtype='datetime64[D]').astype(np.int64) + 4) // 7
+
+
+def inicio_semana(numeros):
+    return (np.asarray(numeros, dtype=np.int64) * 7 - 4).astype('datetime64[D]')
+
+
+def ano_civil(dias):
+    return np.asarray(dias, dtype='datetime64[Y]').astype(np.int64) + 1970
+
+
+def semana_epidemiologica(inicios):
+    # (ano, SE) de cada semana: a SE 1 é a que contém 4 de janeiro, então o ano epidemiológico
+    # é o da quarta-feira da semana.
+    anos = ano_civil(inicios + np.timedelta64(3, 'D'))
+    quatro_de_janeiro = (anos - 1970).astype('datetime64[Y]').astype('datetime64[D]') + np.timedelta64(3, 'D')
+    return anos, numero_semana(inicios) - numero_semana(quatro_de_janeiro) + 1
+
+
+def rotulo_semana(data):
+    ano, numero = semana_epidemiologica(inicio_semana(numero_semana([data])))
+    return f'SE {numero[0]:02d}/{ano[0]}'
+
+
+class CalendarioSemanas:
+    # Semanas epidemiológicas da primeira à última notificação. A semana que atravessa a virada
+    # do ano vira dois baldes, um por ano civil, para que o filtro de ano corte as curvas exatamente;
+    # somando os baldes de cada semana as curvas voltam a ser semanais.
+
+    def __init__(self, primeira, n_semanas):
+        self.primeira = int(primeira)
+        self.n_semanas = int(n_semanas)
+        self.inicios = inicio_semana(np.arange(self.primeira, self.primeira + self.n_semanas))
+        anos_inicio, anos_fim = ano_civil(self.inicios), ano_civil(self.inicios + np.timedelta64(6, 'D'))
+        divididas = anos_fim != anos_inicio
+
+        # Primeiro balde de cada semana; a última posição é o total de baldes.
+        self.posicoes = np.zeros(self.n_semanas + 1, dtype=np.int64)
+        np.cumsum(1 + divididas, out=self.posicoes[1:])
+        self.n_baldes = int(self.posicoes[-1])
+        self.anos = np.empty(self.n_baldes, dtype=np.int64)
+        self.anos[self.posicoes[:-1]] = anos_inicio
+        self.anos[self.posicoes[:-1][divididas] + 1] = anos_fim[divididas]
+        self._anos_inicio = anos_inicio
+
+    def estender(self, datas):
+        # Calendário que cobre também `datas`; o mesmo objeto quando elas já cabem nele.
+        dias = np.asarray(datas, dtype='datetime64[D]')
+        semanas = numero_semana(dias[~np.isnat(dias)])
+        if semanas.size == 0:
+            return self
+        primeira = min(self.primeira, int(semanas.min()))
+        ultima = max(self.primeira + self.n_semanas - 1, int(semanas.max()))
+        if (primeira, ultima) == (self.primeira, self.primeira + self.n_semanas - 1):
+            return self
+        return CalendarioSemanas(primeira, ultima - primeira + 1)
+
+    @classmethod
+    def de_datas(cls, datas):
+        semanas = numero_semana(datas)
+        semanas = semanas[~np.isnat(np.asarray(datas, dtype='datetime64[D]'))]
+        if semanas.size == 0:
+            return cls(numero_semana([np.datetime64('today')])[0], 1)
+        return cls(semanas.min(), semanas.max() - semanas.min() + 1)
+
+    def baldes(self, datas):
+        # Balde de cada data; -1 para datas ausentes ou fora do calendário.
+        dias = np.asarray(datas, dtype='datetime64[D]')
+        semanas = numero_semana(dias) - self.primeira
+        validas = ~np.isnat(dias) & (semanas >= 0) & (semanas < self.n_semanas)
+        baldes = np.full(len(dias), -1, dtype=np.int64)
+        semanas = semanas[validas]
+        baldes[validas] = self.posicoes[semanas] + (ano_civil(dias[validas]) != self._anos_inicio[semanas])
+        return baldes
+
+    def janela(self, anos=None, periodo=None):
+        # Baldes [início, fim) dos anos filtrados (sempre contíguos) e do período [semana inicial, semana final].
+        inicio, fim = 0, self.n_baldes
+        if anos:
+            dentro = np.flatnonzero(np.isin(self.anos, anos))
+            inicio, fim = (int(dentro[0]), int(dentro[-1]) + 1) if dentro.size else (0, 0)
+        if periodo:
+            semanas = np.clip(numero_semana(periodo) - self.primeira + [0, 1], 0, self.n_semanas)
+            inicio, fim = max(inicio, int(self.posicoes[semanas[0]])), min(fim, int(self.posicoes[semanas[1]]))
+        return inicio, max(inicio, fim)
+
+    def semanas_na_janela(self, inicio, fim):
+        # Semanas que tocam a janela e as posições do acumulado que as delimitam.
+        semanas = np.flatnonzero((self.posicoes[:-1] < fim) & (self.posicoes[1:] > inicio))
+        limites = np.clip(self.posicoes[np.append(semanas, semanas[-1] + 1)] if semanas.size else [], inicio, fim)
+        return semanas, np.asarray(limites, dtype=np.int64)
+
+
+def acumular(contagens):
+    # Somas prefixadas no último eixo, com um zero à frente: a janela [a, b) é acumulado[..., b] - acumulado[..., a].
+    acumulado = np.zeros(contagens.shape[:-1] + (contagens.shape[-1] + 1,), dtype=np.int32)
+    np.cumsum(contagens, axis=-1, out=acumulado[..., 1:])
+    return acumulado
+
+
+class ContagensSemanais:
+    # Contagens acumuladas por balde semanal para cada combinação de valores das `dimensoes`
+    # e grupo da curva. Qualquer janela de datas custa duas leituras por curva.
+
+    def __init__(self, tabela, calendario, coluna, dimensoes, baldes=None):
+        # `baldes` (os de tabela['dataNotificacao'] no calendário) evita recalculá-los a cada curva.
+        self.coluna = coluna
+        self.dimensoes = list(dimensoes)
+        self.grupos = tabela[coluna].cat.categories
+        self.valores = {dimensao: tabela[dimensao].cat.categories for dimensao in self.dimensoes}
+        self.acumulado = acumular(self._contar(tabela, calendario, baldes))
+
+    def _contar(self, tabela, calendario, baldes=None):
+        # Contagens por balde (sem acumular) nos eixos de self.valores e self.grupos.
+        if baldes is None:
+            baldes = calendario.baldes(tabela['dataNotificacao'])
+        grupos = tabela[self.coluna].cat.codes.to_numpy()
+        # Ausentes (código -1) ficam no último slot de cada dimensão: contam quando ela não é filtrada.
+        codigos = []
+        for dimensao in self.dimensoes:
+            codigos_dimensao = tabela[dimensao].cat.codes.to_numpy()
+            codigos.append(np.where(codigos_dimensao < 0, len(self.valores[dimensao]), codigos_dimensao))
+        forma = [len(self.valores[dimensao]) + 1 for dimensao in self.dimensoes] + [len(self.grupos), calendario.n_baldes]
+        validas = (baldes >= 0) & (grupos >= 0)
+        chave = np.ravel_multi_index([c[validas] for c in codigos] + [grupos[validas], baldes[validas]], forma)
+        return np.bincount(chave, minlength=int(np.prod(forma))).reshape(forma)
+
+    @classmethod
+    def de_acumulado(cls, coluna, dimensoes, grupos, valores, acumulado):
+        contagens = cls.__new__(cls)
+        contagens.coluna = coluna
+        contagens.dimensoes = list(dimensoes)
+        contagens.grupos = pd.Index(grupos)
+        contagens.valores = {dimensao: pd.Index(valores[dimensao]) for dimensao in contagens.dimensoes}
+        contagens.acumulado = acumulado
+        return contagens
+
+    def somar(self, delta, calendario_antigo, calendario, baldes=None):
+        # Atualização incremental: o acumulado existente vai para os eixos do delta (categorias e
+        # semanas novas) e só os baldes a partir da primeira semana do delta são acumulados de novo.
+        # `delta` são as linhas novas da tabela concatenada, já com as categorias unidas.
+        somado = ContagensSemanais.de_acumulado(
+            self.coluna, self.dimensoes, delta[self.coluna].cat.categories,
+            {dimensao: delta[dimensao].cat.categories for dimensao in self.dimensoes}, None
+        )
+        contagens = somado._contar(delta, calendario, baldes)
+
+        # Depois da última semana antiga o acumulado só se repete.
+        inicio = int(calendario.posicoes[calendario_antigo.primeira - calendario.primeira])
+        depois = calendario.n_baldes - inicio - calendario_antigo.n_baldes
+        acumulado = np.concatenate([
+            np.zeros(self.acumulado.shape[:-1] + (inicio,), dtype=self.acumulado.dtype),
+            self.acumulado,
+            np.repeat(self.acumulado[..., -1:], depois, axis=-1),
+        ], axis=-1)
+        posicoes = [
+            np.append(somado.valores[dimensao].get_indexer(self.valores[dimensao]), len(somado.valores[dimensao]))
+            for dimensao in self.dimensoes
+        ] + [somado.grupos.get_indexer(self.grupos), np.arange(calendario.n_baldes + 1)]
+        somado.acumulado = realocar(acumulado, posicoes, contagens.shape[:-1] + (calendario.n_baldes + 1,))
+
+        ativos = np.flatnonzero(contagens.any(axis=tuple(range(contagens.ndim - 1))))
+        if ativos.size:
+            primeiro = ativos[0]
+            somado.acumulado[..., primeiro + 1:] += np.cumsum(contagens[..., primeiro:], axis=-1, dtype=somado.acumulado.dtype)
+        return somado
+
+    def atende(self, filtros):
+        return set(filtros) <= set(self.dimensoes)
+
+    def selecionar(self, filtros):
+        # Acumulado (grupos × baldes + 1) somado sobre as combinações aceitas pelos filtros.
+        posicoes = []
+        for dimensao in self.dimensoes:
+            if dimensao in filtros:
+                indices = self.valores[dimensao].get_indexer(filtros[dimensao])
+                posicoes.append(indices[indices >= 0])
+            else:
+                posicoes.append(np.arange(len(self.valores[dimensao]) + 1))
+        return self.acumulado[np.ix_(*posicoes)].sum(axis=tuple(range(len(self.dimensoes))), dtype=np.int64)
+
+    def memoria(self):
+        return self.acumulado.nbytes
+
+
+class SeriesSemanais:
+    # Calendário mais as contagens acumuladas de cada curva, uma por combinação de DIMENSOES_SERIES.
+
+    def __init__(self, tabela):
+        self.calendario = CalendarioSemanas.de_datas(tabela['dataNotificacao'])
+        baldes = self.calendario.baldes(tabela['dataNotificacao'])
+        self.contagens = {
+            nome: [ContagensSemanais(tabela, self.calendario, coluna, dimensoes, baldes) for dimensoes in DIMENSOES_SERIES]
+            for nome, coluna in COLUNAS_SERIES.items()
+        }
+
+    @classmethod
+    def de_contagens(cls, calendario, contagens):
+        series = cls.__new__(cls)
+        series.calendario = calendario
+        series.contagens = contagens
+        return series
+
+    def somar(self, delta):
+        # Atualização incremental com as linhas novas da tabela concatenada: cada curva soma só as
+        # contagens do delta, sem voltar às semanas já acumuladas.
+        calendario = self.calendario.estender(delta['dataNotificacao'])
+        baldes = calendario.baldes(delta['dataNotificacao'])
+        contagens = {
+            nome: [contagens.somar(delta, self.calendario, calendario, baldes) for contagens in lista]
+            for nome, lista in self.contagens.items()
+        }
+        return SeriesSemanais.de_contagens(calendario, contagens)
+
+    def acumulado(self, dados, consulta, nome):
+        # Acumulado (grupos × baldes + 1) da curva `nome` sob a consulta, sem o filtro de ano,
+        # que vira a janela de baldes. Filtros fora das dimensões acumuladas descem às notificações.
+        filtros = {coluna: valores for coluna, valores in consulta.filtros.items() if coluna != 'ano'}
+        for contagens in self.contagens[nome]:
+            if contagens.atende(filtros):
+                return contagens.grupos, contagens.selecionar(filtros)
+
+        with etapa('consulta'):
+            tabela = dados['tabela']
+            coluna = COLUNAS_SERIES[nome]
+            linhas = consulta.linhas(dados)
+            grupos = tabela[coluna].cat.codes.to_numpy()
+            datas = tabela['dataNotificacao'].to_numpy()
+            if linhas is not None:
+                grupos, datas = grupos[linhas], datas[linhas]
+            baldes = self.calendario.baldes(datas)
+            validas = (grupos >= 0) & (baldes >= 0)
+            n_grupos = len(tabela[coluna].cat.categories)
+            contagens = np.bincount(
+                grupos[validas] * self.calendario.n_baldes + baldes[validas], minlength=n_grupos * self.calendario.n_baldes
+            ).reshape(n_grupos, self.calendario.n_baldes)
+            return tabela[coluna].cat.categories, acumular(contagens)
+
+    def casos(self, dados, consulta, nome, media_movel=1):
+        # Casos por semana epidemiológica (semanas × grupos) na janela dos anos filtrados, os totais
+        # de cada grupo no período selecionado e, com media_movel > 1, a média móvel das últimas semanas.
+        calendario = self.calendario
+        periodo = consulta.filtros.get('dataNotificacao')
+        grupos, acumulado = self.acumulado(dados, consulta.sem('dataNotificacao', 'ano'), nome)
+        inicio, fim = calendario.janela(consulta.filtros.get('ano'))
+        semanas, limites = calendario.semanas_na_janela(inicio, fim)
+
+        por_semana = acumulado[:, limites]
+        semanais = np.diff(por_semana, axis=1)
+        registrar_linhas(semanais)
+        inicio_periodo, fim_periodo = calendario.janela(consulta.filtros.get('ano'), periodo)
+        totais = acumulado[:, fim_periodo] - acumulado[:, inicio_periodo]
+
+        media = None
+        if media_movel > 1 and semanas.size:
+            # Média das últimas `media_movel` semanas pelas somas prefixadas; indefinida até completar a janela.
+            recorte = por_semana - por_semana[:, :1]
+            media = np.full(semanais.shape, np.nan)
+            media[:, media_movel - 1:] = (recorte[:, media_movel:] - recorte[:, :-media_movel]) / media_movel
+
+        anos_se, numeros_se = semana_epidemiologica(calendario.inicios[semanas])
+        indice = pd.Index(pd.to_datetime(calendario.inicios[semanas]), name='semana')
+        return {
+            'casos': pd.DataFrame(semanais.T, index=indice, columns=grupos),
+            'media': None if media is None else pd.DataFrame(media.T, index=indice, columns=grupos),
+            'totais': pd.Series(totais, index=grupos, name='contagem'),
+            'rotulos': [f'SE {numero:02d}/{ano}' for ano, numero in zip(anos_se, numeros_se)],
+        }
+
+    def memoria(self):
+        return sum(contagens.memoria() for lista in self.contagens.values() for contagens in lista)
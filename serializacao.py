@@ -0,0 +1,110 @@
+import base64
+import gzip
+import json
+import logging
+
+import numpy as np
+import plotly.io as pio
+from plotly.basedatatypes import BaseFigure
+from plotly.io.json import to_json_plotly
+from plotly.utils import PlotlyJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+
+logger = logging.getLogger(__name__)
+
+# Com o orjson instalado, o plotly e o Dash (que serializa as respostas dos callbacks via
+# plotly.io.json) usam o codificador nativo, que escreve vetores NumPy sem passar por listas.
+if orjson is not None:
+    pio.json.config.default_engine = 'orjson'
+
+# Atributos dos traços que o plotly.js (>= 2.28) aceita como vetor tipado {dtype, bdata}.
+CAMPOS_BINARIOS = {'x', 'y', 'z', 'source', 'target', 'value'}
+# Abaixo disso o vetor fica como lista: o cabeçalho do objeto binário não compensa.
+TAMANHO_MINIMO_BINARIO = 16
+
+
+def vetor_binario(valores):
+    # Vetor numérico em base64 (little-endian), no menor dtype inteiro que comporta os valores;
+    # qualquer outra coisa (textos, ausentes misturados, vetores curtos) volta sem alteração.
+    vetor = np.asarray(valores)
+    if vetor.ndim != 1 or vetor.dtype.kind not in 'iuf' or vetor.size < TAMANHO_MINIMO_BINARIO:
+        return valores
+
+    if vetor.dtype.kind in 'iu':
+        for dtype in ('i1', 'i2', 'i4'):
+            info = np.iinfo(dtype)
+            if vetor.min() >= info.min and vetor.max() <= info.max:
+                break
+        else:
+            return valores
+    else:
+        dtype = 'f8'
+    return {'dtype': dtype, 'bdata': base64.b64encode(vetor.astype(f'<{dtype}').tobytes()).decode('ascii')}
+
+
+def _binarizar(traco):
+    # Os vetores ficam no próprio traço ou um nível abaixo (link.source, marker.color);
+    # listas não são percorridas, o que deixa de fora o GeoJSON e os textos.
+    return {
+        chave: vetor_binario(valor) if chave in CAMPOS_BINARIOS and isinstance(valor, (list, tuple, np.ndarray))
+        else _binarizar(valor) if isinstance(valor, dict) else valor
+        for chave, valor in traco.items()
+    }
+
+
+def preparar_figura(figura):
+    # Figura (ou dict de figura) com os vetores dos traços já em binário; o layout não muda.
+    # De um go.Figure lemos os traços sem o deepcopy do to_plotly_json, que no mapa
+    # copiaria o GeoJSON inteiro a cada serialização.
+    if isinstance(figura, BaseFigure):
+        figura = {'data': figura._data, 'layout': figura._layout}
+    elif hasattr(figura, 'to_plotly_json'):
+        figura = figura.to_plotly_json()
+    if isinstance(figura, dict) and 'data' in figura:
+        figura = {**figura, 'data': [_binarizar(traco) for traco in figura['data']]}
+    return figura
+
+
+def serializar_figura(figura):
+    figura = preparar_figura(figura)
+    if orjson is not None:
+        return to_json_plotly(figura, engine='orjson').encode('utf-8')
+    return json.dumps(figura, cls=PlotlyJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+
+def ler_json(serializado):
+    return orjson.loads(serializado) if orjson is not None else json.loads(serializado)
+
+
+def tamanhos_payload(serializado):
+    # Bytes da resposta crua e comprimida como o navegador a receberia.
+    tamanhos = {'bruto': len(serializado), 'gzip': len(gzip.compress(serializado, 6))}
+    if brotli is not None:
+        tamanhos['br'] = len(brotli.compress(serializado, quality=4))
+    return tamanhos
+
+
+def comprimir_respostas(server):
+    # Respostas dos callbacks (e os assets) comprimidas com brotli, ou gzip quando o
+    # navegador ou o ambiente não o suportam. Sem o flask-compress, segue sem compressão.
+    if Compress is None:
+        logger.warning("flask-compress não instalado: respostas enviadas sem compressão")
+        return False
+    server.config['COMPRESS_ALGORITHM'] = ['br', 'gzip'] if brotli is not None else ['gzip']
+    Compress(server)
+    return True
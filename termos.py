@@ -0,0 +1,193 @@
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from agregados import codigos_celulas, eixos_celulas, mascaras_celulas, posicoes_celulas
+
+
+COLUNAS_MULTIVALORADAS = ['sintomas', 'condicoes']
+# Coluna multivalorada -> coluna que divide as contagens por célula (None: só por termo),
+# a mesma que os gráficos usam em contar_por.
+AGRUPAMENTOS_TERMOS = {'sintomas': 'classificacaoFinal', 'condicoes': None}
+
+
+def separar_termos(texto):
+    # "Febre, Tosse, Dor de Garganta" -> ['Febre', 'Tosse', 'Dor de Garganta'], sem vazios nem repetidos.
+    return list(dict.fromkeys(termo.strip() for termo in str(texto).split(',') if termo.strip()))
+
+
+def incidencia_categorias(categorias):
+    # CSR categorias × termos, com 1 em cada termo presente na categoria. Os termos saem
+    # ordenados, e a tokenização roda uma vez por categoria, não por notificação.
+    listas = [separar_termos(categoria) for categoria in categorias]
+    termos = pd.Index(sorted(set(chain.from_iterable(listas))))
+    indptr = np.zeros(len(listas) + 1, dtype=np.int64)
+    np.cumsum([len(lista) for lista in listas], out=indptr[1:])
+    indices = termos.get_indexer(list(chain.from_iterable(listas)))
+    matriz = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.int32), indices, indptr), shape=(len(listas), len(termos))
+    )
+    return matriz, termos
+
+
+class IncidenciaTermos:
+    # Matriz esparsa (CSR) notificações × termos de uma coluna multivalorada, com o dicionário
+    # de termos. Contagens por termo sob qualquer seleção de linhas são um produto matriz-vetor.
+
+    def __init__(self, serie):
+        self.nome = serie.name
+        por_categoria, self.termos = incidencia_categorias(serie.cat.categories)
+        # Uma linha vazia no fim recebe as notificações sem valor (código -1).
+        por_categoria = sparse.vstack([por_categoria, sparse.csr_matrix((1, len(self.termos)), dtype=np.int32)], format='csr')
+        self.matriz = por_categoria[serie.cat.codes.to_numpy()]
+
+    @classmethod
+    def de_matriz(cls, nome, matriz, termos):
+        # Reaproveita uma matriz já montada (por exemplo, mapeada de disco).
+        incidencia = cls.__new__(cls)
+        incidencia.nome = nome
+        incidencia.matriz = matriz
+        incidencia.termos = pd.Index(termos)
+        return incidencia
+
+    def somar(self, delta):
+        # Atualização incremental: as linhas da incidência do delta vão ao fim da matriz, e as colunas
+        # antigas para a posição dos seus termos no dicionário ampliado.
+        matriz = self.matriz
+        if not delta.termos.equals(self.termos):
+            mapa = delta.termos.get_indexer(self.termos)
+            matriz = sparse.csr_matrix((matriz.data, mapa[matriz.indices], matriz.indptr), shape=(matriz.shape[0], len(delta.termos)))
+        return IncidenciaTermos.de_matriz(self.nome, sparse.vstack([matriz, delta.matriz], format='csr'), delta.termos)
+
+    def _selecao(self, linhas):
+        return self.matriz if linhas is None else self.matriz[linhas]
+
+    def contar(self, linhas=None):
+        # Notificações por termo: a incidência das linhas selecionadas (IndiceBitmap.selecionar,
+        # None = todas) transposta vezes um vetor de uns.
+        matriz = self._selecao(linhas)
+        contagens = matriz.T @ np.ones(matriz.shape[0], dtype=np.int32)
+        return pd.Series(contagens.astype(np.int64), index=self.termos.rename(self.nome), name='contagem')
+
+    def contar_por(self, serie, linhas=None):
+        # Notificações por (categoria de `serie`, termo): a matriz de grupos (uma linha por
+        # categoria) multiplicada pela incidência. Devolve só as combinações com casos.
+        matriz = self._selecao(linhas)
+        codigos = serie.cat.codes.to_numpy()
+        if linhas is not None:
+            codigos = codigos[linhas]
+        # Cada notificação está em no máximo um grupo, então a matriz de grupos sai direto
+        # em CSC (uma coluna por notificação), sem passar por COO.
+        validas = codigos >= 0
+        indptr = np.zeros(len(codigos) + 1, dtype=np.int32)
+        np.cumsum(validas, out=indptr[1:])
+        grupos = sparse.csc_matrix(
+            (np.ones(indptr[-1], dtype=np.int32), codigos[validas].astype(np.int32), indptr),
+            shape=(len(serie.cat.categories), len(codigos))
+        )
+        contagens = (grupos @ matriz).tocoo()
+        resultado = pd.Series(
+            contagens.data.astype(np.int64),
+            index=pd.MultiIndex.from_arrays(
+                [self.termos[contagens.col], serie.cat.categories[contagens.row]], names=[self.nome, serie.name]
+            ),
+            name='contagem'
+        )
+        return resultado[resultado > 0].sort_index()
+
+    def coocorrencia(self, linhas=None):
+        # Termos × termos: notificações que têm os dois termos; a diagonal é o total por termo.
+        matriz = self._selecao(linhas)
+        return pd.DataFrame((matriz.T @ matriz).toarray(), index=self.termos, columns=self.termos)
+
+    def memoria(self):
+        return self.matriz.data.nbytes + self.matriz.indices.nbytes + self.matriz.indptr.nbytes
+
+
+def construir_incidencias(tabela):
+    return {coluna: IncidenciaTermos(tabela[coluna]) for coluna in COLUNAS_MULTIVALORADAS}
+
+
+class TermosCelulas:
+    # Contagens de cada termo por célula de filtro (ano × raça × sexo) e grupo de AGRUPAMENTOS_TERMOS,
+    # num vetor denso (anos, raças, sexos, grupos, termos); o último grupo recebe os ausentes (e todas
+    # as notificações das colunas sem agrupamento). Consultas que só filtram as dimensões do cubo somam
+    # as células aceitas, sem o produto pela incidência de todas as notificações.
+
+    def __init__(self, tabela, incidencias, anos=None):
+        # `anos` amplia o eixo dos anos além dos presentes na tabela (usado ao somar um delta).
+        self.anos, self.categorias = eixos_celulas(tabela)
+        if anos is not None:
+            self.anos = np.union1d(self.anos, anos)
+        # Índices em int32 (as chaves cabem com folga): a matriz de chaves tem uma coluna por notificação.
+        celulas = np.ravel_multi_index(codigos_celulas(tabela, self.anos, self.categorias), self.forma_celulas).astype(np.int32)
+        n_celulas = int(np.prod(self.forma_celulas))
+
+        self.termos, self.grupos, self.contagens = {}, {}, {}
+        for coluna, agrupadora in AGRUPAMENTOS_TERMOS.items():
+            incidencia = incidencias[coluna]
+            self.termos[coluna] = incidencia.termos
+            if agrupadora is None:
+                self.grupos[coluna] = pd.Index([])
+                grupos = np.zeros(len(tabela), dtype=np.int32)
+            else:
+                self.grupos[coluna] = tabela[agrupadora].cat.categories
+                codigos = tabela[agrupadora].cat.codes.to_numpy()
+                grupos = np.where(codigos < 0, len(self.grupos[coluna]), codigos)
+            n_grupos = len(self.grupos[coluna]) + 1
+            # Uma coluna por notificação com 1 na sua (célula, grupo): o produto soma a incidência por chave.
+            chaves = sparse.csc_matrix(
+                (np.ones(len(tabela), dtype=np.int32), celulas * n_grupos + grupos, np.arange(len(tabela) + 1, dtype=np.int32)),
+                shape=(n_celulas * n_grupos, len(tabela))
+            )
+            contagens = (chaves @ incidencia.matriz).toarray().astype(np.int64)
+            self.contagens[coluna] = contagens.reshape(*self.forma_celulas, n_grupos, len(incidencia.termos))
+
+    @classmethod
+    def de_contagens(cls, anos, categorias, termos, grupos, contagens):
+        termos_celulas = cls.__new__(cls)
+        termos_celulas.anos = np.asarray(anos, dtype=np.int64)
+        termos_celulas.categorias = {dimensao: pd.Index(valores) for dimensao, valores in categorias.items()}
+        termos_celulas.termos = {coluna: pd.Index(valores) for coluna, valores in termos.items()}
+        termos_celulas.grupos = {coluna: pd.Index(valores) for coluna, valores in grupos.items()}
+        termos_celulas.contagens = contagens
+        return termos_celulas
+
+    @property
+    def forma_celulas(self):
+        return (len(self.anos) + 1, len(self.categorias['racaCor']) + 1, len(self.categorias['sexo']) + 1)
+
+    def somar(self, delta, incidencias):
+        # Atualização incremental: só as linhas novas da tabela concatenada (`delta`, com as categorias
+        # já unidas) e a incidência delas são contadas; as contagens existentes vão para as células,
+        # grupos e termos ampliados.
+        somadas = TermosCelulas(delta, incidencias, self.anos)
+        posicoes = posicoes_celulas(self.anos, self.categorias, somadas.anos, somadas.categorias)
+        for coluna, contagens in self.contagens.items():
+            grupos = np.append(somadas.grupos[coluna].get_indexer(self.grupos[coluna]), len(somadas.grupos[coluna]))
+            termos = somadas.termos[coluna].get_indexer(self.termos[coluna])
+            somadas.contagens[coluna][np.ix_(*posicoes, grupos, termos)] += contagens
+        return somadas
+
+    def contar(self, coluna, filtros, por=None):
+        # Mesmo resultado de IncidenciaTermos.contar (sem `por`) ou contar_por (por = o agrupamento da coluna).
+        if por is not None and por != AGRUPAMENTOS_TERMOS[coluna]:
+            raise ValueError(f"Contagens de {coluna} por célula não são agrupadas por {por}")
+        anos, racas, sexos = mascaras_celulas(filtros, self.anos, self.categorias)
+        contagens = self.contagens[coluna].compress(anos, axis=0).compress(racas, axis=1).compress(sexos, axis=2).sum(axis=(0, 1, 2))
+        termos = self.termos[coluna]
+        if por is None:
+            return pd.Series(contagens.sum(axis=0), index=termos.rename(coluna), name='contagem')
+
+        grupos, colunas = np.nonzero(contagens[:-1])
+        resultado = pd.Series(
+            contagens[grupos, colunas],
+            index=pd.MultiIndex.from_arrays([termos[colunas], self.grupos[coluna][grupos]], names=[coluna, por]),
+            name='contagem'
+        )
+        return resultado.sort_index()
+
+    def memoria(self):
+        return sum(contagens.nbytes for contagens in self.contagens.values())
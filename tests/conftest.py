@@ -0,0 +1,64 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+from dados_sinteticos import gerar_notificacoes
+from ingestao import limpar_notificacoes
+
+# Os testes rodam com a mesma opção do painel (dbcPibic.py).
+pd.set_option('mode.copy_on_write', True)
+
+
+RACAS = ['Parda', 'Branca', 'Preta', 'Amarela', 'Indígena']
+SEXOS = ['Feminino', 'Masculino']
+FAIXAS = [f'{inicio} a {inicio + 4}' for inicio in range(0, 80, 5)] + ['80+']
+SINTOMAS = ['Febre', 'Tosse', 'Febre, Tosse', 'Tosse, Coriza', 'Febre, Dor de Cabeça, Tosse', 'Coriza']
+CLASSIFICACOES = ['Confirmado Laboratorial', 'Confirmado Clínico-Imagem', 'Descartado', 'Síndrome Gripal Não Especificada']
+EVOLUCOES = ['Cura', 'Óbito', 'Internado', 'Ignorado']
+CONDICOES = ['Diabetes', 'Obesidade', 'Diabetes, Obesidade', 'Gestante']
+MUNICIPIOS = [('Recife', 2611606), ('Olinda', 2609600), ('Caruaru', 2604106), ('Petrolina', 2611101)]
+
+IMPRESSAO = {'hash': 'teste', 'versao_esquema': 0}
+
+
+def notificacoes(n_linhas=2000, semente=0):
+    # Notificações no formato do CSV (texto, com ausentes), pequenas o bastante para conferir
+    # cada agregado contra um groupby direto sobre as linhas.
+    rng = np.random.default_rng(semente)
+
+    def sortear(valores, ausentes=0.0):
+        serie = pd.Series(np.asarray(valores, dtype=object)[rng.integers(0, len(valores), n_linhas)])
+        serie[rng.random(n_linhas) < ausentes] = None
+        return serie
+
+    municipios = rng.integers(0, len(MUNICIPIOS), n_linhas)
+    dias = pd.date_range('2019-12-01', '2025-01-31').strftime('%Y-%m-%d')
+    return pd.DataFrame({
+        'dataNotificacao': sortear(dias, 0.02),
+        'municipio': [MUNICIPIOS[i][0].upper() for i in municipios],
+        'municipioNotificacao': [MUNICIPIOS[i][0] for i in municipios],
+        'municipioIBGE': [MUNICIPIOS[i][1] for i in municipios],
+        'racaCor': sortear(RACAS, 0.05),
+        'sexo': sortear(SEXOS, 0.01),
+        'faixa_etaria': sortear(FAIXAS, 0.02),
+        'sintomas': sortear(SINTOMAS, 0.1),
+        'classificacaoFinal': sortear(CLASSIFICACOES, 0.2),
+        'evolucaoCaso': sortear(EVOLUCOES, 0.3),
+        'condicoes': sortear(CONDICOES, 0.5),
+    })
+
+
+def tabela_sintetica(n_linhas, semente=0):
+    # A tabela já limpa sobre os dados sintéticos dos benchmarks (185 municípios, 2020-2024).
+    return limpar_notificacoes(gerar_notificacoes(n_linhas, semente=semente))
+
+
+def comparar(resultado, esperado):
+    # Só as contagens positivas, por valor do índice: sem exigir os mesmos dtypes (categorias, unidade das datas).
+    assert resultado[resultado > 0].to_dict() == esperado[esperado > 0].to_dict()
@@ -0,0 +1,81 @@
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from agregados import construir_cubo, consultar_cubo, contar_linhas
+from conftest import IMPRESSAO, RAIZ, notificacoes, tabela_sintetica
+from preprocessamento import preprocessar_dados
+
+
+FILTROS = [
+    {},
+    {'ano': [2022]},
+    {'racaCor': ['Parda']},
+    {'ano': [2021], 'racaCor': ['Branca'], 'sexo': ['Feminino']},
+    {'ano': [2021, 2023], 'racaCor': ['Parda', 'Branca']},
+    {'ano': [2019]},
+]
+
+
+@pytest.fixture(scope='module')
+def linhas():
+    df = notificacoes()
+    df['ano'] = pd.to_datetime(df['dataNotificacao']).dt.year.astype('Int64')
+    return df
+
+
+def selecionar(df, filtros):
+    for coluna, valores in filtros.items():
+        df = df[df[coluna].isin(valores).fillna(False).to_numpy(dtype=bool)]
+    return df
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+@pytest.mark.parametrize('por', ['evolucaoCaso', ['sintomas', 'classificacaoFinal']])
+def test_cubo_igual_ao_groupby_das_linhas(linhas, filtros, por):
+    cubo = construir_cubo(linhas, [por] if isinstance(por, str) else por)
+    esperado = selecionar(linhas, filtros).groupby(por).size()
+    resultado = consultar_cubo(cubo, por, filtros)
+    pd.testing.assert_series_equal(resultado, esperado, check_names=False)
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+def test_contar_linhas_igual_ao_cubo(linhas, filtros):
+    # O caminho fora do cubo conta as linhas selecionadas e devolve o mesmo formato.
+    cubo = construir_cubo(linhas, ['evolucaoCaso'])
+    selecionadas = np.flatnonzero(linhas.index.isin(selecionar(linhas, filtros).index)) if filtros else None
+    resultado = contar_linhas(linhas[['evolucaoCaso']], selecionadas, 'evolucaoCaso')
+    pd.testing.assert_series_equal(resultado, consultar_cubo(cubo, 'evolucaoCaso', filtros), check_names=False)
+
+
+def test_ausentes_nos_filtros_entram_nos_totais(linhas):
+    # Notificações sem raça ou sexo ficam em células próprias: sem filtro, o total é o de todas as linhas.
+    cubo = construir_cubo(linhas, ['evolucaoCaso'])
+    assert consultar_cubo(cubo, 'evolucaoCaso').sum() == linhas['evolucaoCaso'].notna().sum()
+
+
+def test_completo_devolve_todas_as_categorias(linhas):
+    # Como a pirâmide: todas as faixas, mesmo sem casos, e só os sexos observados.
+    df = linhas.assign(faixa_etaria=linhas['faixa_etaria'].astype('category'))
+    filtros = {'ano': [2019], 'racaCor': ['Indígena']}
+    selecionadas = selecionar(df, filtros).dropna(subset=['faixa_etaria', 'sexo'])
+    cubo = construir_cubo(df, ['faixa_etaria'])
+    resultado = consultar_cubo(cubo, ['faixa_etaria', 'sexo'], filtros, completo=['faixa_etaria'])
+    assert list(resultado.index.unique('faixa_etaria')) == list(df['faixa_etaria'].cat.categories)
+    assert set(resultado.index.unique('sexo')) == set(selecionadas['sexo'])
+    assert resultado.sum() == len(selecionadas)
+
+
+def test_importar_o_preprocessamento_nao_muda_as_opcoes_do_pandas():
+    # O copy-on-write é ligado só nos pontos de entrada, não como efeito colateral de import.
+    codigo = "import pandas as pd, preprocessamento; assert not pd.get_option('mode.copy_on_write')"
+    subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, check=True)
+
+
+def test_projecoes_compartilham_os_buffers_da_tabela():
+    dados = preprocessar_dados(tabela_sintetica(500), IMPRESSAO)
+    for coluna in ['evolucaoCaso', 'racaCor', 'sexo']:
+        assert np.shares_memory(dados['df_evolucao'][coluna].array.codes, dados['tabela'][coluna].array.codes)
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import atualizacao
+from atualizacao import MonitorAtualizacoes, aplicar_delta, versao_base, versao_dados
+from conftest import IMPRESSAO, comparar, notificacoes, tabela_sintetica
+from consulta import compilar_consulta
+from ingestao import carregar_notificacoes, limpar_notificacoes
+from preprocessamento import atualizar_dados, preprocessar_dados
+from sankey import ESTAGIOS_PADRAO, ROTULO_OUTROS
+from semanas import COLUNAS_SERIES
+from termos import AGRUPAMENTOS_TERMOS
+from utils import concatenar_tabelas
+
+# Valores que só aparecem no delta: ampliam as categorias de cada estrutura.
+NOVOS_VALORES = {
+    'racaCor': 'Nova',
+    'sexo': 'Outro',
+    'sintomas': 'Febre, Novo Sintoma',
+    'classificacaoFinal': 'Novo Caso',
+    'evolucaoCaso': 'Transferido',
+    'condicoes': 'Nova Condição',
+    'municipioNotificacao': 'Município Novo',
+    'municipioIBGE': '2699999',
+}
+# Filtros só no cubo, fora dele (faixa, classificação, município) e com as categorias do delta.
+FILTROS = [
+    {},
+    {'ano': 2022},
+    {'ano': 2024, 'raca': 'Parda'},
+    {'raca': 'Indígena', 'sexo': 'Masculino'},
+    {'ano': 2024, 'raca': 'Nova', 'sexo': 'Outro'},
+    {'faixa': ['0 a 4', '55+']},
+    {'classificacao': 'Novo Caso', 'ano': [2023, 2024]},
+    {'municipio': ['2699999', '2600010']},
+]
+CONSULTAS = [compilar_consulta(**filtros) for filtros in FILTROS]
+CUBOS = [
+    ('piramide', ['faixa_etaria', 'sexo']),
+    ('sankey', ['sintomas', 'classificacaoFinal', 'evolucaoCaso']),
+    ('mapa', 'municipioIBGE'),
+    ('classificacao', ['sintomas', 'classificacaoFinal']),
+    ('evolucao', 'evolucaoCaso'),
+    ('condicoes', 'condicoes'),
+]
+
+
+@pytest.fixture(scope='module')
+def versoes():
+    # A base sem 2024, que chega só no delta junto com as categorias novas: o incremental precisa
+    # ampliar os eixos de anos e categorias. Devolve (incremental, reconstrução completa).
+    base = tabela_sintetica(3000)
+    base = base[base['ano'].ne(2024).fillna(True).to_numpy(dtype=bool)].reset_index(drop=True)
+    for coluna in base.select_dtypes('category'):
+        base[coluna] = base[coluna].cat.remove_unused_categories()
+
+    delta = tabela_sintetica(1000, semente=1)
+    for coluna, valor in NOVOS_VALORES.items():
+        delta[coluna] = delta[coluna].cat.add_categories([valor])
+        delta.loc[delta.index[::7], coluna] = valor
+
+    incremental = atualizar_dados(preprocessar_dados(base, IMPRESSAO), delta, 'teste-delta')
+    completo = preprocessar_dados(concatenar_tabelas(base, delta), IMPRESSAO)
+    return incremental, completo
+
+
+def fluxos_por_rotulo(dados, consulta, rotulos):
+    # O incremental mantém os nós da versão anterior: categorias novas contam em "Outros", e na
+    # reconstrução os rótulos fora de `rotulos` são levados para lá também. Os sintomas passam do
+    # limite de categorias, e cada versão escolhe os seus mantidos; essa etapa é somada.
+    tensor = dados['sankey']
+    fluxos = []
+    for origem, destino, matriz in zip(ESTAGIOS_PADRAO, ESTAGIOS_PADRAO[1:], tensor.fluxos(dados, consulta, ESTAGIOS_PADRAO)):
+        indice, colunas = ([rotulo if rotulo in rotulos[estagio] else ROTULO_OUTROS for rotulo in tensor.rotulos[estagio]] for estagio in (origem, destino))
+        fluxo = pd.DataFrame(matriz, index=indice, columns=colunas).groupby(level=0).sum().T.groupby(level=0).sum().T
+        fluxos.append(fluxo.sum(axis=0) if origem == 'sintomas' else fluxo.stack())
+    return fluxos
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS, ids=lambda consulta: consulta.descricao() or 'sem filtros')
+@pytest.mark.parametrize('nome, por', CUBOS)
+def test_cubos_iguais_a_reconstrucao(versoes, nome, por, consulta):
+    # atualizar_dados com um delta deve responder como preprocessar_dados sobre a tabela inteira,
+    # pelo cubo ou, nos filtros fora dele, pelo índice e pelas projeções.
+    incremental, completo = (consulta.contar(dados, nome, por) for dados in versoes)
+    comparar(incremental, completo)
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS, ids=lambda consulta: consulta.descricao() or 'sem filtros')
+def test_termos_iguais_a_reconstrucao(versoes, consulta):
+    # A incidência e as contagens por célula somadas só com o delta, termos novos incluídos.
+    for coluna, por in AGRUPAMENTOS_TERMOS.items():
+        pd.testing.assert_series_equal(*(consulta.contar_termos(dados, coluna, por) for dados in versoes))
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS, ids=lambda consulta: consulta.descricao() or 'sem filtros')
+@pytest.mark.parametrize('nome', COLUNAS_SERIES)
+def test_series_iguais_a_reconstrucao(versoes, consulta, nome):
+    # 2024 só chega no delta: o calendário cresce no fim, junto com os grupos novos.
+    incremental, completo = (dados['series'].casos(dados, consulta, nome, media_movel=3) for dados in versoes)
+    for chave in ('casos', 'media'):
+        pd.testing.assert_frame_equal(incremental[chave].sort_index(axis=1), completo[chave].sort_index(axis=1))
+    comparar(incremental['totais'], completo['totais'])
+    assert incremental['rotulos'] == completo['rotulos']
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS, ids=lambda consulta: consulta.descricao() or 'sem filtros')
+def test_sankey_igual_a_reconstrucao(versoes, consulta):
+    rotulos = versoes[0]['sankey'].rotulos
+    for incremental, completo in zip(*(fluxos_por_rotulo(dados, consulta, rotulos) for dados in versoes)):
+        comparar(incremental, completo)
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS, ids=lambda consulta: consulta.descricao() or 'sem filtros')
+def test_piramide_igual_a_reconstrucao(versoes, consulta):
+    np.testing.assert_array_equal(*(dados['piramide'].contar(dados, consulta) for dados in versoes))
+
+
+def test_delta_registrado_uma_vez_e_sem_linhas_repetidas(tmp_path):
+    csv, cache = str(tmp_path / 'notificacoes.csv'), str(tmp_path / 'cache')
+    base = notificacoes(500)
+    base.to_csv(csv, sep=';', index=False)
+    _, impressao = carregar_notificacoes(csv, cache, tamanho_bloco=0)
+
+    # O delta repete 100 notificações da base, que não devem entrar de novo.
+    novas = notificacoes(200, semente=1)
+    caminho_delta = str(tmp_path / 'delta.csv')
+    pd.concat([base.iloc[:100], novas]).to_csv(caminho_delta, sep=';', index=False)
+    registro = aplicar_delta(caminho_delta, csv, cache, tamanho_bloco=0)
+    assert [delta['linhas'] for delta in registro['deltas']] == [len(limpar_notificacoes(novas))]
+    assert aplicar_delta(caminho_delta, csv, cache, tamanho_bloco=0) == registro
+
+    recebidos = []
+    monitor = MonitorAtualizacoes(impressao, lambda df_novo, versao: recebidos.append((df_novo, versao)), csv, cache)
+    assert monitor.verificar()
+    assert len(recebidos) == 1 and len(recebidos[0][0]) == registro['deltas'][0]['linhas']
+    assert recebidos[0][1].startswith(versao_dados(impressao) + '+')
+    assert not monitor.verificar()
+
+
+@pytest.mark.parametrize('parametro, valor', [('LIMITE_CATEGORIAS_SANKEY', 3), ('LIMITES_FAIXAS_PIRAMIDE', [0, 20, 60])])
+def test_versao_muda_com_os_parametros(monkeypatch, parametro, valor):
+    # Outro limite de nós do Sankey ou outras faixas da pirâmide montam outras estruturas sobre o mesmo CSV.
+    versao = versao_dados(IMPRESSAO)
+    assert versao.startswith(versao_base(IMPRESSAO) + '-')
+    monkeypatch.setattr(atualizacao, parametro, valor)
+    assert versao_dados(IMPRESSAO) != versao
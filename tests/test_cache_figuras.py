@@ -0,0 +1,68 @@
+import json
+
+from cache_figuras import CacheFiguras
+
+
+def figura(*filtros):
+    return {'data': [{'type': 'bar', 'y': [1, 2, 3]}], 'layout': {'title': {'text': str(filtros)}}}
+
+
+def tamanho(*filtros):
+    return len(json.dumps(figura(*filtros), separators=(',', ':')).encode('utf-8'))
+
+
+def contar_chamadas(cache):
+    chamadas = []
+
+    @cache.em_cache
+    def criar_graficos(consulta):
+        chamadas.append(consulta.filtros)
+        return figura(consulta.chave)
+    return criar_graficos, chamadas
+
+
+def test_acerto_nao_reconstroi_e_normaliza_os_filtros():
+    cache = CacheFiguras(2**20)
+    criar_graficos, chamadas = contar_chamadas(cache)
+
+    primeira = criar_graficos('2022', '', None)
+    assert criar_graficos(2022, None, []) == primeira == figura((('ano', (2022,)),))
+    assert criar_graficos([2022, 2022], [None], '') == primeira
+    assert chamadas == [{'ano': [2022]}]
+    assert cache.estatisticas()['acertos'] == 2 and cache.estatisticas()['falhas'] == 1
+
+
+def test_versao_nova_nao_reaproveita_figuras():
+    versao = ['a']
+    cache = CacheFiguras(2**20, versao=lambda: versao[0])
+    criar_graficos, chamadas = contar_chamadas(cache)
+
+    criar_graficos(2022, 'Parda', None)
+    versao[0] = 'b'
+    criar_graficos(2022, 'Parda', None)
+    assert len(chamadas) == 2
+
+
+def test_remove_o_menos_usado_ao_passar_do_limite():
+    cache = CacheFiguras(2 * tamanho((('ano', (2020,)),)) + 10)
+    criar_graficos, chamadas = contar_chamadas(cache)
+
+    criar_graficos(2020, None, None)
+    criar_graficos(2021, None, None)
+    criar_graficos(2020, None, None)
+    criar_graficos(2022, None, None)
+    assert cache.estatisticas()['itens'] == 2
+    assert cache.bytes_usados <= cache.limite_bytes
+
+    del chamadas[:]
+    criar_graficos(2020, None, None)
+    criar_graficos(2021, None, None)
+    assert chamadas == [{'ano': [2021]}]
+
+
+def test_figura_maior_que_o_limite_nao_e_guardada():
+    cache = CacheFiguras(10)
+    criar_graficos, chamadas = contar_chamadas(cache)
+
+    assert criar_graficos(None, None, None) == figura(())
+    assert cache.estatisticas()['itens'] == 0 and cache.bytes_usados == 0
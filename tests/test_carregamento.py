@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+from flask import Flask
+
+from carregamento import Carregamento, registrar_rotas_saude
+
+
+def servidor(carregamento):
+    server = Flask(__name__)
+    registrar_rotas_saude(server, carregamento)
+    return server.test_client()
+
+
+def test_readyz_acompanha_a_carga():
+    carregamento = Carregamento(versao=lambda: 'v1')
+    cliente = servidor(carregamento)
+    em_curso, liberar = threading.Event(), threading.Event()
+
+    def carregar():
+        with carregamento.etapa('ingestao'):
+            em_curso.set()
+            liberar.wait(5)
+
+    carregamento.iniciar(carregar)
+    assert em_curso.wait(5)
+    resposta = cliente.get('/readyz')
+    assert resposta.status_code == 503 and resposta.get_json() == {'status': 'carregando', 'etapa': 'ingestao'}
+    assert cliente.get('/healthz').status_code == 200
+
+    liberar.set()
+    carregamento.esperar(5)
+    resposta = cliente.get('/readyz')
+    assert resposta.status_code == 200
+    assert resposta.get_json()['status'] == 'pronto' and resposta.get_json()['versao'] == 'v1'
+
+
+def test_falha_na_carga_derruba_o_healthz():
+    carregamento = Carregamento()
+    cliente = servidor(carregamento)
+
+    def carregar():
+        with carregamento.etapa('preprocessamento'):
+            raise ValueError('coluna ausente')
+
+    carregamento.iniciar(carregar)
+    with pytest.raises(RuntimeError, match='coluna ausente'):
+        carregamento.esperar(5)
+    resposta = cliente.get('/healthz')
+    assert resposta.status_code == 500 and resposta.get_json()['erro'] == 'ValueError: coluna ausente'
+    resposta = cliente.get('/readyz')
+    assert resposta.status_code == 503 and resposta.get_json()['etapa'] == 'preprocessamento'
+
+
+def test_esperar_sem_terminar_acusa_o_tempo():
+    carregamento = Carregamento()
+    liberar = threading.Event()
+    carregamento.iniciar(lambda: liberar.wait(5))
+    with pytest.raises(TimeoutError):
+        carregamento.esperar(0.05)
+    liberar.set()
+    carregamento.esperar(5)
+    assert carregamento.pronto()
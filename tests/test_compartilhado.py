@@ -0,0 +1,143 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import atualizacao
+import compartilhado
+from compartilhado import fcntl
+from compartilhado import anexar_dados, carregar_dados_compartilhados, gravar_dados, obter_versao
+from conftest import IMPRESSAO, notificacoes, tabela_sintetica
+from preprocessamento import preprocessar_dados
+
+
+@pytest.fixture(scope='module')
+def dados():
+    return preprocessar_dados(tabela_sintetica(2000), IMPRESSAO)
+
+
+def test_versao_anexada_igual_a_original(dados, tmp_path):
+    gravar_dados(dados, str(tmp_path / 'versao'))
+    anexados = anexar_dados(str(tmp_path / 'versao'))
+
+    assert anexados['versao'] == dados['versao']
+    assert anexados['tabela'].equals(dados['tabela'])
+    for nome, cubo in dados['cubos'].items():
+        assert anexados['cubos'][nome].equals(cubo)
+    for filtros in [{'ano': 2022}, {'racaCor': ['Parda', 'Preta'], 'sexo': 'Feminino'}]:
+        np.testing.assert_array_equal(anexados['indice'].selecionar(filtros), dados['indice'].selecionar(filtros))
+    for coluna, incidencia in dados['termos'].items():
+        assert (anexados['termos'][coluna].matriz != incidencia.matriz).nnz == 0
+        np.testing.assert_array_equal(anexados['termos_celulas'].contagens[coluna], dados['termos_celulas'].contagens[coluna])
+    for nome, lista in dados['series'].contagens.items():
+        for anexadas, contagens in zip(anexados['series'].contagens[nome], lista):
+            np.testing.assert_array_equal(anexadas.acumulado, contagens.acumulado)
+    for par, matriz in dados['sankey'].pares.items():
+        assert (anexados['sankey'].pares[par] != matriz).nnz == 0
+    assert anexados['sankey'].rotulos == dados['sankey'].rotulos
+    np.testing.assert_array_equal(anexados['piramide'].contagens, dados['piramide'].contagens)
+    np.testing.assert_array_equal(anexados['piramide'].anos, dados['piramide'].anos)
+    for codigos in [['2600000'], ['2600010', '2600180', '9999999']]:
+        np.testing.assert_array_equal(anexados['municipios'].linhas(codigos), dados['municipios'].linhas(codigos))
+
+    # As colunas apontam para os arquivos mapeados, sem cópia em memória própria.
+    base = anexados['tabela']['racaCor'].cat.codes.to_numpy()
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert base is not None
+
+
+def test_versao_construida_uma_vez(dados, tmp_path):
+    construcoes = []
+
+    def construir():
+        construcoes.append(1)
+        return dados
+
+    primeiro = obter_versao('teste+delta', construir, str(tmp_path))
+    segundo = obter_versao('teste+delta', construir, str(tmp_path))
+    assert len(construcoes) == 1
+    assert primeiro['tabela'].equals(segundo['tabela'])
+
+
+def test_workers_seguintes_anexam_sem_ler_o_csv(tmp_path, monkeypatch):
+    csv, cache = str(tmp_path / 'notificacoes.csv'), str(tmp_path / 'cache')
+    notificacoes(500).to_csv(csv, sep=';', index=False)
+    publicados, impressao = carregar_dados_compartilhados(csv, cache)
+
+    def carregar_notificacoes(*args, **kwargs):
+        raise AssertionError('o CSV não deveria ser lido de novo')
+    monkeypatch.setattr(compartilhado, 'carregar_notificacoes', carregar_notificacoes)
+    anexados, impressao_anexada = carregar_dados_compartilhados(csv, cache)
+    assert impressao_anexada == impressao
+    assert anexados['versao'] == publicados['versao']
+    assert anexados['tabela'].equals(publicados['tabela'])
+
+
+def test_versao_removida_e_publicada_de_novo(tmp_path):
+    csv, cache = str(tmp_path / 'notificacoes.csv'), str(tmp_path / 'cache')
+    notificacoes(500).to_csv(csv, sep=';', index=False)
+    publicados, _ = carregar_dados_compartilhados(csv, cache)
+
+    # atual.json continua apontando para a versão, mas a pasta sumiu: o construtor a publica de novo.
+    shutil.rmtree(os.path.join(compartilhado.raiz_compartilhada(cache), publicados['versao']))
+    anexados, _ = carregar_dados_compartilhados(csv, cache)
+    assert anexados['versao'] == publicados['versao']
+    assert anexados['tabela'].equals(publicados['tabela'])
+
+
+def test_parametros_novos_publicam_outra_versao(tmp_path, monkeypatch):
+    csv, cache = str(tmp_path / 'notificacoes.csv'), str(tmp_path / 'cache')
+    notificacoes(500).to_csv(csv, sep=';', index=False)
+    publicados, _ = carregar_dados_compartilhados(csv, cache)
+
+    # Mesmo CSV, outro limite de nós do Sankey: a versão publicada não serve mais.
+    monkeypatch.setattr(atualizacao, 'LIMITE_CATEGORIAS_SANKEY', 3)
+    novos, _ = carregar_dados_compartilhados(csv, cache)
+    assert novos['versao'] != publicados['versao']
+    assert compartilhado.ler_metadados(os.path.join(compartilhado.raiz_compartilhada(cache), 'atual.json'))['versao'] == novos['versao']
+
+
+def travar(caminho, modo):
+    arquivo = open(caminho, 'a')
+    fcntl.flock(arquivo, modo)
+    return arquivo
+
+
+@pytest.mark.skipif(compartilhado.fcntl is None, reason='sem fcntl')
+def test_limpeza_pula_as_pastas_em_uso(tmp_path):
+    csv, cache = str(tmp_path / 'notificacoes.csv'), str(tmp_path / 'cache')
+    raiz = compartilhado.raiz_compartilhada(cache)
+    notificacoes(500).to_csv(csv, sep=';', index=False)
+    anexada, _ = carregar_dados_compartilhados(csv, cache)
+
+    # Uma versão livre do formato atual e as pastas de formatos antigos: uma livre, uma anexada
+    # por um worker antigo e uma com publicação em curso.
+    os.makedirs(os.path.join(raiz, 'outra-base'))
+    for pasta in ['compartilhado/v1', 'compartilhado-v2/livre', 'compartilhado-v2/anexada']:
+        os.makedirs(os.path.join(cache, pasta))
+    worker_antigo = travar(os.path.join(cache, 'compartilhado-v2', 'anexada', '.em_uso'), fcntl.LOCK_SH)
+
+    notificacoes(400, semente=1).to_csv(csv, sep=';', index=False)
+    nova, _ = carregar_dados_compartilhados(csv, cache)
+    assert sorted(os.listdir(cache)) == ['compartilhado-v2', os.path.basename(raiz), 'notificacoes.parquet', 'notificacoes.parquet.json']
+    assert [pasta for pasta in os.listdir(os.path.join(cache, 'compartilhado-v2')) if not pasta.startswith('.')] == ['anexada']
+    # A versão anterior segue anexada por este processo.
+    assert {pasta for pasta in os.listdir(raiz) if not pasta.startswith('.')} >= {anexada['versao'], nova['versao']}
+    assert 'outra-base' not in os.listdir(raiz)
+
+    worker_antigo.close()
+    publicacao_antiga = travar(os.path.join(cache, 'compartilhado-v2', '.trava'), fcntl.LOCK_EX)
+    compartilhado.remover_formatos_antigos(cache)
+    assert os.path.isdir(os.path.join(cache, 'compartilhado-v2', 'anexada'))
+    publicacao_antiga.close()
+
+    # Soltas as travas, a próxima publicação remove as duas pastas.
+    compartilhado._em_uso.pop(os.path.join(raiz, anexada['versao'])).close()
+    notificacoes(300, semente=2).to_csv(csv, sep=';', index=False)
+    carregar_dados_compartilhados(csv, cache)
+    assert not os.path.exists(os.path.join(cache, 'compartilhado-v2'))
+    assert anexada['versao'] not in os.listdir(raiz)
+    assert nova['versao'] in os.listdir(raiz)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from conftest import IMPRESSAO, comparar, tabela_sintetica
+from consulta import compilar_consulta
+from preprocessamento import preprocessar_dados
+
+# Filtros da barra lateral: só no cubo, fora dele (faixa, classificação, município) e sem nenhuma linha.
+FILTROS = [
+    {},
+    {'ano': 2022},
+    {'ano': [2021, 2023], 'raca': ['Parda', 'Branca']},
+    {'raca': 'Indígena', 'sexo': 'Masculino'},
+    {'faixa': ['0 a 4', '55+']},
+    {'classificacao': 'Descartado', 'ano': 2022},
+    {'municipio': ['2600000', '2600010']},
+    {'municipio': ['2601310', '2600180'], 'ano': 2022, 'faixa': ['0 a 4', '55+']},
+    {'ano': 2019},
+]
+CONSULTAS = [compilar_consulta(**filtros) for filtros in FILTROS]
+CONTAGENS = [
+    ('piramide', ['faixa_etaria', 'sexo']),
+    ('mapa', 'municipioIBGE'),
+    ('evolucao', 'evolucaoCaso'),
+    ('sankey', ['sintomas', 'classificacaoFinal', 'evolucaoCaso']),
+]
+
+
+@pytest.fixture(scope='module')
+def dados():
+    return preprocessar_dados(tabela_sintetica(3000), IMPRESSAO)
+
+
+def mascara(tabela, consulta):
+    # Referência direta: as linhas da tabela que passam em todos os filtros da consulta.
+    selecionadas = np.ones(len(tabela), dtype=bool)
+    for coluna, valores in consulta.filtros.items():
+        selecionadas &= tabela[coluna].isin(valores).fillna(False).to_numpy(dtype=bool)
+    return selecionadas
+
+
+def test_estados_equivalentes_compilam_para_a_mesma_consulta():
+    assert compilar_consulta('2022', '', None) == compilar_consulta(2022, [None], [])
+    assert compilar_consulta(raca=['Parda', 'Branca']) == compilar_consulta(raca=['Branca', 'Parda', 'Parda'])
+    assert compilar_consulta([2021, 2023]).filtros == {'ano': [2021, 2022, 2023]}
+    # O intervalo que cobre todos os anos é o mesmo que não filtrar.
+    assert compilar_consulta([2020, 2024], anos_disponiveis=[2020, 2022, 2024]) == compilar_consulta()
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS[1:], ids=lambda consulta: consulta.descricao())
+def test_linhas_selecionadas_em_ordem(dados, consulta):
+    # Pelos bitmaps ou pelas partições por município, as mesmas linhas em ordem crescente.
+    np.testing.assert_array_equal(consulta.linhas(dados), np.flatnonzero(mascara(dados['tabela'], consulta)))
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS, ids=lambda consulta: consulta.descricao() or 'sem filtros')
+@pytest.mark.parametrize('nome, por', CONTAGENS)
+def test_contagens_iguais_ao_groupby_das_linhas(dados, consulta, nome, por):
+    projecao = dados[f'df_{nome}']
+    esperado = projecao[mascara(dados['tabela'], consulta)].groupby(por, observed=True).size()
+    comparar(consulta.contar(dados, nome, por), esperado)
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS, ids=lambda consulta: consulta.descricao() or 'sem filtros')
+def test_termos_iguais_a_contagem_das_linhas(dados, consulta):
+    selecionadas = dados['tabela'][mascara(dados['tabela'], consulta)]
+    for coluna, por in [('sintomas', 'classificacaoFinal'), ('condicoes', None)]:
+        termos = selecionadas[coluna].astype(object).str.split(',').explode().str.strip()
+        termos = termos[termos.notna() & (termos != '')].rename(coluna)
+        chaves = [termos] if por is None else [termos, selecionadas[por].astype(object).reindex(termos.index)]
+        esperado = termos.to_frame().groupby(chaves, dropna=True).size()
+        comparar(consulta.contar_termos(dados, coluna, por), esperado)
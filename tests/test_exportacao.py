@@ -0,0 +1,125 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from flask import Flask
+
+from conftest import IMPRESSAO, tabela_sintetica
+from consulta import compilar_consulta
+from exportacao import COLUNAS_EXPORTACAO, csv_em_lotes, lotes_notificacoes, parquet_em_lotes, registrar_rotas_exportacao
+from preprocessamento import preprocessar_dados
+
+
+class Pronto:
+    def __init__(self, pronto=True):
+        self._pronto = pronto
+
+    def pronto(self):
+        return self._pronto
+
+
+@pytest.fixture(scope='module')
+def dados():
+    return preprocessar_dados(tabela_sintetica(3000), IMPRESSAO)
+
+
+@pytest.fixture(scope='module')
+def cliente(dados):
+    malha = {'codigos': ['2601310', '2600180', '2600000'], 'nomes': ['A', 'B', 'C']}
+    server = Flask(__name__)
+    registrar_rotas_exportacao(server, Pronto(), lambda: (dados, malha), compilar_consulta)
+    return server.test_client()
+
+
+def selecionadas(dados, consulta):
+    linhas = consulta.linhas(dados)
+    tabela = dados['tabela'][list(COLUNAS_EXPORTACAO.values())].set_axis(list(COLUNAS_EXPORTACAO), axis=1)
+    return tabela if linhas is None else tabela.take(linhas)
+
+
+@pytest.mark.parametrize('filtros', [{}, {'ano': 2022, 'raca': ['Parda', 'Branca']}, {'faixa': '55+', 'municipio': '2601310'}, {'ano': 2019}])
+def test_lotes_cobrem_a_selecao_em_ordem(dados, filtros):
+    consulta = compilar_consulta(**filtros)
+    esperado = selecionadas(dados, consulta)
+    lotes = list(lotes_notificacoes(dados, consulta, tamanho_lote=100))
+    assert len(lotes) == max(-(-len(esperado) // 100), 1)
+    assert all(len(lote) <= 100 for lote in lotes)
+    pd.testing.assert_frame_equal(pd.concat(lotes), esperado)
+
+
+def test_csv_so_o_primeiro_lote_tem_cabecalho(dados):
+    lotes = list(lotes_notificacoes(dados, compilar_consulta(ano=2022), tamanho_lote=200))
+    partes = list(csv_em_lotes(lotes))
+    assert len(partes) == len(lotes) > 1
+    assert partes[0].startswith(b'"dataNotificacao"') and not partes[1].startswith(b'"dataNotificacao"')
+    lido = pd.read_csv(io.BytesIO(b''.join(partes)))
+    assert len(lido) == sum(len(lote) for lote in lotes)
+
+
+def test_parquet_um_row_group_por_lote(dados):
+    lotes = list(lotes_notificacoes(dados, compilar_consulta(ano=2022), tamanho_lote=200))
+    partes = list(parquet_em_lotes(lotes))
+    # Cada lote sai assim que escrito; o rodapé vem na última parte.
+    assert len(partes) == len(lotes) + 1 and all(partes[:-1])
+    arquivo = pq.ParquetFile(io.BytesIO(b''.join(partes)))
+    assert arquivo.metadata.num_row_groups == len(lotes)
+    lido = arquivo.read().to_pandas()
+    esperado = pd.concat(lotes, ignore_index=True)
+    assert lido['municipioIBGE'].astype(str).tolist() == esperado['municipioIBGE'].astype(str).tolist()
+    np.testing.assert_array_equal(lido['ano'].to_numpy(), esperado['ano'].to_numpy())
+
+
+@pytest.mark.parametrize('formato', ['csv', 'parquet'])
+def test_rota_de_notificacoes_aplica_os_filtros_da_url(dados, cliente, formato):
+    resposta = cliente.get(f'/exportar/notificacoes.{formato}?ano=2021&ano=2023&raca=Parda&raca=Branca&sexo=Feminino')
+    assert resposta.status_code == 200 and resposta.is_streamed
+    assert resposta.headers['X-Versao-Dados'] == dados['versao']
+    assert resposta.headers['Content-Disposition'] == f'attachment; filename="notificacoes.{formato}"'
+    lido = pd.read_csv(io.BytesIO(resposta.data)) if formato == 'csv' else pd.read_parquet(io.BytesIO(resposta.data))
+    esperado = selecionadas(dados, compilar_consulta(ano=[2021, 2023], raca=['Parda', 'Branca'], sexo='Feminino'))
+    assert len(lido) == len(esperado) > 0
+    assert list(lido.columns) == list(COLUNAS_EXPORTACAO)
+    assert set(lido['racaCor']) == {'Parda', 'Branca'} and set(lido['ano']) <= {2021, 2022, 2023}
+
+
+def test_selecao_vazia_ainda_tem_cabecalho(cliente):
+    resposta = cliente.get('/exportar/notificacoes.csv?ano=2019')
+    assert pd.read_csv(io.BytesIO(resposta.data)).columns.tolist() == list(COLUNAS_EXPORTACAO)
+
+
+def test_agregados_iguais_as_consultas_dos_graficos(dados, cliente):
+    consulta = compilar_consulta(ano=2022, faixa='55+')
+    lido = pd.read_csv(io.BytesIO(cliente.get('/exportar/agregados/evolucao.csv?ano=2022&faixa=55%2B').data))
+    assert lido.set_index('evolucaoCaso')['contagem'].to_dict() == consulta.contar(dados, 'evolucao', 'evolucaoCaso').to_dict()
+
+    lido = pd.read_csv(io.BytesIO(cliente.get('/exportar/agregados/condicoes.csv?ano=2022&faixa=55%2B').data))
+    assert lido.set_index('condicoes')['contagem'].to_dict() == consulta.contar_termos(dados, 'condicoes').to_dict()
+
+    lido = pd.read_parquet(io.BytesIO(cliente.get('/exportar/agregados/sankey.parquet?estagio=sexo&estagio=racaCor').data))
+    assert set(lido['etapa_origem']) == {'sexo'} and lido['contagem'].sum() == len(dados['tabela'])
+
+    # A comparação empilha uma pirâmide por ano, cada uma com o por_mil da própria seleção.
+    lido = pd.read_csv(io.BytesIO(cliente.get('/exportar/agregados/piramide.csv?faixa=55%2B&comparar=ano&valor=2021&valor=2023').data))
+    for ano, matriz in zip([2021, 2023], dados['piramide'].comparar(dados, consulta.sem('ano'), 'ano', [2021, 2023])):
+        parte = lido[lido['ano'] == ano]
+        assert parte['contagem'].sum() == matriz.sum()
+        assert parte['por_mil'].sum() == pytest.approx(1000)
+
+
+@pytest.mark.parametrize('caminho, status', [
+    ('/exportar/notificacoes.xlsx', 404),
+    ('/exportar/agregados/tabela.csv', 404),
+    ('/exportar/agregados/serie.csv?agrupamento=idade', 400),
+    ('/exportar/agregados/piramide.csv?comparar=municipio&valor=2601310', 400),
+    ('/exportar/notificacoes.csv?ano=dois', 400),
+])
+def test_pedidos_invalidos(cliente, caminho, status):
+    assert cliente.get(caminho).status_code == status
+
+
+def test_indisponivel_antes_dos_dados(dados):
+    server = Flask(__name__)
+    registrar_rotas_exportacao(server, Pronto(False), lambda: (dados, None), compilar_consulta)
+    assert server.test_client().get('/exportar/notificacoes.csv').status_code == 503
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from conftest import notificacoes
+from indice import IndiceBitmap
+from ingestao import limpar_notificacoes
+
+
+FILTROS = [
+    {'ano': 2022},
+    {'ano': [2021, 2023], 'racaCor': ['Parda', 'Branca']},
+    {'racaCor': 'Indígena', 'sexo': 'Masculino'},
+    {'ano': 2022, 'racaCor': 'Nenhuma'},
+    {'ano': None, 'racaCor': [], 'sexo': 'Feminino'},
+    {'municipioIBGE': ['2611606', '2609600'], 'ano': 2020},
+]
+
+
+@pytest.fixture(scope='module')
+def tabela():
+    return limpar_notificacoes(notificacoes(1003))
+
+
+@pytest.fixture(scope='module')
+def indice(tabela):
+    indice = IndiceBitmap(tabela, ['ano', 'racaCor', 'sexo'])
+    indice.adicionar_coluna(tabela['municipioIBGE'].astype(object))
+    return indice
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+def test_selecao_igual_as_mascaras(tabela, indice, filtros):
+    mascara = np.ones(len(tabela), dtype=bool)
+    for coluna, valor in filtros.items():
+        if valor:
+            valores = valor if isinstance(valor, list) else [valor]
+            mascara &= tabela[coluna].isin(valores).fillna(False).to_numpy(dtype=bool)
+    np.testing.assert_array_equal(indice.selecionar(filtros), np.flatnonzero(mascara))
+
+
+def test_sem_filtros_nao_seleciona(indice):
+    assert indice.selecionar({}) is None
+    assert indice.selecionar({'ano': None, 'sexo': []}) is None
@@ -0,0 +1,112 @@
+import os
+
+import pandas as pd
+import pytest
+
+import ingestao
+from conftest import notificacoes
+from ingestao import carregar_notificacoes
+
+
+@pytest.fixture
+def csv(tmp_path):
+    caminho = tmp_path / 'notificacoes.csv'
+    notificacoes(500).to_csv(caminho, sep=';', index=False)
+    return str(caminho)
+
+
+def proibir_csv(monkeypatch):
+    def read_csv(*args, **kwargs):
+        raise AssertionError('o CSV não deveria ser lido de novo')
+    monkeypatch.setattr(pd, 'read_csv', read_csv)
+
+
+def test_segunda_carga_le_o_parquet(csv, tmp_path, monkeypatch):
+    cache = str(tmp_path / 'cache')
+    df, impressao = carregar_notificacoes(csv, cache)
+    assert os.path.exists(os.path.join(cache, 'notificacoes.parquet'))
+
+    proibir_csv(monkeypatch)
+    do_cache, impressao_cache = carregar_notificacoes(csv, cache)
+    assert impressao_cache == impressao
+    # O Parquet devolve None onde o CSV deu NaN; o texto serializado trata os dois como vazio.
+    assert do_cache.to_csv() == df.to_csv()
+
+
+def test_csv_alterado_invalida_o_cache(csv, tmp_path):
+    cache = str(tmp_path / 'cache')
+    df, impressao = carregar_notificacoes(csv, cache)
+
+    notificacoes(300, semente=1).to_csv(csv, sep=';', index=False)
+    novo, nova_impressao = carregar_notificacoes(csv, cache)
+    assert nova_impressao['hash'] != impressao['hash']
+    assert len(novo) != len(df)
+
+
+def test_versao_do_esquema_invalida_o_cache(csv, tmp_path, monkeypatch):
+    cache = str(tmp_path / 'cache')
+    carregar_notificacoes(csv, cache)
+
+    monkeypatch.setattr(ingestao, 'VERSAO_ESQUEMA', ingestao.VERSAO_ESQUEMA + 1)
+    lidos = []
+    read_csv = pd.read_csv
+    monkeypatch.setattr(pd, 'read_csv', lambda *args, **kwargs: lidos.append(args) or read_csv(*args, **kwargs))
+    _, impressao = carregar_notificacoes(csv, cache)
+    assert lidos and impressao['versao_esquema'] == ingestao.VERSAO_ESQUEMA
+
+
+def test_ingestao_em_blocos_igual_a_leitura_inteira(csv, tmp_path, monkeypatch):
+    inteiro, _ = carregar_notificacoes(csv, str(tmp_path / 'inteiro'))
+    em_blocos, _ = carregar_notificacoes(csv, str(tmp_path / 'blocos'), tamanho_bloco=128)
+
+    particoes = tmp_path / 'blocos' / 'notificacoes_particoes'
+    assert sorted(os.listdir(particoes)) == sorted({str(ano) for ano in inteiro['ano'].dropna()} | {'sem_ano'})
+    # As partições saem agrupadas por ano: compara as linhas sem a ordem.
+    assert sorted(map(str, em_blocos.itertuples(index=False))) == sorted(map(str, inteiro[em_blocos.columns].itertuples(index=False)))
+
+    proibir_csv(monkeypatch)
+    do_cache, _ = carregar_notificacoes(csv, str(tmp_path / 'blocos'), tamanho_bloco=128)
+    assert do_cache.to_csv() == em_blocos.to_csv()
+
+
+def contar_hashes(monkeypatch):
+    calculados = []
+    blake2b = ingestao.hashlib.blake2b
+    monkeypatch.setattr(ingestao.hashlib, 'blake2b', lambda *args, **kwargs: calculados.append(1) or blake2b(*args, **kwargs))
+    return calculados
+
+
+def test_hash_so_quando_tamanho_ou_mtime_mudam(csv, tmp_path, monkeypatch):
+    cache = str(tmp_path / 'cache')
+    _, impressao = carregar_notificacoes(csv, cache)
+    calculados = contar_hashes(monkeypatch)
+
+    # Mesmo tamanho e mtime dos metadados: nem o CSV nem o hash são lidos de novo.
+    assert carregar_notificacoes(csv, cache)[1] == impressao
+    assert not calculados
+
+    # Só tocado: o hash é recalculado, é o mesmo, e o cache continua valendo com o mtime novo.
+    os.utime(csv, ns=(impressao['mtime_ns'] + 10**9, impressao['mtime_ns'] + 10**9))
+    proibir_csv(monkeypatch)
+    _, tocado = carregar_notificacoes(csv, cache)
+    assert len(calculados) == 1
+    assert tocado['hash'] == impressao['hash'] and tocado['mtime_ns'] != impressao['mtime_ns']
+    carregar_notificacoes(csv, cache)
+    assert len(calculados) == 1
+
+
+def test_mesmo_tamanho_com_mtime_novo_rele_o_conteudo(csv, tmp_path):
+    cache = str(tmp_path / 'cache')
+    df, impressao = carregar_notificacoes(csv, cache)
+
+    # Troca um dígito sem mudar o tamanho do arquivo: só o mtime denuncia a alteração.
+    with open(csv, 'r+b') as arquivo:
+        conteudo = arquivo.read()
+        posicao = conteudo.index(b'2020-')
+        arquivo.seek(posicao)
+        arquivo.write(b'2021-')
+    os.utime(csv, ns=(impressao['mtime_ns'] + 10**9, impressao['mtime_ns'] + 10**9))
+    novo, nova_impressao = carregar_notificacoes(csv, cache)
+    assert nova_impressao['tamanho'] == impressao['tamanho']
+    assert nova_impressao['hash'] != impressao['hash']
+    assert (novo['ano'] == 2021).sum() == (df['ano'] == 2021).sum() + 1
@@ -0,0 +1,60 @@
+import logging
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+import metricas
+from metricas import Metricas, etapa, instrumentar, registrar_linhas, registrar_rota
+
+
+@pytest.fixture
+def coletadas(monkeypatch):
+    monkeypatch.setattr(metricas, 'METRICAS_ATIVAS', True)
+    coletadas = Metricas()
+    monkeypatch.setattr(metricas, 'metricas', coletadas)
+    return coletadas
+
+
+def grafico_teste():
+    with etapa('consulta'):
+        registrar_linhas(pd.Series([3, 4]))
+    return 'abc'
+
+
+def test_desligadas_nao_envolvem_o_callback(monkeypatch):
+    monkeypatch.setattr(metricas, 'METRICAS_ATIVAS', False)
+    assert instrumentar(grafico_teste) is grafico_teste
+    assert etapa('consulta') is etapa('cache')
+
+
+def test_registra_duracao_etapas_e_linhas(coletadas):
+    instrumentar(grafico_teste)()
+    instrumentar(grafico_teste)()
+
+    assert coletadas.duracoes['grafico_teste'].total == 2
+    assert {etapa for _, etapa in coletadas.etapas} == {'consulta', 'figura'}
+    texto = coletadas.texto_prometheus()
+    assert 'pibic_callback_segundos_bucket{callback="grafico_teste",le="+Inf"} 2' in texto
+    assert 'pibic_callback_etapa_segundos_count{callback="grafico_teste",etapa="consulta"} 2' in texto
+    assert 'pibic_callback_linhas_sum{callback="grafico_teste"} 14' in texto
+
+
+def test_rota_mede_a_resposta_e_expoe_o_texto(coletadas):
+    server = Flask(__name__)
+    server.route('/grafico')(instrumentar(grafico_teste))
+    registrar_rota(server)
+
+    cliente = server.test_client()
+    assert cliente.get('/grafico').data == b'abc'
+    resposta = cliente.get('/metricas')
+    assert resposta.mimetype == 'text/plain'
+    assert 'pibic_callback_resposta_bytes_sum{callback="grafico_teste"} 3' in resposta.get_data(as_text=True)
+
+
+def test_callback_lento_vai_para_o_log(coletadas, caplog):
+    coletadas.limite_lento_ms = 1e-6
+    with caplog.at_level(logging.WARNING, logger='metricas'):
+        instrumentar(grafico_teste)()
+    assert coletadas.lentos['grafico_teste'] == 1
+    assert 'Callback lento: grafico_teste' in caplog.text
@@ -0,0 +1,81 @@
+import base64
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from agregados import construir_cubo
+from conftest import IMPRESSAO, MUNICIPIOS, notificacoes
+from consulta import compilar_consulta
+from ingestao import limpar_notificacoes
+from modo_cliente import codificar_inteiros, compactar_cubo, construir_store
+from preprocessamento import preprocessar_dados
+from sankey import ESTAGIOS_PADRAO
+
+
+def decodificar(vetor):
+    return np.frombuffer(base64.b64decode(vetor['dados']), dtype=f"<{np.dtype(vetor['dtype']).str[1:]}")
+
+
+def descompactar(compacto):
+    # O que o navegador faz: cada código indexa o dicionário da coluna, e -1 é ausente.
+    colunas = {
+        coluna: [None if codigo < 0 else compacto['dicionarios'][coluna][codigo] for codigo in decodificar(codigos)]
+        for coluna, codigos in compacto['codigos'].items()
+    }
+    return pd.DataFrame(colunas, dtype=object).assign(contagem=decodificar(compacto['contagem']))
+
+
+@pytest.fixture(scope='module')
+def tabela():
+    return limpar_notificacoes(notificacoes(1000))
+
+
+@pytest.fixture(scope='module')
+def dados(tabela):
+    return preprocessar_dados(tabela, IMPRESSAO)
+
+
+@pytest.mark.parametrize('valores, dtype', [
+    ([0, -1, 127], 'int8'),
+    ([-1, 300], 'int16'),
+    ([5, 70000], 'int32'),
+    ([], 'int8'),
+])
+def test_menor_dtype_que_comporta_os_valores(valores, dtype):
+    vetor = codificar_inteiros(valores)
+    assert vetor['dtype'] == dtype
+    np.testing.assert_array_equal(decodificar(vetor), valores)
+
+
+def test_cubo_compactado_volta_ao_original(tabela):
+    cubo = construir_cubo(tabela, ['sintomas', 'classificacaoFinal', 'evolucaoCaso'])
+    linhas = descompactar(compactar_cubo(cubo))
+    esperado = cubo.astype(object).where(cubo.notna(), None)
+    assert linhas.to_dict('records') == esperado.to_dict('records')
+
+
+def test_store_aponta_os_municipios_na_malha(dados):
+    codigos = ['2600000'] + [str(codigo) for _, codigo in reversed(MUNICIPIOS)]
+    store = construir_store(dados, {'codigos': codigos})
+
+    mapa = store['mapa']
+    assert store['versao'] == dados['versao'] and mapa['n_municipios'] == len(codigos)
+    posicoes = [mapa['dicionarios']['municipioIBGE'][codigo] for codigo in decodificar(mapa['codigos']['municipioIBGE'])]
+    assert [codigos[posicao] for posicao in posicoes] == dados['cubos']['mapa']['municipioIBGE'].tolist()
+
+
+@pytest.mark.parametrize('filtros', [{}, {'ano': 2022, 'raca': 'Parda'}])
+def test_store_leva_os_fluxos_do_sankey_por_par_de_etapas(dados, filtros):
+    # Somando as linhas do cubo de cada par que passam nos filtros, o navegador chega aos fluxos do servidor.
+    store = construir_store(dados, {'codigos': []})
+    consulta = compilar_consulta(**filtros)
+    tensor = dados['sankey']
+    assert store['sankey']['estagios'] == ESTAGIOS_PADRAO
+    for origem, destino, matriz in zip(ESTAGIOS_PADRAO, ESTAGIOS_PADRAO[1:], tensor.fluxos(dados, consulta, ESTAGIOS_PADRAO)):
+        linhas = descompactar(store[f'sankey:{origem}:{destino}'])
+        for coluna, valores in consulta.filtros.items():
+            linhas = linhas[linhas[coluna].isin(valores)]
+        fluxos = linhas.groupby([origem, destino])['contagem'].sum()
+        esperado = pd.DataFrame(matriz, index=tensor.rotulos[origem], columns=tensor.rotulos[destino]).stack()
+        assert fluxos[fluxos > 0].to_dict() == esperado[esperado > 0].to_dict()
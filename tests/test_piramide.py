@@ -0,0 +1,106 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import IMPRESSAO, RAIZ, tabela_sintetica
+from consulta import Consulta, compilar_consulta
+from piramide import PiramideEtaria, por_mil
+from preprocessamento import codigos_faixa, preprocessar_dados, rotulos_faixas
+
+# Filtros só no cubo, fora dele (faixa, município, classificação) e sem nenhuma linha.
+FILTROS = [
+    {},
+    {'ano': 2022},
+    {'ano': [2021, 2023], 'raca': ['Parda', 'Branca']},
+    {'raca': 'Indígena', 'sexo': 'Masculino'},
+    {'faixa': ['0 a 4', '55+']},
+    {'municipio': ['2601310', '2600180'], 'sexo': 'Feminino'},
+    {'classificacao': 'Descartado', 'ano': 2022},
+    {'ano': 2019},
+]
+CONSULTAS = [compilar_consulta(**filtros) for filtros in FILTROS]
+
+
+@pytest.fixture(scope='module')
+def dados():
+    return preprocessar_dados(tabela_sintetica(3000), IMPRESSAO)
+
+
+def mascara(tabela, consulta):
+    selecionadas = np.ones(len(tabela), dtype=bool)
+    for coluna, valores in consulta.filtros.items():
+        selecionadas &= tabela[coluna].isin(valores).fillna(False).to_numpy(dtype=bool)
+    return selecionadas
+
+
+def esperado(tabela, consulta):
+    selecionadas = tabela[mascara(tabela, consulta)]
+    return selecionadas.groupby(['sexo', 'faixaPiramide'], observed=False).size().unstack(fill_value=0).to_numpy()
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS, ids=lambda consulta: consulta.descricao() or 'sem filtros')
+def test_contagens_iguais_ao_groupby_das_linhas(dados, consulta):
+    # Pelas células do cubo ou, fora dele, pelos códigos de faixa das linhas selecionadas.
+    np.testing.assert_array_equal(dados['piramide'].contar(dados, consulta), esperado(dados['tabela'], consulta))
+
+
+@pytest.mark.parametrize('coluna, valores', [('ano', [2021, 2023]), ('racaCor', ['Parda', 'Indígena'])])
+def test_comparacao_troca_o_filtro_da_coluna(dados, coluna, valores):
+    # Cada matriz da comparação é a pirâmide com o filtro da coluna trocado pelo valor, mantidos os demais.
+    consulta = compilar_consulta(ano=2022, raca='Branca', faixa=['20 a 24', '25 a 29', '55+'])
+    piramide = dados['piramide']
+    for valor, matriz in zip(valores, piramide.comparar(dados, consulta, coluna, valores)):
+        np.testing.assert_array_equal(matriz, esperado(dados['tabela'], Consulta({**consulta.filtros, coluna: [valor]})))
+
+
+def test_tabela_por_mil_da_propria_selecao(dados):
+    piramide = dados['piramide']
+    tabela = piramide.tabela(piramide.contar(dados, compilar_consulta(ano=2022)))
+    assert tabela['por_mil'].sum() == pytest.approx(1000)
+    assert list(tabela['faixa_etaria'].cat.categories) == list(piramide.faixas)
+    np.testing.assert_allclose(tabela['por_mil'], tabela['contagem'] * 1000 / tabela['contagem'].sum())
+    np.testing.assert_array_equal(por_mil(np.zeros((2, 3))), np.zeros((2, 3)))
+
+
+def test_faixas_pelos_limites():
+    # A idade inicial de cada categoria decide a faixa; a última é aberta e ausentes ficam de fora.
+    serie = pd.Series(['0 a 4', '3 a 7', '20 a 24', '54 a 58', '55 a 59', '80+', 'Ignorado', None], dtype='category')
+    np.testing.assert_array_equal(codigos_faixa(serie), [0, 0, 4, 10, 11, 11, -1, -1])
+    np.testing.assert_array_equal(codigos_faixa(serie, [0, 20, 60]), [0, 0, 1, 1, 1, 2, -1, -1])
+    assert rotulos_faixas([0, 20, 60]) == ['0 a 19', '20 a 59', '60+']
+
+
+@pytest.mark.parametrize('texto, valido', [
+    ('0,20,60', True),
+    ('0, 5, 85', True),
+    ('0', True),
+    ('5,20,60', False),
+    ('0,22,60', False),
+    ('0,60,20', False),
+    ('0,20,20', False),
+    ('0,vinte', False),
+    ('', False),
+])
+def test_limites_validados_ao_carregar_a_config(texto, valido):
+    # A config é lida na importação: cada caso roda num processo novo com a variável definida.
+    resultado = subprocess.run(
+        [sys.executable, '-c', 'import config; print(config.LIMITES_FAIXAS_PIRAMIDE)'],
+        cwd=RAIZ, env={**os.environ, 'PIBIC_FAIXAS_PIRAMIDE': texto}, capture_output=True, text=True
+    )
+    assert (resultado.returncode == 0) == valido
+    if not valido:
+        assert 'ValueError: PIBIC_FAIXAS_PIRAMIDE deve listar idades múltiplas de 5' in resultado.stderr
+
+
+def test_somar_amplia_anos_e_categorias(dados):
+    tabela = dados['tabela']
+    base = tabela[tabela['ano'].ne(2024).fillna(True).to_numpy(dtype=bool)]
+    delta = tabela[tabela['ano'].eq(2024).fillna(False).to_numpy(dtype=bool)]
+    somada = PiramideEtaria(base).somar(delta)
+    completa = PiramideEtaria(tabela)
+    np.testing.assert_array_equal(somada.anos, completa.anos)
+    np.testing.assert_array_equal(somada.contagens, completa.contagens)
@@ -0,0 +1,112 @@
+import functools
+import gzip
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import pre_renderizacao
+from atualizacao import MonitorAtualizacoes
+from compartilhado import carregar_dados_compartilhados
+from conftest import MUNICIPIOS
+from dados_sinteticos import gerar_notificacoes
+from pre_renderizacao import CONSTRUTORES, modulos_construtores, pre_renderizar, versao_construtores
+
+
+def malha_de_teste():
+    # Um quadrado por município: o suficiente para o traço do mapa, sem ler o shapefile.
+    codigos = [str(codigo) for _, codigo in MUNICIPIOS]
+    geojson = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'properties': {'CD_MUN': codigo},
+         'geometry': {'type': 'Polygon', 'coordinates': [[[i, 0], [i + 1, 0], [i + 1, 1], [i, 1], [i, 0]]]}}
+        for i, codigo in enumerate(codigos)
+    ]}
+    return {'geojson': geojson, 'geojson_serializado': json.dumps(geojson), 'locations': codigos,
+            'nomes': [nome for nome, _ in MUNICIPIOS], 'codigos': codigos}
+
+
+@pytest.fixture(scope='module')
+def ambiente(tmp_path_factory):
+    # Uma pasta de destino para o módulo: a primeira execução é a completa, as seguintes são incrementais.
+    tmp_path = tmp_path_factory.mktemp('pre_renderizacao')
+    csv = str(tmp_path / 'notificacoes.csv')
+    municipios = (np.array([nome for nome, _ in MUNICIPIOS], dtype=object), np.array([codigo for _, codigo in MUNICIPIOS]))
+    df = gerar_notificacoes(400, municipios=municipios)
+    # Um ano e duas raças mantêm o número de combinações (e de pacotes a renderizar) pequeno.
+    df = df[df['dataNotificacao'].str.startswith('2022', na=False) & df['racaCor'].isin(['Parda', 'Branca'])]
+    df.to_csv(csv, sep=';', index=False)
+    destino = str(tmp_path / 'estatico')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(pre_renderizacao, 'carregar_dados_compartilhados', functools.partial(carregar_dados_compartilhados, csv))
+        monkeypatch.setattr(pre_renderizacao, 'MonitorAtualizacoes', functools.partial(MonitorAtualizacoes, caminho=csv))
+        monkeypatch.setattr(pre_renderizacao, 'carregar_malha_municipios', malha_de_teste)
+        executar = functools.partial(pre_renderizar, destino, str(tmp_path / 'cache'), processos=1)
+        yield executar, destino, executar()
+
+
+def arquivos(destino):
+    pasta = os.path.join(destino, 'figuras')
+    return {nome: os.stat(os.path.join(pasta, nome)).st_mtime_ns for nome in os.listdir(pasta)}
+
+
+def test_manifesto_aponta_um_pacote_por_combinacao(ambiente):
+    _, destino, manifesto = ambiente
+    n_combinacoes = (len(manifesto['anos']) + 1) * (len(manifesto['racas']) + 1) * (len(manifesto['sexos']) + 1)
+    assert len(manifesto['combinacoes']) == n_combinacoes
+    # Com um ano só, "todos os anos" e 2022 têm os mesmos agregados e dividem o pacote.
+    assert set(arquivos(destino)) == {os.path.basename(caminho) for caminho in manifesto['combinacoes'].values()}
+    assert len(arquivos(destino)) < n_combinacoes
+
+    with gzip.open(os.path.join(destino, manifesto['combinacoes']['||'])) as arquivo:
+        pacote = json.load(arquivo)
+    assert list(pacote) == list(CONSTRUTORES)
+    assert 'geojson' not in pacote['mapa']['data'][0]
+    assert sum(pacote['mapa']['data'][0]['z']) > 0
+    for nome in ('index.html', 'visualizador.js', 'plotly.min.js', 'malha.json.gz'):
+        assert os.path.exists(os.path.join(destino, nome))
+
+
+def test_segunda_execucao_so_refaz_o_que_mudou(ambiente):
+    executar, destino, _ = ambiente
+    antes = arquivos(destino)
+    orfao = os.path.join(destino, 'figuras', 'antigo.json.gz')
+    open(orfao, 'wb').close()
+
+    executar()
+    assert arquivos(destino) == antes
+    assert not os.path.exists(orfao)
+
+    executar(refazer=True)
+    depois = arquivos(destino)
+    assert set(depois) == set(antes) and all(depois[nome] != antes[nome] for nome in antes)
+
+
+def test_versao_acompanha_os_modulos_importados(tmp_path, monkeypatch):
+    modulos = modulos_construtores()
+    assert {'graficos', 'consulta', 'serializacao', 'agregados', 'termos', 'semanas', 'municipios'} <= set(modulos)
+    assert 'dbcPibic' not in modulos and 'pandas' not in modulos
+
+    # Uma mudança num módulo só importado indiretamente também muda a versão.
+    for nome in modulos:
+        shutil.copyfile(os.path.join(pre_renderizacao.RAIZ, f'{nome}.py'), tmp_path / f'{nome}.py')
+    monkeypatch.setattr(pre_renderizacao, 'RAIZ', str(tmp_path))
+    versao = versao_construtores()
+    with open(tmp_path / 'termos.py', 'a', encoding='utf-8') as arquivo:
+        arquivo.write('\n# mudança\n')
+    assert versao_construtores() != versao
+
+
+def test_processo_do_pool_remonta_uma_versao_removida(tmp_path, monkeypatch):
+    # Sem a pasta da versão, o processo monta os dados como o principal em vez de falhar.
+    remontados = {'versao': 'remontada'}
+    monkeypatch.setattr(pre_renderizacao, 'carregar_dados', lambda diretorio_cache: remontados)
+    monkeypatch.setattr(pre_renderizacao, '_dados', None)
+    monkeypatch.setattr(pre_renderizacao, '_malha', None)
+    try:
+        pre_renderizacao._iniciar_processo('inexistente', str(tmp_path), malha_de_teste())
+    finally:
+        logging.disable(logging.NOTSET)
+    assert pre_renderizacao._dados is remontados
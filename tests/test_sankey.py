@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import graficos
+from conftest import IMPRESSAO, tabela_sintetica
+from consulta import compilar_consulta
+from preprocessamento import preprocessar_dados
+from sankey import ESTAGIOS_PADRAO, ESTAGIOS_SANKEY, ROTULO_OUTROS, TensorSankey
+
+# Filtros só no cubo, fora dele (faixa, município, classificação) e sem nenhuma linha.
+FILTROS = [
+    {},
+    {'ano': [2021, 2023], 'raca': ['Parda', 'Branca']},
+    {'raca': 'Indígena', 'sexo': 'Masculino'},
+    {'faixa': ['0 a 4', '55+']},
+    {'municipio': ['2601310', '2600180'], 'sexo': 'Feminino'},
+    {'classificacao': 'Descartado', 'ano': 2022},
+    {'ano': 2019},
+]
+CONSULTAS = [compilar_consulta(**filtros) for filtros in FILTROS]
+ORDENS = [ESTAGIOS_PADRAO, ['evolucaoCaso', 'faixa_etaria', 'sexo'], ['condicoes', 'racaCor', 'classificacaoFinal', 'sintomas']]
+
+
+@pytest.fixture(scope='module')
+def dados():
+    return preprocessar_dados(tabela_sintetica(3000), IMPRESSAO)
+
+
+def mascara(tabela, consulta):
+    selecionadas = np.ones(len(tabela), dtype=bool)
+    for coluna, valores in consulta.filtros.items():
+        selecionadas &= tabela[coluna].isin(valores).fillna(False).to_numpy(dtype=bool)
+    return selecionadas
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS, ids=lambda consulta: consulta.descricao() or 'sem filtros')
+@pytest.mark.parametrize('estagios', ORDENS, ids='-'.join)
+def test_fluxos_iguais_ao_crosstab_das_linhas(dados, consulta, estagios):
+    # Qualquer ordem de etapas, pares invertidos inclusive: cada etapa consecutiva contra um
+    # crosstab dos nós das linhas selecionadas. Todo fluxo conserva o número de notificações.
+    tensor = dados['sankey']
+    selecionadas = dados['tabela'][mascara(dados['tabela'], consulta)]
+    rotulos = {
+        estagio: np.asarray(tensor.rotulos[estagio], dtype=object)[tensor.nos[estagio][selecionadas[ESTAGIOS_SANKEY[estagio][0]].cat.codes.to_numpy()]]
+        for estagio in estagios
+    }
+    for origem, destino, matriz in zip(estagios, estagios[1:], tensor.fluxos(dados, consulta, estagios)):
+        esperado = pd.crosstab(rotulos[origem], rotulos[destino]).reindex(
+            index=tensor.rotulos[origem], columns=tensor.rotulos[destino], fill_value=0
+        )
+        np.testing.assert_array_equal(matriz, esperado.to_numpy())
+        assert matriz.sum() == len(selecionadas)
+
+
+def test_categorias_raras_viram_outros(dados):
+    tensor = TensorSankey(dados['tabela'], limite=4)
+    contagens = dados['tabela']['sintomasSankey'].value_counts()
+    assert tensor.rotulos['sintomas'][:3] == sorted(contagens.index[:3])
+    assert ROTULO_OUTROS in tensor.rotulos['sintomas']
+    fluxo = tensor.fluxos(dados, compilar_consulta(), ['sintomas', 'sexo'])[0]
+    assert fluxo[tensor.rotulos['sintomas'].index(ROTULO_OUTROS)].sum() == contagens.iloc[3:].sum()
+
+
+def test_nos_e_cores_deterministicos(dados):
+    # O mesmo rótulo em duas etapas são dois nós; ids e cores não dependem da execução.
+    figura = graficos.grafico_sankey(dados, compilar_consulta(), ['racaCor', 'faixa_etaria'])
+    no = figura.data[0].node
+    assert list(no.label).count('Não Informado') == 2
+    repetida = graficos.grafico_sankey(dados, compilar_consulta(), ['racaCor', 'faixa_etaria']).data[0].node
+    assert list(no.label) == list(repetida.label) and list(no.color) == list(repetida.color)
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import IMPRESSAO, comparar, tabela_sintetica
+from consulta import compilar_consulta
+from preprocessamento import preprocessar_dados
+from semanas import COLUNAS_SERIES, rotulo_semana
+
+# Filtros nas dimensões acumuladas (raça × sexo, município) e fora delas (faixa, classificação).
+FILTROS = [
+    {},
+    {'raca': ['Parda', 'Branca'], 'sexo': 'Feminino'},
+    {'municipio': ['2600000', '2600010']},
+    {'faixa': ['0 a 4', '55+']},
+    {'classificacao': 'Descartado', 'raca': 'Parda'},
+]
+CONSULTAS = [compilar_consulta(**filtros) for filtros in FILTROS]
+
+
+@pytest.fixture(scope='module')
+def dados():
+    return preprocessar_dados(tabela_sintetica(3000), IMPRESSAO)
+
+
+def selecionar(tabela, consulta):
+    selecionadas = np.ones(len(tabela), dtype=bool)
+    for coluna, valores in consulta.filtros.items():
+        if coluna == 'dataNotificacao':
+            datas = tabela[coluna]
+            selecionadas &= ((datas >= valores[0]) & (datas < pd.Timestamp(valores[-1]) + pd.Timedelta(days=7))).to_numpy(dtype=bool)
+        else:
+            selecionadas &= tabela[coluna].isin(valores).fillna(False).to_numpy(dtype=bool)
+    return tabela[selecionadas].dropna(subset=['dataNotificacao'])
+
+
+def semanas(datas):
+    datas = datas.dt.normalize()
+    return (datas - pd.to_timedelta((datas.dt.dayofweek + 1) % 7, unit='D')).rename('semana')
+
+
+@pytest.mark.parametrize('data, rotulo', [
+    ('2024-01-04', 'SE 01/2024'),
+    ('2021-01-02', 'SE 53/2020'),
+    ('2021-01-03', 'SE 01/2021'),
+    ('2022-01-01', 'SE 52/2021'),
+])
+def test_semana_epidemiologica(data, rotulo):
+    # Semanas de domingo a sábado; a SE 1 é a que contém 4 de janeiro.
+    assert rotulo_semana(data) == rotulo
+
+
+@pytest.mark.parametrize('consulta', CONSULTAS, ids=lambda consulta: consulta.descricao() or 'sem filtros')
+@pytest.mark.parametrize('nome', COLUNAS_SERIES)
+def test_casos_iguais_ao_groupby_das_linhas(dados, consulta, nome):
+    selecionadas = selecionar(dados['tabela'], consulta)
+    esperado = selecionadas.groupby([semanas(selecionadas['dataNotificacao']), COLUNAS_SERIES[nome]], observed=True).size()
+
+    resultado = dados['series'].casos(dados, consulta, nome)
+    comparar(resultado['casos'].rename_axis(columns=COLUNAS_SERIES[nome]).stack(), esperado)
+    comparar(resultado['totais'], esperado.groupby(level=1, observed=True).sum())
+
+
+@pytest.mark.parametrize('nome', COLUNAS_SERIES)
+def test_filtro_de_ano_corta_a_semana_da_virada(dados, nome):
+    # As semanas que atravessam o ano entram só com os dias do ano filtrado.
+    consulta = compilar_consulta(ano=2022)
+    selecionadas = selecionar(dados['tabela'], consulta)
+    resultado = dados['series'].casos(dados, consulta, nome)
+    comparar(resultado['totais'], selecionadas.groupby(COLUNAS_SERIES[nome], observed=True).size())
+    assert resultado['casos'].to_numpy().sum() == len(selecionadas)
+    assert resultado['rotulos'][0] == 'SE 52/2021' and resultado['rotulos'][-1] == 'SE 52/2022'
+
+
+def test_media_movel_das_ultimas_semanas(dados):
+    resultado = dados['series'].casos(dados, compilar_consulta(), 'evolucao', media_movel=3)
+    esperado = resultado['casos'].rolling(3).mean()
+    pd.testing.assert_frame_equal(resultado['media'], esperado)
+
+
+def test_periodo_arredondado_as_semanas_filtra_as_outras_contagens(dados):
+    consulta = compilar_consulta(periodo=['2022-03-02', '2022-03-20T10:00:00'])
+    assert consulta.filtros['dataNotificacao'] == ['2022-02-27', '2022-03-20']
+
+    selecionadas = selecionar(dados['tabela'], consulta)
+    assert selecionadas['dataNotificacao'].between('2022-02-27', '2022-03-26 23:59').all()
+    comparar(consulta.contar(dados, 'evolucao', 'evolucaoCaso'), selecionadas.groupby('evolucaoCaso', observed=True).size())
+    # Na própria série o período só limita os totais da legenda.
+    resultado = dados['series'].casos(dados, consulta, 'evolucao')
+    assert resultado['totais'].sum() == len(selecionadas.dropna(subset=['evolucaoSankey']))
+    assert len(resultado['casos']) > 4
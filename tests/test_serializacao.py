@@ -0,0 +1,37 @@
+import base64
+
+import numpy as np
+import plotly.graph_objects as go
+
+from serializacao import TAMANHO_MINIMO_BINARIO, ler_json, serializar_figura, vetor_binario
+
+
+def decodificar(vetor):
+    return np.frombuffer(base64.b64decode(vetor['bdata']), dtype=f"<{vetor['dtype']}")
+
+
+def test_menor_dtype_e_volta_aos_valores():
+    for valores, dtype in [(np.arange(100), 'i1'), (np.arange(0, 50000, 100), 'i4'), (np.linspace(0, 1, 20), 'f8')]:
+        vetor = vetor_binario(valores)
+        assert vetor['dtype'] == dtype
+        np.testing.assert_array_equal(decodificar(vetor), valores)
+
+
+def test_textos_e_vetores_curtos_nao_mudam():
+    assert vetor_binario(['a'] * 40) == ['a'] * 40
+    assert vetor_binario(list(range(TAMANHO_MINIMO_BINARIO - 1))) == list(range(TAMANHO_MINIMO_BINARIO - 1))
+
+
+def test_figura_serializada_com_vetores_binarios():
+    figura = go.Figure([
+        go.Bar(x=[f'faixa {i}' for i in range(30)], y=np.arange(30) * 1000),
+        go.Sankey(link={'source': np.arange(20) % 4, 'target': np.arange(20) % 5 + 4, 'value': np.arange(20) + 1}),
+    ], layout={'title': {'text': 'Casos'}})
+
+    lida = ler_json(serializar_figura(figura))
+    barras, sankey = lida['data']
+    assert barras['x'] == [f'faixa {i}' for i in range(30)]
+    np.testing.assert_array_equal(decodificar(barras['y']), np.arange(30) * 1000)
+    for chave, valores in [('source', np.arange(20) % 4), ('target', np.arange(20) % 5 + 4), ('value', np.arange(20) + 1)]:
+        np.testing.assert_array_equal(decodificar(sankey['link'][chave]), valores)
+    assert lida['layout']['title']['text'] == 'Casos'
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import IMPRESSAO, comparar, tabela_sintetica
+from preprocessamento import preprocessar_dados
+from termos import AGRUPAMENTOS_TERMOS, separar_termos
+
+FILTROS = [
+    {},
+    {'ano': [2022]},
+    {'ano': [2021, 2023], 'racaCor': ['Parda', 'Branca']},
+    {'racaCor': ['Indígena'], 'sexo': ['Masculino']},
+    {'ano': [2019]},
+]
+
+
+@pytest.fixture(scope='module')
+def dados():
+    return preprocessar_dados(tabela_sintetica(3000), IMPRESSAO)
+
+
+def explodir(selecionadas, coluna, por=None):
+    # Referência direta: uma linha por termo de cada notificação, contada com groupby.
+    termos = selecionadas[coluna].astype(object).str.split(',').explode().str.strip()
+    termos = termos[termos.notna() & (termos != '')].rename(coluna)
+    chaves = [termos] if por is None else [termos, selecionadas[por].astype(object).reindex(termos.index)]
+    return termos.to_frame().groupby(chaves, dropna=True).size()
+
+
+def selecionar(tabela, filtros):
+    mascara = np.ones(len(tabela), dtype=bool)
+    for coluna, valores in filtros.items():
+        mascara &= tabela[coluna].isin(valores).fillna(False).to_numpy(dtype=bool)
+    return tabela[mascara]
+
+
+def test_separar_termos():
+    assert separar_termos(' Febre, Tosse ,, Febre') == ['Febre', 'Tosse']
+    assert separar_termos('') == []
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+def test_incidencia_igual_ao_explode(dados, filtros):
+    selecionadas = selecionar(dados['tabela'], filtros)
+    linhas = dados['indice'].selecionar(filtros)
+    comparar(dados['termos']['condicoes'].contar(linhas), explodir(selecionadas, 'condicoes'))
+    comparar(
+        dados['termos']['sintomas'].contar_por(dados['tabela']['classificacaoFinal'], linhas),
+        explodir(selecionadas, 'sintomas', 'classificacaoFinal')
+    )
+
+
+@pytest.mark.parametrize('filtros', FILTROS)
+def test_celulas_iguais_a_incidencia(dados, filtros):
+    linhas = dados['indice'].selecionar(filtros)
+    for coluna, por in AGRUPAMENTOS_TERMOS.items():
+        incidencia = dados['termos'][coluna]
+        esperado = incidencia.contar(linhas) if por is None else incidencia.contar_por(dados['tabela'][por], linhas)
+        pd.testing.assert_series_equal(dados['termos_celulas'].contar(coluna, filtros, por), esperado)
+
+
+def test_coocorrencia_tem_os_totais_na_diagonal(dados):
+    incidencia = dados['termos']['sintomas']
+    coocorrencia = incidencia.coocorrencia()
+    np.testing.assert_array_equal(np.diag(coocorrencia), incidencia.contar().to_numpy())
+    assert (coocorrencia.to_numpy() == coocorrencia.to_numpy().T).all()
+
+
+def test_celulas_so_agrupadas_pela_coluna_configurada(dados):
+    with pytest.raises(ValueError):
+        dados['termos_celulas'].contar('condicoes', {}, 'classificacaoFinal')
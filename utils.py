@@ -1,7 +1,50 @@
+import unicodedata
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
 dose_ordinals = {
     1: 'primeira',
     2: 'segunda',
     3: 'terceira',
     4: 'quarta',
 }
-    
\ No newline at end of file
+
+
+def normalizar_nome(nome):
+    if isinstance(nome, str):
+        return ''.join(c for c in unicodedata.normalize('NFD', nome) if unicodedata.category(c) != 'Mn')
+    else:
+        return nome
+
+
+def recodificar_categorias(serie, funcao=None, valor_ausente=None):
+    # Aplica `funcao` uma vez por categoria (e não por linha) e reconstrói os códigos;
+    # categorias que passam a ter o mesmo rótulo são fundidas.
+    categorias = list(serie.cat.categories)
+    codigos = serie.cat.codes.to_numpy()
+    if valor_ausente is not None:
+        codigos = np.where(codigos < 0, len(categorias), codigos)
+        categorias.append(valor_ausente)
+    if funcao is not None:
+        categorias = [funcao(categoria) for categoria in categorias]
+
+    novas_categorias = pd.Index(categorias).unique()
+    novos_codigos = novas_categorias.get_indexer(categorias)
+    codigos = np.where(codigos < 0, -1, novos_codigos[codigos])
+    return pd.Series(pd.Categorical.from_codes(codigos, novas_categorias), index=serie.index, name=serie.name)
+
+
+def concatenar_tabelas(*tabelas):
+    # pd.concat transforma em object as colunas categóricas com categorias diferentes;
+    # aqui as categorias são unidas (as da primeira tabela primeiro) e os códigos preservados.
+    colunas = {}
+    for coluna in tabelas[0].columns:
+        series = [tabela[coluna] for tabela in tabelas]
+        if isinstance(series[0].dtype, pd.CategoricalDtype):
+            colunas[coluna] = pd.Series(union_categoricals(series, ignore_order=True), name=coluna)
+        else:
+            colunas[coluna] = pd.concat(series, ignore_index=True)
+    return pd.DataFrame(colunas)
@@ -0,0 +1,77 @@
+// Versão estática do painel: as figuras de cada combinação de ano, raça e sexo foram
+// pré-renderizadas por pre_renderizacao.py e são lidas de figuras/*.json.gz pelo manifesto.
+(function () {
+    var FILTROS = ['filtro-ano', 'filtro-raca', 'filtro-sexo'];
+    var pacotes = {};
+    var manifesto, malha;
+
+    // Os arquivos são gzip. Se o host já os entrega com Content-Encoding: gzip, o navegador
+    // descomprime sozinho; senão a descompressão é feita aqui.
+    function lerJson(caminho) {
+        return fetch(caminho).then(function (resposta) {
+            if (!resposta.ok) { throw new Error(caminho + ': HTTP ' + resposta.status); }
+            return resposta.arrayBuffer();
+        }).then(function (buffer) {
+            var bytes = new Uint8Array(buffer);
+            if (bytes[0] !== 0x1f || bytes[1] !== 0x8b) {
+                return JSON.parse(new TextDecoder().decode(bytes));
+            }
+            var fluxo = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+            return new Response(fluxo).json();
+        });
+    }
+
+    function preencher(id, valores) {
+        var select = document.getElementById(id);
+        valores.forEach(function (valor) {
+            var opcao = document.createElement('option');
+            opcao.value = opcao.textContent = valor;
+            select.appendChild(opcao);
+        });
+        select.addEventListener('change', atualizar);
+    }
+
+    function estado(texto) {
+        document.getElementById('estado').textContent = texto;
+    }
+
+    function atualizar() {
+        var chave = FILTROS.map(function (id) { return document.getElementById(id).value; }).join('|');
+        var arquivo = manifesto.combinacoes[chave];
+        if (!(arquivo in pacotes)) {
+            pacotes[arquivo] = lerJson(arquivo);
+        }
+        estado('Carregando…');
+        pacotes[arquivo].then(function (figuras) {
+            manifesto.graficos.forEach(function (nome) {
+                var figura = figuras[nome];
+                if (nome === 'mapa') {
+                    figura.data[0].geojson = malha;
+                }
+                Plotly.react('grafico-' + nome, figura.data, figura.layout, {responsive: true});
+            });
+            estado('');
+        }).catch(function (erro) {
+            delete pacotes[arquivo];
+            estado('Falha ao carregar as figuras: ' + erro.message);
+        });
+    }
+
+    Promise.all([lerJson('manifesto.json'), lerJson('malha.json.gz')]).then(function (resultados) {
+        manifesto = resultados[0];
+        malha = resultados[1];
+        var container = document.getElementById('graficos');
+        manifesto.graficos.forEach(function (nome) {
+            var div = document.createElement('div');
+            div.id = 'grafico-' + nome;
+            div.className = 'grafico';
+            container.appendChild(div);
+        });
+        preencher('filtro-ano', manifesto.anos);
+        preencher('filtro-raca', manifesto.racas);
+        preencher('filtro-sexo', manifesto.sexos);
+        atualizar();
+    }).catch(function (erro) {
+        estado('Falha ao carregar o manifesto: ' + erro.message);
+    });
+})();